@@ -0,0 +1,25 @@
+from fastapi import APIRouter, HTTPException
+from helper.tracing import TRACING_ENABLED, get_trace
+
+router = APIRouter()
+
+
+@router.get("/debug/trace/{pdf_id}", summary="Get the timing waterfall of a recent upload")
+async def get_upload_trace(pdf_id: int):
+    """
+    Retrieve the spans recorded for the most recent traced processing of a PDF.
+    
+    Only available with TRACING_ENABLED=true; with TRACE_SAMPLE_RATE below 1 not
+    every upload is traced, and only the last TRACE_RETENTION traces are kept.
+    
+    - **pdf_id**: ID of the PDF
+    
+    Returns:
+    - trace_id, total duration and the spans (name, start_ms, duration_ms, attributes) ordered by start
+    """
+    if not TRACING_ENABLED:
+        raise HTTPException(status_code=404, detail="Tracing is disabled")
+    trace = get_trace(pdf_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="No trace recorded for this PDF")
+    return trace
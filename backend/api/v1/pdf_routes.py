@@ -1,134 +1,300 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Header
 from fastapi.responses import StreamingResponse, FileResponse
-from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from PyPDF2 import PdfReader
 import os
 import json
-from typing import List, Dict
-import io
-from datetime import datetime
+from typing import List, Optional
 import uuid
-import sys
+import zipfile
 import asyncio
-import traceback
-from helper.process_help import *
-from dotenv import load_dotenv
+from helper.uploads import BATCH_MAX_FILES, MAX_BATCH_BYTES, UPLOAD_DIR, discard, spool_upload, spool_zip_pdfs, store_content_addressed
+from helper.document_summary import document_summary_stream, summarize_document
+from helper.extraction import count_pages
+from helper.pipeline import find_incomplete_pages, find_processed_pdf, reprocess_pdf_stream, replay_pdf_stream
+from helper.jobs import batch_status, batch_totals, manager as job_manager, pdf_metadata
+from helper.queries import get_page_text, list_pages, list_pdfs
+from helper.search import search
+from helper.sse import with_heartbeats
 import database as db_module
-from database import PDF, PageSummary, SectionSummary, get_db, init_db
+from database import PDF, SectionSummary, DocumentSection, Job, JobPage, get_db
+from helper.tracing import end_trace, get_logger, start_trace
 
-load_dotenv(override=True)
-
-# Add parent directory to path to import database module
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+log = get_logger(__name__)
 
 router = APIRouter()
 
-# Initialize database tables
-init_db()
 
-# Create uploads directory if it doesn't exist
-UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# PDFs with a reprocess stream currently running in this process
+_reprocessing = set()
 
 
-@router.post("/upload-pdf", summary="Upload PDF and get streaming page summaries")
-async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)):
-    # Validate file type
-    if not file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+def _is_busy(pdf_id: int) -> bool:
+    """True while a job or a reprocess stream of this process is summarizing the PDF"""
+    return pdf_id in _reprocessing or any(job.pdf_id == pdf_id and not job.finished for job in job_manager.jobs.values())
 
-    # Read file content
-    file_content = await file.read()
-    
-    # Initialize PDF Reader
+
+async def _store_pdf(db: AsyncSession, filename: str, temp_path: str, content_hash: str) -> tuple:
+    """
+    Store a spooled upload and its PDF row; returns (pdf, reused).
+
+    When this exact paper was already processed, the spooled file is dropped and
+    the existing PDF is returned with `reused` set.
+    """
+    existing_pdf = await find_processed_pdf(db, content_hash)
+    if existing_pdf:
+        discard(temp_path)
+        log.info("Upload matches PDF %d (hash %s), reusing stored summaries", existing_pdf.id, content_hash[:12])
+        return existing_pdf, True
+
+    # Content-addressed filename: identical uploads share a single file on disk
+    file_path = store_content_addressed(temp_path, UPLOAD_DIR, content_hash)
+
+    # Count pages through a memory-mapped reader, off the event loop
     try:
-        pdf_reader = PdfReader(io.BytesIO(file_content))
-        total_pages = len(pdf_reader.pages)
+        total_pages = await asyncio.to_thread(count_pages, file_path)
     except Exception as e:
+        if not await db.scalar(select(PDF.id).where(PDF.file_path == file_path).limit(1)):
+            discard(file_path)
         raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
 
-    # Generate unique filename and save PDF
-    unique_filename = f"{uuid.uuid4()}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-
     # Store PDF metadata in database immediately
     new_pdf = PDF(
-        filename=file.filename,
-        original_filename=file.filename,
+        filename=filename,
+        original_filename=filename,
         file_path=file_path,
+        content_hash=content_hash,
         total_pages=total_pages,
         sections_count=0 
     )
     db.add(new_pdf)
-    db.commit()
-    db.refresh(new_pdf)
-
-    # PDF Metadata for frontend
-    pdf_metadata = {
-        "id": new_pdf.id,
-        "filename": new_pdf.filename,
-        "upload_date": new_pdf.upload_date.isoformat(),
-        "sections_count": 0,
-        "total_pages": new_pdf.total_pages
-    }
+    await db.commit()
+    return new_pdf, False
+
 
-    # Create streaming response with sequential page-by-page processing
-    async def generate():
-        print(f"DEBUG: Starting streaming response for PDF {new_pdf.id}")
-        yield f"data: {json.dumps({'type': 'metadata', 'data': pdf_metadata})}\n\n"
-        await asyncio.sleep(0.01)  # Force flush
-
-        # Process each page sequentially: Extract → Extract Title → Summarize → Send to Frontend
-        for page_num, page in enumerate(pdf_reader.pages):
-            actual_page_num = page_num + 1
-            page_text = page.extract_text() or ""
-            print(f"DEBUG: Processing page {actual_page_num}, text length: {len(page_text)}")
-            
-            # Extract section title from page content
-            page_title = extract_page_title(page_text)
-            print(f"DEBUG: Page {actual_page_num} title: '{page_title}'")
-            
-            # Store Page Content and Title in DB
-            with db_module.SessionLocal() as session:
-                new_page = PageSummary(
-                    pdf_id=new_pdf.id,
-                    page_number=actual_page_num,
-                    title=page_title,
-                    content=page_text
-                )
-                session.add(new_page)
-                session.commit()
-                session.refresh(new_page)
-                page_id = new_page.id
-                print(f"DEBUG: Stored page {actual_page_num} in DB with ID {page_id}")
-
-            # Send page content and title to frontend immediately
-            yield f"data: {json.dumps({'page_id': page_id, 'page_num': actual_page_num, 'title': page_title, 'content': page_text[:500], 'summary': ''})}\n\n"
-            await asyncio.sleep(0.01)  # Force flush
-            
-            # Generate individual section summaries if headings exist
-            if page_title and page_title.strip():
-                print(f"DEBUG: Generating individual section summaries for page {actual_page_num}")
-                for section_chunk in generate_section_summaries_stream(page_id, new_pdf.id, actual_page_num, page_text, page_title):
-                    yield section_chunk
-                    await asyncio.sleep(0.01)  # Force flush
-            
-            # Summarize this page (overall summary) and stream results
-            print(f"DEBUG: Starting overall page summarization for page {actual_page_num}")
-            for chunk in summarize_page_stream(page_id, actual_page_num, page_text, page_title):
+@router.post("/upload-pdf", summary="Upload PDF and get streaming page summaries")
+async def upload_pdf(file: UploadFile = File(...), db: AsyncSession = Depends(get_db)):
+    # Validate file type
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    # Spool the upload to disk in chunks while hashing it (never held in memory as a whole)
+    temp_path, content_hash = await spool_upload(file, UPLOAD_DIR)
+    pdf, reused = await _store_pdf(db, file.filename, temp_path, content_hash)
+
+    # Fast path: this exact paper was already processed, replay it without any LLM calls
+    if reused:
+        existing_pdf = pdf
+        metadata = pdf_metadata(existing_pdf)
+        # Pages whose summary failed (or lacks sections) are summarized again instead of replayed
+        failed_pages = [] if _is_busy(pdf.id) else await find_incomplete_pages(db, pdf.id)
+        if failed_pages:
+            log.info("Upload of PDF %d summarizes %d failed page(s) again: %s", pdf.id, len(failed_pages), failed_pages)
+            _reprocessing.add(pdf.id)
+
+        async def replay():
+            yield f"data: {json.dumps({'type': 'metadata', 'data': metadata})}\n\n"
+            async for chunk in replay_pdf_stream(existing_pdf.id, skip_pages=set(failed_pages)):
                 yield chunk
-                await asyncio.sleep(0.01)  # Force flush after each chunk
+            if failed_pages:
+                trace_token = start_trace(existing_pdf.id)
+                try:
+                    async for chunk in reprocess_pdf_stream(existing_pdf.id, failed_pages):
+                        yield chunk
+                    async for chunk in document_summary_stream(existing_pdf.id):
+                        yield chunk
+                finally:
+                    end_trace(trace_token)
+            yield "data: {\"type\": \"complete\"}\n\n"
 
-        print(f"DEBUG: Completed all pages for PDF {new_pdf.id}")
-        yield "data: {\"type\": \"complete\"}\n\n"
-        await asyncio.sleep(0.01)  # Force flush
+        return StreamingResponse(
+            with_heartbeats(replay()),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+            },
+            background=BackgroundTask(_reprocessing.discard, pdf.id) if failed_pages else None
+        )
+
+    # Process the upload as a background job; this response is just one subscription to it
+    job = await job_manager.create_job(pdf)
+    log.info("Queued job %s for PDF %d", job.id, pdf.id)
 
     return StreamingResponse(
-        generate(),
+        job.subscribe(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Job-Id": job.id,
+        }
+    )
+
+
+@router.get("/jobs/{job_id}", summary="Get the status of an upload job")
+async def get_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieve the processing status of an upload job.
+    
+    - **job_id**: ID returned in the `metadata` event / `X-Job-Id` header
+    """
+    job = await db.get(Job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    pdf = await db.get(PDF, job.pdf_id)
+    done_pages = await db.scalar(select(func.count(JobPage.id)).where(JobPage.job_id == job_id))
+    return {
+        "id": job.id,
+        "pdf_id": job.pdf_id,
+        "status": job.status,
+        "error": job.error,
+        "pages_done": done_pages,
+        "total_pages": pdf.total_pages if pdf else 0,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
+
+@router.get("/jobs/{job_id}/events", summary="Subscribe (or resubscribe) to the SSE stream of a job")
+async def get_job_events(
+    job_id: str,
+    last_event_id: Optional[str] = Header(None),
+    cursor: Optional[str] = Query(None, description="Last event id, for clients that cannot set the Last-Event-ID header")
+):
+    """
+    Stream the events of an upload job.
+    
+    Reconnecting clients send `Last-Event-ID` and only receive the events they missed.
+    Finished jobs are replayed from the stored pages and section summaries.
+    """
+    job = await job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job.finished and job_manager.jobs.get(job_id) is not job:
+        raise HTTPException(status_code=409, detail="Job is not running in this worker yet")
+    
+    return StreamingResponse(
+        job.subscribe(last_event_id or cursor),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        }
+    )
+
+
+@router.post("/upload-batch", summary="Upload many PDFs (or zip archives of PDFs) and follow their progress")
+async def upload_batch(files: List[UploadFile] = File(...), db: AsyncSession = Depends(get_db)):
+    """
+    Ingest a reading list in one request.
+    
+    - **files**: PDFs and/or zip archives containing PDFs
+    
+    Every PDF becomes an upload job; jobs share the LLM concurrency budget fairly,
+    so a long document does not hold back the others. Papers that were already
+    processed are reused without any LLM calls.
+    
+    Returns:
+    - SSE stream: a `batch` event with every document (and the `rejected` files),
+      `document_progress` and `batch_progress` events, then `complete`.
+      Per-page summaries are streamed by /jobs/{job_id}/events.
+    """
+    spooled, rejected = [], []
+    try:
+        for file in files:
+            name = file.filename or ""
+            try:
+                if name.lower().endswith(".zip"):
+                    zip_path, _ = await spool_upload(file, UPLOAD_DIR, MAX_BATCH_BYTES)
+                    try:
+                        members, skipped = await asyncio.to_thread(
+                            spool_zip_pdfs, zip_path, UPLOAD_DIR, max_files=BATCH_MAX_FILES - len(spooled)
+                        )
+                    except zipfile.BadZipFile:
+                        raise HTTPException(status_code=400, detail="Not a valid zip archive")
+                    finally:
+                        discard(zip_path)
+                    spooled += members
+                    rejected += [{**entry, "filename": f"{name}/{entry['filename']}"} for entry in skipped]
+                elif name.lower().endswith(".pdf"):
+                    if len(spooled) >= BATCH_MAX_FILES:
+                        raise HTTPException(status_code=400, detail=f"More than {BATCH_MAX_FILES} PDFs in the batch")
+                    temp_path, content_hash = await spool_upload(file, UPLOAD_DIR)
+                    spooled.append((name, temp_path, content_hash))
+                else:
+                    raise HTTPException(status_code=400, detail="Only PDF and zip files are allowed")
+            except HTTPException as e:
+                rejected.append({"filename": name, "error": e.detail})
+    except BaseException:
+        for _, temp_path, _ in spooled:
+            discard(temp_path)
+        raise
+    if not spooled:
+        raise HTTPException(status_code=400, detail={"message": "No PDF in the batch", "rejected": rejected})
+
+    batch_id = str(uuid.uuid4())
+    stored = 0
+    for index, (filename, temp_path, content_hash) in enumerate(spooled):
+        try:
+            pdf, reused = await _store_pdf(db, filename, temp_path, content_hash)
+        except HTTPException as e:
+            rejected.append({"filename": filename, "error": e.detail})
+            continue
+        except BaseException:
+            for _, pending_path, _ in spooled[index + 1:]:
+                discard(pending_path)
+            raise
+        if reused:
+            await job_manager.record_reused(pdf, batch_id)
+        else:
+            await job_manager.create_job(pdf, batch_id=batch_id)
+        stored += 1
+    if not stored:
+        raise HTTPException(status_code=400, detail={"message": "No PDF in the batch could be read", "rejected": rejected})
+    log.info("Batch %s: %d document(s), %d rejected", batch_id, stored, len(rejected))
+
+    return StreamingResponse(
+        with_heartbeats(job_manager.subscribe_batch(batch_id, rejected)),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Batch-Id": batch_id,
+        }
+    )
+
+
+@router.get("/batches/{batch_id}", summary="Get the progress of a batch upload")
+async def get_batch(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Status of every document of a batch and the aggregate progress.
+    
+    - **batch_id**: ID returned in the `batch` event / `X-Batch-Id` header
+    """
+    status = await batch_status(db, batch_id)
+    if not status:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Running jobs report their live progress (the database is written behind)
+    for document in status["documents"]:
+        job = job_manager.jobs.get(document["job_id"])
+        if job:
+            document["status"], document["pages_done"] = job.status, len(job.done_pages)
+    return {**status, **batch_totals(status["created_at"], status["documents"])}
+
+
+@router.get("/batches/{batch_id}/events", summary="Subscribe (or resubscribe) to the aggregated SSE stream of a batch")
+async def get_batch_events(batch_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Stream the aggregated progress of a batch; every subscription starts with a full `batch` snapshot.
+    """
+    if not await batch_status(db, batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return StreamingResponse(
+        with_heartbeats(job_manager.subscribe_batch(batch_id)),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -138,25 +304,62 @@ async def upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)
 
 
 @router.get("/pdfs", summary="Get list of uploaded PDFs")
-async def get_pdfs(db: Session = Depends(get_db)):
+async def get_pdfs(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Retrieve uploaded PDFs with metadata, newest first, using keyset pagination.
+    
+    - **limit**: Page size (max 200)
+    - **cursor**: `next_cursor` from the previous page
+    - **fields**: Comma separated PDF columns to return (defaults to the list view columns)
+    
+    Returns:
+    - List of PDF metadata and the cursor of the next page (null on the last page)
+    """
+    return await list_pdfs(db, limit, cursor, fields)
+
+
+@router.get("/search", summary="Full-text search over pages and section summaries")
+async def search_library(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    type: Optional[str] = None,
+    pdf_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    Retrieve a list of all uploaded PDFs with metadata.
+    Search page text, page summaries, section titles and section summaries, best matches first.
+    
+    - **q**: Words that must all appear; "quoted phrases" and trailing `*` prefixes are supported
+    - **limit**: Page size (max 100)
+    - **cursor**: `next_cursor` from the previous page
+    - **type**: Restrict to `page` or `section` results
+    - **pdf_id**: Restrict to one PDF
     
     Returns:
-    - List of PDF metadata including filename, upload date, and section count
+    - Ranked results with PDF, page number, title and a snippet with matches in `<mark>` tags
     """
-    pdfs = db.query(PDF).order_by(PDF.upload_date.desc()).all()
-    return {"pdfs": pdfs}
+    if not db_module.IS_SQLITE:
+        raise HTTPException(status_code=501, detail="Search requires the SQLite FTS5 backend")
+    return await search(db, q, limit, cursor, type, pdf_id)
 
 
 @router.get("/pdfs/{pdf_id}", summary="Get PDF details with pages and section summaries")
-async def get_pdf_details(pdf_id: int, db: Session = Depends(get_db)):
-    pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+async def get_pdf_details(pdf_id: int, include_content: bool = False, db: AsyncSession = Depends(get_db)):
+    pdf = await db.get(PDF, pdf_id)
     if not pdf:
         raise HTTPException(status_code=404, detail="PDF not found")
     
-    pages = db.query(PageSummary).filter(PageSummary.pdf_id == pdf_id).order_by(PageSummary.page_number).all()
-    section_summaries = db.query(SectionSummary).filter(SectionSummary.pdf_id == pdf_id).order_by(SectionSummary.page_number, SectionSummary.id).all()
+    # Page text is omitted unless requested; see /pdfs/{pdf_id}/pages/{page_number}/content
+    pages = await list_pages(db, pdf_id, include_content)
+    section_summaries = (await db.execute(
+        select(SectionSummary).where(SectionSummary.pdf_id == pdf_id).order_by(SectionSummary.page_number, SectionSummary.id)
+    )).scalars().all()
     
     return {
         "pdf": pdf,
@@ -165,8 +368,137 @@ async def get_pdf_details(pdf_id: int, db: Session = Depends(get_db)):
     }
 
 
+@router.get("/pdfs/{pdf_id}/summary", summary="Get the whole-paper summary of a PDF")
+async def get_pdf_summary(pdf_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieve the summary of the whole paper, reduced from its page and section summaries.
+    
+    - **pdf_id**: ID of the PDF
+    
+    PDFs processed before document summaries existed are summarized on first
+    request, from their stored summaries (the PDF is not parsed again).
+    """
+    pdf = await db.get(PDF, pdf_id)
+    if not pdf:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    summary = pdf.summary
+    if not summary:
+        if _is_busy(pdf_id):
+            raise HTTPException(status_code=409, detail="PDF is still being processed")
+        try:
+            summary = await summarize_document(pdf_id)
+        except Exception as e:
+            log.exception("Document summary failed for PDF %d: %s", pdf_id, e)
+            raise HTTPException(status_code=502, detail="Summary generation failed")
+        if not summary:
+            raise HTTPException(status_code=404, detail="PDF has no page summaries to summarize")
+    return {"pdf_id": pdf_id, "summary": summary}
+
+
+@router.get("/pdfs/{pdf_id}/pages/{page_number}/content", summary="Get the extracted text of one page")
+async def get_page_content(pdf_id: int, page_number: int, db: AsyncSession = Depends(get_db)):
+    """
+    Lazily load the full extracted text of a single page.
+    
+    - **pdf_id**: ID of the PDF
+    - **page_number**: 1-based page number
+    """
+    page = await get_page_text(db, pdf_id, page_number)
+    if not page:
+        raise HTTPException(status_code=404, detail="Page not found")
+    
+    page_id, content = page
+    return {"pdf_id": pdf_id, "page_id": page_id, "page_number": page_number, "content": content}
+
+
+@router.get("/pdfs/{pdf_id}/outline", summary="Get the document section tree with page spans")
+async def get_pdf_outline(pdf_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Retrieve the document-level section outline of a PDF.
+    
+    - **pdf_id**: ID of the PDF
+    
+    Returns:
+    - Nested sections with title, level, start_page and end_page
+    """
+    pdf = await db.get(PDF, pdf_id)
+    if not pdf:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    
+    rows = (await db.execute(
+        select(DocumentSection).where(DocumentSection.pdf_id == pdf_id).order_by(DocumentSection.position)
+    )).scalars().all()
+    nodes = {}
+    outline = []
+    for row in rows:
+        node = {
+            "id": row.id,
+            "title": row.title,
+            "level": row.level,
+            "start_page": row.start_page,
+            "end_page": row.end_page,
+            "children": []
+        }
+        nodes[row.id] = node
+        parent = nodes.get(row.parent_id)
+        (parent["children"] if parent else outline).append(node)
+    
+    return {"pdf_id": pdf_id, "sections": outline}
+
+
+@router.post("/pdfs/{pdf_id}/reprocess", summary="Summarize failed or incomplete pages again")
+async def reprocess_pdf(pdf_id: int, db: AsyncSession = Depends(get_db)):
+    """
+    Re-run summarization for the pages of a PDF whose summary is empty or an error,
+    or that are missing section summaries. Pages are summarized again from their
+    stored text; the PDF is not parsed again.
+    
+    - **pdf_id**: ID of the PDF
+    
+    Returns:
+    - SSE stream: a `reprocess` event listing the pages, the usual page and
+      section events for those pages only, the `document_summary` event when
+      pages changed (or the PDF had no summary yet), then `complete`
+    """
+    pdf = await db.get(PDF, pdf_id)
+    if not pdf:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    if _is_busy(pdf_id):
+        raise HTTPException(status_code=409, detail="PDF is still being processed")
+    
+    page_numbers = await find_incomplete_pages(db, pdf_id)
+    summarize = bool(page_numbers) or not pdf.summary
+    log.info("Reprocessing %d page(s) of PDF %d: %s", len(page_numbers), pdf_id, page_numbers)
+    _reprocessing.add(pdf_id)
+
+    async def reprocess():
+        yield f"data: {json.dumps({'type': 'reprocess', 'pdf_id': pdf_id, 'pages': page_numbers})}\n\n"
+        if page_numbers or summarize:
+            trace_token = start_trace(pdf_id)
+            try:
+                if page_numbers:
+                    async for chunk in reprocess_pdf_stream(pdf_id, page_numbers):
+                        yield chunk
+                async for chunk in document_summary_stream(pdf_id):
+                    yield chunk
+            finally:
+                end_trace(trace_token)
+        yield "data: {\"type\": \"complete\"}\n\n"
+
+    return StreamingResponse(
+        with_heartbeats(reprocess()),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+        },
+        # Runs once the stream ends, including when the client disconnects
+        background=BackgroundTask(_reprocessing.discard, pdf_id)
+    )
+
+
 @router.get("/pdfs/{pdf_id}/file", summary="Download PDF file")
-async def get_pdf_file(pdf_id: int, db: Session = Depends(get_db)):
+async def get_pdf_file(pdf_id: int, db: AsyncSession = Depends(get_db)):
     """
     Download the original PDF file.
     
@@ -175,7 +507,7 @@ async def get_pdf_file(pdf_id: int, db: Session = Depends(get_db)):
     Returns:
     - PDF file for download/viewing
     """
-    pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+    pdf = await db.get(PDF, pdf_id)
     if not pdf:
         raise HTTPException(status_code=404, detail="PDF not found")
     
@@ -193,7 +525,7 @@ async def get_pdf_file(pdf_id: int, db: Session = Depends(get_db)):
 
 
 @router.delete("/pdfs/{pdf_id}", summary="Delete a PDF")
-async def delete_pdf(pdf_id: int, db: Session = Depends(get_db)):
+async def delete_pdf(pdf_id: int, db: AsyncSession = Depends(get_db)):
     """
     Delete a PDF and all its associated data.
     
@@ -202,17 +534,18 @@ async def delete_pdf(pdf_id: int, db: Session = Depends(get_db)):
     Returns:
     - Success message
     """
-    pdf = db.query(PDF).filter(PDF.id == pdf_id).first()
+    pdf = await db.get(PDF, pdf_id)
     if not pdf:
         raise HTTPException(status_code=404, detail="PDF not found")
     
-    # Check file path before deleting
+    # Check file path before deleting; content-addressed files may be shared by other uploads
     file_path = pdf.file_path
-    if os.path.exists(file_path):
+    shared = await db.scalar(select(PDF.id).where(PDF.file_path == file_path, PDF.id != pdf.id).limit(1))
+    if not shared and os.path.exists(file_path):
         os.remove(file_path)
     
-    db.delete(pdf)
-    db.commit()
+    await db.delete(pdf)
+    await db.commit()
     
     return {"message": "PDF deleted successfully"}
 
@@ -0,0 +1,169 @@
+"""
+Benchmark batch ingest throughput (pages per minute) through POST /upload-batch.
+
+Usage (from backend/):
+    python benchmarks/bench_batch_ingest.py [--papers 20] [--pages 8] [--thesis-pages 120] [--latency 0.5]
+
+Starts the fake LLM server and the API (on a temporary database, LLM cache off),
+uploads a zip of `--papers` synthetic papers plus one long "thesis", and follows
+the aggregated SSE stream. Reports overall pages per minute and when the short
+papers finished relative to the thesis: with fair scheduling they complete early
+instead of queueing behind the thesis' LLM calls.
+"""
+import os
+import io
+import sys
+import json
+import time
+import uuid
+import random
+import zipfile
+import argparse
+import tempfile
+import threading
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_segmentation import synthetic_paper
+from fake_llm_server import serve
+
+
+def make_pdf(pages) -> bytes:
+    """A minimal PDF with one Helvetica text line per line of each page's text"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        lines = []
+        for line in text.split("\n")[:60]:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            lines.append(f"({escaped}) Tj 0 -12 Td")
+        stream = "BT /F1 9 Tf 40 760 Td " + " ".join(lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+
+def build_zip(papers: int, pages: int, thesis_pages: int, rng) -> tuple:
+    """Zip of the thesis followed by the papers; each run gets unique text, so nothing is reused"""
+    run = uuid.uuid4().hex[:8]
+    buffer = io.BytesIO()
+    documents = {}
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for index in range(papers + 1):
+            count = thesis_pages if index == 0 else pages
+            name = "thesis.pdf" if index == 0 else f"paper-{index:03d}.pdf"
+            texts = [f"{run} {name} page {page_num}\n{text}" for page_num, text in synthetic_paper(rng, pages=count)]
+            archive.writestr(name, make_pdf(texts))
+            documents[name] = count
+    return buffer.getvalue(), documents
+
+
+def post_multipart(url: str, filename: str, payload: bytes, content_type: str):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode("utf-8") + payload + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    return urllib.request.urlopen(request, timeout=3600)
+
+
+def start_api(port: int):
+    import uvicorn
+    from main import app
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8, help="pages per paper")
+    parser.add_argument("--thesis-pages", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake LLM response")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--page-concurrency", type=int, default=16, help="pages in flight per document (PAGE_CONCURRENCY)")
+    parser.add_argument("--llm-port", type=int, default=8901)
+    parser.add_argument("--api-port", type=int, default=8902)
+    args = parser.parse_args()
+
+    llm_server, limits = serve(args.llm_port, rpm=0, latency=args.latency)
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "GROK_API_KEY": "fake",
+        "GROK_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench_batch.db')}",
+        "LLM_CACHE_ENABLED": "false",
+        "LLM_RPM": "0",
+        "LLM_TPM": "0",
+        "LLM_MIN_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_LATENCY_TARGET": "3600",
+        "PAGE_CONCURRENCY": str(args.page_concurrency),
+        "BATCH_PROGRESS_INTERVAL": "0.2",
+        "LOG_LEVEL": "WARNING",
+    })
+    api = start_api(args.api_port)
+
+    payload, documents = build_zip(args.papers, args.pages, args.thesis_pages, random.Random(42))
+    total_pages = sum(documents.values())
+    print(f"Batch: {args.papers} papers x {args.pages} pages + thesis of {args.thesis_pages} pages ({total_pages} pages), "
+          f"LLM latency {args.latency}s, LLM concurrency {args.llm_concurrency}, {args.page_concurrency} pages in flight per document")
+
+    start = time.perf_counter()
+    finished = {}
+    file_paths = []
+    with post_multipart(f"http://127.0.0.1:{args.api_port}/api/v1/upload-batch", "reading-list.zip", payload, "application/zip") as response:
+        names = {}
+        for raw in response:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event["type"] == "batch":
+                names = {document["job_id"]: document["filename"] for document in event["documents"]}
+                if event["rejected"]:
+                    print(f"rejected: {event['rejected']}")
+            elif event["type"] == "document_progress" and event["status"] in ("completed", "failed"):
+                finished.setdefault(names[event["job_id"]], time.perf_counter() - start)
+            elif event["type"] == "complete":
+                break
+    elapsed = time.perf_counter() - start
+
+    import database as db_module
+    with db_module.SessionLocal() as db:
+        file_paths = [path for (path,) in db.query(db_module.PDF.file_path)]
+    api.should_exit = True
+    llm_server.shutdown()
+    for path in file_paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    papers = sorted(seconds for name, seconds in finished.items() if name != "thesis.pdf")
+    print(f"Ingested {total_pages} pages in {elapsed:.1f}s: {total_pages / elapsed * 60:.0f} pages/minute "
+          f"({limits.counts['ok']} LLM calls)")
+    if papers:
+        print(f"Papers done: median {papers[len(papers) // 2]:.1f}s, last {papers[-1]:.1f}s; "
+              f"thesis done {finished.get('thesis.pdf', float('nan')):.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark event loop stalls caused by database reads in request handlers.
+
+Usage (from backend/):
+    python benchmarks/bench_db_loop.py [--pages 20000] [--clients 20] [--requests 400] [--db PATH]
+
+Builds a synthetic library (as bench_search.py does), then has `--clients` concurrent
+handlers load PDF details with page text, first through a blocking Session on the
+event loop (how handlers read before), then through the AsyncSession. A ticker that
+wakes every millisecond measures how late the loop runs it: the delay every open SSE
+stream sees while those reads are in progress.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import Vocabulary, build
+
+TICK_SECONDS = 0.001
+
+
+def detail_queries(db_module, pdf_id):
+    """The reads of GET /pdfs/{pdf_id}?include_content=true"""
+    from sqlalchemy import select
+    PageSummary, PageContent, SectionSummary = db_module.PageSummary, db_module.PageContent, db_module.SectionSummary
+    return [
+        select(PageSummary.id, PageSummary.page_number, PageSummary.title, PageSummary.summary, PageContent.data)
+        .outerjoin(PageContent, PageContent.page_id == PageSummary.id)
+        .where(PageSummary.pdf_id == pdf_id).order_by(PageSummary.page_number),
+        select(SectionSummary).where(SectionSummary.pdf_id == pdf_id).order_by(SectionSummary.page_number, SectionSummary.id),
+    ]
+
+
+async def blocking_request(db_module, pdf_id):
+    with db_module.SessionLocal() as db:
+        for query in detail_queries(db_module, pdf_id):
+            db.execute(query).all()
+
+
+async def async_request(db_module, pdf_id):
+    async with db_module.AsyncSessionLocal() as db:
+        for query in detail_queries(db_module, pdf_id):
+            (await db.execute(query)).all()
+
+
+async def run(db_module, request, pdf_count, clients, requests):
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK_SECONDS)
+            lags.append(time.perf_counter() - start - TICK_SECONDS)
+
+    async def client(rng, count):
+        for _ in range(count):
+            await request(db_module, rng.randint(1, pdf_count))
+
+    ticking = asyncio.create_task(ticker())
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(random.Random(seed), requests // clients) for seed in range(clients)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await ticking
+    lags.sort()
+    return {
+        "requests/s": requests // clients * clients / elapsed,
+        "lag p50 (ms)": lags[len(lags) // 2] * 1000,
+        "lag p99 (ms)": lags[int(len(lags) * 0.99)] * 1000,
+        "lag max (ms)": lags[-1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--pages-per-pdf", type=int, default=20)
+    parser.add_argument("--clients", type=int, default=20, help="concurrent request handlers")
+    parser.add_argument("--requests", type=int, default=400, help="PDF detail reads in total")
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_db_loop.db")
+    db_module = build(db_path, args.pages, args.pages_per_pdf, Vocabulary(random.Random(7)))
+    pdf_count = (args.pages + args.pages_per_pdf - 1) // args.pages_per_pdf
+
+    async def both():
+        results = {}
+        for label, request in (("blocking", blocking_request), ("async", async_request)):
+            results[label] = await run(db_module, request, pdf_count, args.clients, args.requests)
+        await db_module.async_engine.dispose()
+        return results
+
+    results = asyncio.run(both())
+    print(f"{args.clients} clients, {args.requests} PDF detail reads ({args.pages_per_pdf} pages with text each)")
+    print(f"{'':<14}{'blocking':>12}{'async':>12}")
+    for name in results["blocking"]:
+        print(f"{name:<14}{results['blocking'][name]:>12.1f}{results['async'][name]:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark how long the whole-paper summary takes once the last page is summarized.
+
+Usage (from backend/):
+    python benchmarks/bench_document_summary.py [--pages 8 40 160] [--latency 0.5] [--input-tokens 6000]
+
+Starts the fake LLM server and the API (on a temporary database, LLM cache off),
+uploads one synthetic paper per `--pages` value and follows its SSE stream. Reports
+the time from the last page's `done` event to the `document_summary` event, with
+the number of reduce calls, next to the time the pages took. The reduction reads
+only the stored summaries, so it costs a few LLM round trips however long the paper
+is; `--input-tokens` (DOCUMENT_SUMMARY_INPUT_TOKENS) shrinks the prompt budget to
+force deeper trees.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_batch_ingest import make_pdf, start_api
+from bench_segmentation import synthetic_paper
+from fake_llm_server import serve
+
+
+def upload(url: str, filename: str, payload: bytes):
+    boundary = uuid.uuid4().hex
+    body = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        f"Content-Type: application/pdf\r\n\r\n"
+    ).encode("utf-8") + payload + f"\r\n--{boundary}--\r\n".encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    return urllib.request.urlopen(request, timeout=3600)
+
+
+def run(api_url: str, pages: int, rng, limits) -> dict:
+    run_id = uuid.uuid4().hex[:8]
+    texts = [f"{run_id} page {page_num}\n{text}" for page_num, text in synthetic_paper(rng, pages=pages)]
+    calls_before = limits.counts["ok"]
+    start = time.perf_counter()
+    last_page = summary_at = None
+    with upload(f"{api_url}/api/v1/upload-pdf", f"paper-{pages}.pdf", make_pdf(texts)) as response:
+        for raw in response:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if (event.get("done") or event.get("complete")) and event.get("page_num") == pages:
+                last_page = time.perf_counter()
+                calls_at_last_page = limits.counts["ok"]
+            elif event.get("type") in ("document_summary", "document_summary_error"):
+                summary_at = time.perf_counter()
+            elif event.get("type") == "complete":
+                break
+    return {
+        "pages": pages,
+        "pages_seconds": last_page - start,
+        "summary_seconds": summary_at - last_page if summary_at else float("nan"),
+        "reduce_calls": limits.counts["ok"] - calls_at_last_page,
+        "page_calls": calls_at_last_page - calls_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, nargs="+", default=[8, 40, 160])
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per fake LLM response")
+    parser.add_argument("--input-tokens", type=int, default=6000, help="prompt budget of one reduce call")
+    parser.add_argument("--llm-concurrency", type=int, default=8)
+    parser.add_argument("--llm-port", type=int, default=8911)
+    parser.add_argument("--api-port", type=int, default=8912)
+    args = parser.parse_args()
+
+    llm_server, limits = serve(args.llm_port, rpm=0, latency=args.latency)
+    workdir = tempfile.mkdtemp()
+    os.environ.update({
+        "GROK_API_KEY": "fake",
+        "GROK_BASE_URL": f"http://127.0.0.1:{args.llm_port}/v1",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench_document_summary.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "LLM_CACHE_ENABLED": "false",
+        "LLM_RPM": "0",
+        "LLM_TPM": "0",
+        "LLM_MIN_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+        "LLM_LATENCY_TARGET": "3600",
+        # The fake reply has no section markers; separate calls give every page stored summaries
+        "COMBINED_SUMMARIES": "false",
+        "DOCUMENT_SUMMARY_INPUT_TOKENS": str(args.input_tokens),
+        "LOG_LEVEL": "WARNING",
+    })
+    api = start_api(args.api_port)
+    api_url = f"http://127.0.0.1:{args.api_port}"
+
+    print(f"LLM latency {args.latency}s, LLM concurrency {args.llm_concurrency}, reduce prompt budget {args.input_tokens} tokens")
+    print(f"{'pages':>6}{'pages done':>12}{'page calls':>12}{'summary after':>15}{'reduce calls':>14}")
+    rng = random.Random(42)
+    try:
+        for pages in args.pages:
+            result = run(api_url, pages, rng, limits)
+            print(f"{result['pages']:>6}{result['pages_seconds']:>11.1f}s{result['page_calls']:>12}"
+                  f"{result['summary_seconds']:>14.2f}s{result['reduce_calls']:>14}")
+    finally:
+        api.should_exit = True
+        llm_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark per-page LLM latency with model tiers and routing across endpoints.
+
+Usage (from backend/):
+    python benchmarks/bench_model_routing.py [--pages 200] [--page-concurrency 8] [--large-latency 1.0] [--small-latency 0.2] [--error-rate 0.3]
+
+Starts three fake OpenAI-compatible servers standing in for a large model, a small
+model and a second, faster but flaky small-model endpoint (--error-rate of 503s).
+Every page makes the calls of a page whose headings need the LLM: heading extraction
+(`headings` task, 150 tokens), then the streamed page summary (`page_summary`).
+Scenarios:
+
+- single: every call on the large model at one endpoint (no LLM_ENDPOINTS);
+- tiers: headings on the small model, summaries on the large one;
+- two fast endpoints: the small model is also served by the flaky endpoint;
+- failover: as above, with the small-model server failing every request from halfway through.
+
+Reports page latency percentiles, failed pages and the calls each server answered.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import percentile
+from fake_llm_server import serve
+
+MESSAGES = [{"role": "user", "content": "Extract the headings of this page."}]
+
+
+async def page(client, model_for, index: int) -> float:
+    start = time.perf_counter()
+    await client.chat.completions.create(model=model_for("headings"), messages=MESSAGES + [{"role": "user", "content": str(index)}], temperature=0.1, max_tokens=150)
+    stream = await client.chat.completions.create(model=model_for("page_summary"), messages=MESSAGES + [{"role": "user", "content": f"summary {index}"}], stream=True)
+    async for _ in stream:
+        pass
+    return time.perf_counter() - start
+
+
+async def drive(client, model_for, pages: int, concurrency: int, halfway=None) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def limited(index: int):
+        nonlocal done
+        async with semaphore:
+            try:
+                return await page(client, model_for, index)
+            finally:
+                done += 1
+                if halfway and done == pages // 2:
+                    halfway()
+
+    results = await asyncio.gather(*[limited(index) for index in range(pages)], return_exceptions=True)
+    latencies = [result for result in results if isinstance(result, float)]
+    return latencies, len(results) - len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--page-concurrency", type=int, default=8)
+    parser.add_argument("--large-latency", type=float, default=1.0, help="seconds per response of the large model")
+    parser.add_argument("--small-latency", type=float, default=0.2, help="seconds per response of the small model")
+    parser.add_argument("--error-rate", type=float, default=0.3, help="fraction of 503s from the flaky small-model endpoint")
+    parser.add_argument("--ports", type=int, nargs=3, default=[8921, 8922, 8923])
+    args = parser.parse_args()
+
+    os.environ.update({
+        "GROK_API_KEY": "fake",
+        "GROK_MODEL_NAME": "large",
+        "LLM_FAST_MODEL": "small",
+        "LLM_RPM": "0",
+        "LLM_TPM": "0",
+        "LLM_MIN_CONCURRENCY": "16",
+        "LLM_MAX_CONCURRENCY": "16",
+        "LOG_LEVEL": "ERROR",
+    })
+    from openai import AsyncOpenAI
+    from helper.llm import model_for
+    from helper.llm_router import RoutedClient, load_endpoints
+    from helper.rate_limit import RateLimitedClient
+
+    large_port, small_port, flaky_port = args.ports
+    url = "http://127.0.0.1:{}/v1".format
+    large_endpoint = {"name": "large", "base_url": url(large_port), "models": ["large"]}
+    small_endpoint = {"name": "small", "base_url": url(small_port), "models": ["small"]}
+    flaky_endpoint = {"name": "flaky", "base_url": url(flaky_port), "models": {"small": "small-q4"}}
+    single = lambda task: "large"
+
+    print(f"{args.pages} pages, {args.page_concurrency} at a time; large {args.large_latency}s, small {args.small_latency}s, "
+          f"flaky small {args.small_latency / 2}s with {args.error_rate:.0%} errors")
+    print(f"{'scenario':<20}{'p50':>8}{'p95':>8}{'failed':>8}   calls answered (large / small / flaky)")
+    scenarios = [
+        ("single", None, single, False),
+        ("tiers", [large_endpoint, small_endpoint], model_for, False),
+        ("two fast endpoints", [large_endpoint, small_endpoint, flaky_endpoint], model_for, False),
+        ("failover", [large_endpoint, small_endpoint, flaky_endpoint], model_for, True),
+    ]
+    for label, endpoints, models, fail_small in scenarios:
+        large, large_limits = serve(large_port, rpm=0, latency=args.large_latency)
+        small, small_limits = serve(small_port, rpm=0, latency=args.small_latency)
+        flaky, flaky_limits = serve(flaky_port, rpm=0, latency=args.small_latency / 2, error_rate=args.error_rate)
+
+        def halfway():
+            small_limits.error_rate = 1.0
+
+        async def run():
+            if endpoints is None:
+                client = RateLimitedClient(AsyncOpenAI(api_key="fake", base_url=url(large_port), max_retries=0))
+            else:
+                client = RoutedClient(load_endpoints(json.dumps(endpoints)))
+            try:
+                return await drive(client, models, args.pages, args.page_concurrency, halfway if fail_small else None)
+            finally:
+                await client.close()
+
+        latencies, failed = asyncio.run(run())
+        print(f"{label:<20}{percentile(latencies, 0.5):>7.2f}s{percentile(latencies, 0.95):>7.2f}s{failed:>8}   "
+              f"{large_limits.counts['ok']} / {small_limits.counts['ok']} / {flaky_limits.counts['ok']} (+{flaky_limits.counts['errors']} errors)")
+        for server in (large, small, flaky):
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    main()
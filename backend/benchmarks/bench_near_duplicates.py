@@ -0,0 +1,144 @@
+"""
+Benchmark near-duplicate page lookups in the LSH index of a large library.
+
+Usage (from backend/):
+    python benchmarks/bench_near_duplicates.py [--pages 1000000] [--queries 500] [--copies 1000] [--db PATH]
+
+Builds a throwaway SQLite database through the app schema with `--pages` indexed
+pages (random MinHash signatures, so unrelated pages share no band key, like real
+text), plus `--copies` versions of one boilerplate page. Then times lookups of:
+
+- new pages, with no near duplicate (the common case);
+- edited versions of stored pages (about 85% of the signature kept);
+- a version of the boilerplate page, matching every copy.
+
+"index" is the candidate query on a plain connection; "lookup" is
+`find_near_duplicate` as the pipeline calls it (AsyncSession, candidate ranking,
+signature comparison and the section summaries of the match). Also reports the
+cost of computing a signature, paid by the extraction workers.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_search import Vocabulary, percentile
+
+
+def random_signature(rng, minhash) -> bytes:
+    return rng.randbytes(4 * minhash.PERMUTATIONS)
+
+
+def edited(rng, signature: bytes, minhash, keep: float) -> bytes:
+    """A signature sharing about `keep` of its values with `signature`"""
+    values = bytearray(signature)
+    for position in range(minhash.PERMUTATIONS):
+        if rng.random() > keep:
+            values[4 * position:4 * position + 4] = rng.randbytes(4)
+    return bytes(values)
+
+
+def build(db_path: str, pages: int, copies: int, rng, batch: int = 20000):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import database as db_module
+    from helper import minhash
+    from sqlalchemy import text
+    db_module.init_db()
+
+    start = time.perf_counter()
+    boilerplate = random_signature(rng, minhash)
+    stored = []
+    with db_module.engine.begin() as conn:
+        # Building the key index once at the end is much faster than maintaining it per row
+        conn.execute(text("DROP INDEX ix_page_bands_key"))
+        conn.execute(text("INSERT INTO pdfs (id, filename, total_pages) VALUES (1, 'library.pdf', :pages)"), {"pages": pages + copies})
+        page_rows, band_rows = [], []
+        for page_id in range(1, pages + copies + 1):
+            signature = edited(rng, boilerplate, minhash, 0.95) if page_id > pages else random_signature(rng, minhash)
+            if page_id % max(1, pages // 1000) == 0 and page_id <= pages:
+                stored.append(signature)
+            page_rows.append({"id": page_id, "page_number": page_id, "summary": "A summary of the page.", "signature": signature})
+            band_rows += [{"page_id": page_id, "key": key} for key in minhash.band_keys(signature)]
+            if len(page_rows) >= batch:
+                _flush(conn, text, page_rows, band_rows)
+        _flush(conn, text, page_rows, band_rows)
+        conn.execute(text("CREATE INDEX ix_page_bands_key ON page_bands (key)"))
+        conn.execute(text("ANALYZE"))
+    print(f"Indexed {pages + copies} pages ({(pages + copies) * minhash.LSH_BANDS} band keys) in {time.perf_counter() - start:.0f}s "
+          f"({os.path.getsize(db_path) / 1e6:.0f} MB)")
+    return db_module, stored, boilerplate
+
+
+def _flush(conn, text, page_rows, band_rows):
+    conn.execute(text("INSERT INTO page_summaries (id, pdf_id, page_number, title, summary) VALUES (:id, 1, :page_number, '', :summary)"), page_rows)
+    conn.execute(text("INSERT INTO page_fingerprints (page_id, signature) VALUES (:id, :signature)"), page_rows)
+    conn.execute(text("INSERT INTO page_bands (page_id, key) VALUES (:page_id, :key)"), band_rows)
+    page_rows.clear()
+    band_rows.clear()
+
+
+def time_index(db_module, signatures) -> list:
+    """Latency of the candidate query alone (band keys to ranked candidates with their signatures)"""
+    from helper.near_duplicates import CANDIDATES_QUERY, candidate_params
+    latencies = []
+    with db_module.engine.connect() as conn:
+        for signature in signatures:
+            params = candidate_params(signature)
+            start = time.perf_counter()
+            conn.execute(CANDIDATES_QUERY, params).all()
+            latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def time_lookups(db_module, signatures) -> tuple:
+    from helper.near_duplicates import find_near_duplicate
+    latencies, found = [], 0
+    for signature in signatures:
+        start = time.perf_counter()
+        match = await find_near_duplicate(signature)
+        latencies.append(time.perf_counter() - start)
+        found += match is not None
+    await db_module.async_engine.dispose()
+    return latencies, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=500, help="lookups per kind")
+    parser.add_argument("--copies", type=int, default=1000, help="stored versions of one boilerplate page")
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_near_duplicates.db")
+    db_module, stored, boilerplate = build(db_path, args.pages, args.copies, rng)
+    from helper import minhash
+
+    vocabulary = Vocabulary(rng)
+    texts = [" ".join(vocabulary.sentence(rng.randint(10, 20)) for _ in range(25)) for _ in range(50)]
+    start = time.perf_counter()
+    for page_text in texts:
+        minhash.signature(page_text)
+    print(f"Signature of a ~400 word page: {(time.perf_counter() - start) / len(texts) * 1000:.1f} ms (extraction worker)")
+
+    kinds = {
+        "new page": [random_signature(rng, minhash) for _ in range(args.queries)],
+        "edited page": [edited(rng, rng.choice(stored), minhash, 0.85) for _ in range(args.queries)],
+        "boilerplate": [edited(rng, boilerplate, minhash, 0.9) for _ in range(max(1, args.queries // 10))],
+    }
+    print(f"{'':<14}{'index p50/p99':>18}{'lookup p50/p99':>18}{'matched':>10}  (ms)")
+    for label, signatures in kinds.items():
+        index = time_index(db_module, signatures)
+        lookups, found = asyncio.run(time_lookups(db_module, signatures))
+        print(f"{label:<14}{percentile(index, 0.5) * 1000:>9.3f} /{percentile(index, 0.99) * 1000:>6.3f}"
+              f"{percentile(lookups, 0.5) * 1000:>10.3f} /{percentile(lookups, 0.99) * 1000:>6.3f}{found:>7}/{len(signatures)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark compressed page text storage against the former inline `content` column.
+
+Usage (from backend/):
+    python benchmarks/bench_page_storage.py [PDF_DIR] [--pages 20000] [--db PATH]
+
+Builds a database in the previous layout (page text in `page_summaries.content`,
+with the full-text index reading it from there), measures its size and the page
+list and page text queries, then opens it through the app so the migration moves
+the text into compressed `page_contents` rows, and measures again.
+
+With PDF_DIR, pages extracted from every *.pdf in it are used (repeated up to
+--pages); otherwise the synthetic papers of bench_segmentation.py.
+"""
+import os
+import sys
+import time
+import zlib
+import random
+import sqlite3
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_segmentation import load_corpus, synthetic_paper
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE pdfs (id INTEGER PRIMARY KEY, filename VARCHAR, original_filename VARCHAR, file_path VARCHAR, "
+    "content_hash VARCHAR(64), upload_date DATETIME, sections_count INTEGER, total_pages INTEGER, heading_llm_fallbacks INTEGER)",
+    "CREATE TABLE page_summaries (id INTEGER PRIMARY KEY, pdf_id INTEGER, page_number INTEGER, title VARCHAR, "
+    "summary TEXT, content TEXT, created_at DATETIME)",
+    "CREATE INDEX ix_page_summaries_pdf_id_page_number ON page_summaries (pdf_id, page_number)",
+    "CREATE VIRTUAL TABLE page_search USING fts5(content, summary, content='page_summaries', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER page_search_ai AFTER INSERT ON page_summaries BEGIN "
+    "INSERT INTO page_search(rowid, content, summary) VALUES (new.id, new.content, new.summary); END",
+]
+
+LIST_SQL = "SELECT id, pdf_id, page_number, title, summary, created_at FROM page_summaries WHERE pdf_id = ? ORDER BY page_number"
+SCAN_SQL = "SELECT id, title, summary FROM page_summaries"
+LEGACY_TEXT_SQL = "SELECT id, content FROM page_summaries WHERE pdf_id = ? AND page_number = ?"
+TEXT_SQL = (
+    "SELECT p.id, c.data FROM page_summaries p LEFT JOIN page_contents c ON c.page_id = p.id "
+    "WHERE p.pdf_id = ? AND p.page_number = ?"
+)
+
+
+def build_legacy(db_path, papers, pages, rng):
+    conn = sqlite3.connect(db_path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    page_id = pdf_id = 0
+    while page_id < pages:
+        paper = papers[pdf_id % len(papers)]
+        pdf_id += 1
+        conn.execute("INSERT INTO pdfs (id, filename, total_pages, sections_count) VALUES (?, ?, ?, 0)",
+                     (pdf_id, f"paper-{pdf_id}.pdf", len(paper)))
+        rows = []
+        for page_number, text in paper[:pages - page_id]:
+            page_id += 1
+            summary = " ".join(rng.sample(text.split(), min(60, len(text.split()))))
+            rows.append((page_id, pdf_id, page_number, "", summary, text))
+        conn.executemany("INSERT INTO page_summaries (id, pdf_id, page_number, title, summary, content, created_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?, datetime('now'))", rows)
+    conn.commit()
+    conn.close()
+    return pdf_id
+
+
+def measure(db_path, pdf_count, rng, text_sql, inflate):
+    """Median milliseconds of the page list, a scan of all pages, and single page text loads, on a fresh connection"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA cache_size=-2000")  # Small cache, so the table size shows up in the timings
+    timings = {"list pages": [], "scan pages": [], "page text": []}
+    for _ in range(200):
+        pdf_id = rng.randint(1, pdf_count)
+        start = time.perf_counter()
+        conn.execute(LIST_SQL, (pdf_id,)).fetchall()
+        timings["list pages"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        row = conn.execute(text_sql, (pdf_id, 1)).fetchone()
+        if row and inflate:
+            zlib.decompress(row[1]).decode("utf-8")
+        timings["page text"].append(time.perf_counter() - start)
+    for _ in range(5):
+        start = time.perf_counter()
+        conn.execute(SCAN_SQL).fetchall()
+        timings["scan pages"].append(time.perf_counter() - start)
+    conn.close()
+    return {name: sorted(values)[len(values) // 2] * 1000 for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_dir", nargs="?")
+    parser.add_argument("--pages", type=int, default=20000)
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    papers = load_corpus(args.pdf_dir) if args.pdf_dir else [synthetic_paper(rng, pages=rng.randint(8, 40)) for _ in range(200)]
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_page_storage.db")
+    pdf_count = build_legacy(db_path, papers, args.pages, rng)
+    before_size = os.path.getsize(db_path)
+    before = measure(db_path, pdf_count, random.Random(1), LEGACY_TEXT_SQL, inflate=False)
+
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import database as db_module
+    start = time.perf_counter()
+    db_module.init_db()
+    migration = time.perf_counter() - start
+    db_module.engine.dispose()
+    after_size = os.path.getsize(db_path)
+    after = measure(db_path, pdf_count, random.Random(1), TEXT_SQL, inflate=True)
+
+    print(f"{args.pages} pages of {pdf_count} PDFs, migrated in {migration:.1f}s")
+    print(f"{'':<14}{'inline':>12}{'compressed':>12}")
+    print(f"{'db size (MB)':<14}{before_size / 1e6:>12.1f}{after_size / 1e6:>12.1f}")
+    for name in before:
+        print(f"{name + ' (ms)':<14}{before[name]:>12.3f}{after[name]:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
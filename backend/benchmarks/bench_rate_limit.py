@@ -0,0 +1,78 @@
+"""
+Drive the rate-limited LLM client against the fake OpenAI-compatible server.
+
+Usage (from backend/):
+    python benchmarks/bench_rate_limit.py [--requests 200] [--server-rpm 120] [--error-rate 0.05]
+
+Fires all requests at once, half of them streamed, through the raw client and through
+RateLimitedClient, and reports successes, failures, retries and wall time.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI
+from helper.rate_limit import RateLimitedClient
+from fake_llm_server import serve
+
+
+async def one_request(client, index: int) -> bool:
+    params = {
+        "model": "fake",
+        "messages": [{"role": "user", "content": f"Summarize page {index}"}],
+        "max_tokens": 100
+    }
+    try:
+        if index % 2:
+            stream = await client.chat.completions.create(stream=True, **params)
+            async for _ in stream:
+                pass
+        else:
+            await client.chat.completions.create(**params)
+        return True
+    except Exception:
+        return False
+
+
+async def drive(client, requests: int) -> tuple:
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one_request(client, i) for i in range(requests)])
+    return sum(results), requests - sum(results), time.perf_counter() - start
+
+
+async def run(args):
+    base_url = f"http://127.0.0.1:{args.port}/v1"
+
+    server, limits = serve(args.port, args.server_rpm, args.error_rate, args.latency)
+    raw = AsyncOpenAI(api_key="fake", base_url=base_url, max_retries=0)
+    ok, failed, elapsed = await drive(raw, args.requests)
+    print(f"{'raw client':<16} ok={ok:<5} failed={failed:<5} time={elapsed:.1f}s server={limits.counts}")
+    server.shutdown()
+    server.server_close()
+
+    server, limits = serve(args.port, args.server_rpm, args.error_rate, args.latency)
+    limited = RateLimitedClient(AsyncOpenAI(api_key="fake", base_url=base_url, max_retries=0), rpm=args.client_rpm, tpm=0)
+    ok, failed, elapsed = await drive(limited, args.requests)
+    print(f"{'rate limited':<16} ok={ok:<5} failed={failed:<5} time={elapsed:.1f}s server={limits.counts} client={limited.info()}")
+    server.shutdown()
+    server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--server-rpm", type=float, default=120, help="limit enforced by the fake server")
+    parser.add_argument("--client-rpm", type=float, default=0, help="client-side RPM bucket (0 = rely on 429s only)")
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.2)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
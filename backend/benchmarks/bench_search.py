@@ -0,0 +1,159 @@
+"""
+Benchmark full-text search latency on a synthetic library.
+
+Usage (from backend/):
+    python benchmarks/bench_search.py [--pages 100000] [--queries 50] [--db PATH]
+
+Builds a throwaway SQLite database (through the app schema, so the FTS5 tables and
+sync triggers are the real ones), inserts `--pages` pages with two section summaries
+each, then runs queries through the /search implementation and reports latency
+percentiles by how common the searched terms are.
+
+Words are drawn from a synthetic vocabulary with Zipfian frequencies, so the most
+common terms appear on nearly every page and the long tail on a handful, like real text.
+"""
+import os
+import sys
+import time
+import bisect
+import asyncio
+import random
+import argparse
+import tempfile
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYLLABLES = "ka lo mi ne ru sa ti vo pe da gu ri zo fe bi na te ly".split()
+
+
+class Vocabulary:
+    """Synthetic words ranked by frequency; rank r is drawn with probability proportional to 1 / (r + 1)"""
+
+    def __init__(self, rng, size=30000):
+        words = dict.fromkeys("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(2 * size))
+        self.words = list(words)[:size]
+        self.cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(self.words))))
+        self.rng = rng
+
+    def word(self):
+        return self.words[bisect.bisect(self.cumulative, self.rng.random() * self.cumulative[-1])]
+
+    def sentence(self, words):
+        return " ".join(self.word() for _ in range(words)) + "."
+
+
+def build(db_path, pages, pages_per_pdf, vocabulary):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    import database as db_module
+    from sqlalchemy import text
+    db_module.init_db()
+
+    start = time.perf_counter()
+    with db_module.engine.begin() as conn:
+        pdf_count = (pages + pages_per_pdf - 1) // pages_per_pdf
+        conn.execute(text("INSERT INTO pdfs (id, filename, total_pages) VALUES (:id, :filename, :pages)"),
+                     [{"id": i + 1, "filename": f"paper-{i + 1}.pdf", "pages": pages_per_pdf} for i in range(pdf_count)])
+        page_rows, section_rows = [], []
+        for page_id in range(1, pages + 1):
+            pdf_id = (page_id - 1) // pages_per_pdf + 1
+            page_number = (page_id - 1) % pages_per_pdf + 1
+            content = " ".join(vocabulary.sentence(vocabulary.rng.randint(10, 20)) for _ in range(25))
+            page_rows.append({"id": page_id, "pdf_id": pdf_id, "page_number": page_number, "title": "", "summary": vocabulary.sentence(40),
+                              "data": db_module.compress_text(content)})
+            for _ in range(2):
+                section_rows.append({"page_id": page_id, "pdf_id": pdf_id, "page_number": page_number,
+                                     "section_title": " ".join(vocabulary.word().title() for _ in range(2)), "summary": vocabulary.sentence(30)})
+            if len(page_rows) >= 5000:
+                _flush(conn, text, page_rows, section_rows)
+        _flush(conn, text, page_rows, section_rows)
+    print(f"Indexed {pages} pages and {2 * pages} sections in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(db_path) / 1e6:.0f} MB)")
+    return db_module
+
+
+def _flush(conn, text, page_rows, section_rows):
+    if page_rows:
+        conn.execute(text("INSERT INTO page_summaries (id, pdf_id, page_number, title, summary) "
+                          "VALUES (:id, :pdf_id, :page_number, :title, :summary)"), page_rows)
+        conn.execute(text("INSERT INTO page_contents (page_id, data) VALUES (:id, :data)"), page_rows)
+    if section_rows:
+        conn.execute(text("INSERT INTO section_summaries (page_id, pdf_id, page_number, section_title, summary) "
+                          "VALUES (:page_id, :pdf_id, :page_number, :section_title, :summary)"), section_rows)
+    page_rows.clear()
+    section_rows.clear()
+
+
+# (label, rank range) of the vocabulary the query terms are picked from
+TERM_BANDS = [
+    ("very common", (0, 10)),
+    ("common", (10, 100)),
+    ("mid", (100, 1000)),
+    ("rare", (1000, 10000)),
+]
+
+
+def queries(rng, vocabulary, band, count):
+    """Single words, two-word AND queries and prefix queries over terms of one frequency band"""
+    low, high = band
+    pick = lambda: vocabulary.words[rng.randrange(low, high)]
+    shapes = [
+        lambda: pick(),
+        lambda: f"{pick()} {pick()}",
+        lambda: pick()[:4] + "*",
+    ]
+    return [rng.choice(shapes)() for _ in range(count)]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=100000)
+    parser.add_argument("--pages-per-pdf", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=50, help="queries per term frequency band")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--db", help="database file (default: a temporary file)")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    vocabulary = Vocabulary(rng)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench_search.db")
+    db_module = build(db_path, args.pages, args.pages_per_pdf, vocabulary)
+    from helper.search import search
+
+    print(f"{'terms':<13}{'first page p50/p95':>20}{'third page p50/p95':>20}{'single pdf p50/p95':>20}  (ms)")
+    asyncio.run(run_queries(db_module, search, rng, vocabulary, args))
+
+
+async def run_queries(db_module, search, rng, vocabulary, args):
+    async with db_module.AsyncSessionLocal() as db:
+        for label, band in TERM_BANDS:
+            latencies = {"first page": [], "third page": [], "single pdf": []}
+            for query in queries(rng, vocabulary, band, args.queries):
+                start = time.perf_counter()
+                first = await search(db, query, args.limit)
+                latencies["first page"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                cursor = first["next_cursor"]
+                for _ in range(2):
+                    if cursor:
+                        cursor = (await search(db, query, args.limit, cursor))["next_cursor"]
+                latencies["third page"].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                await search(db, query, args.limit, pdf_id=rng.randint(1, args.pages // args.pages_per_pdf))
+                latencies["single pdf"].append(time.perf_counter() - start)
+
+            cells = "".join(
+                f"{percentile(values, 0.5) * 1000:>12.1f} /{percentile(values, 0.95) * 1000:>6.1f}" for values in latencies.values()
+            )
+            print(f"{label:<13}{cells}")
+    await db_module.async_engine.dispose()
+
+if __name__ == "__main__":
+    main()
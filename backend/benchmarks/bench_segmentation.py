@@ -0,0 +1,174 @@
+"""
+Benchmark the document segmentation engine against the previous per-page functions.
+
+Usage (from backend/):
+    python benchmarks/bench_segmentation.py [PDF_DIR] [--repeat N]
+
+With PDF_DIR, every *.pdf in it is extracted once with PyPDF2 and used as the corpus;
+otherwise a synthetic corpus of papers is generated.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.segmentation import detect_headings, segment_document, flatten_sections
+
+
+# --- Previous implementations, kept verbatim for comparison -----------------
+
+def legacy_page_headings(page_content):
+    import re
+    found_headings = []
+    patterns = [
+        r'^(\d+(?:\.\d+)+\.?\s+[A-Z][^\n]{3,100})$',
+        r'^(\d+\.\s+[A-Z][^\n]{3,100})$',
+        r'^([A-Z][A-Z\s]{3,50})$',
+        r'^([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,7})$'
+    ]
+    for line in page_content.split('\n'):
+        line = line.strip()
+        if not line or len(line) < 3:
+            continue
+        for pattern in patterns:
+            match = re.match(pattern, line, re.MULTILINE)
+            if match:
+                title = match.group(1).strip()
+                if 3 <= len(title) <= 100 and not title.endswith('.'):
+                    if title not in found_headings:
+                        found_headings.append(title)
+                    break
+    return found_headings
+
+
+def legacy_find_section_pages(section_text, page_texts):
+    search_text = section_text[:200].strip()
+    start_page = None
+    end_page = None
+    for page_num, page_text in page_texts:
+        if search_text in page_text:
+            if start_page is None:
+                start_page = page_num
+            end_page = page_num
+    return start_page or 1, end_page or 1
+
+
+def legacy_extract_sections(text, page_texts):
+    section_markers = [
+        "abstract", "introduction", "related work", "methodology",
+        "methods", "approach", "dataset", "experiments", "experimental setup",
+        "results", "discussion", "conclusion", "future work", "references"
+    ]
+    sections = []
+    current_section = ""
+    current_title = ""
+    for line in text.split('\n'):
+        line_lower = line.lower().strip()
+        if any(marker in line_lower for marker in section_markers) and len(line) < 100:
+            if current_section:
+                start_page, end_page = legacy_find_section_pages(current_section, page_texts)
+                sections.append({"title": current_title, "content": current_section, "start_page": start_page, "end_page": end_page})
+            current_title = line.strip()
+            current_section = line + "\n"
+        else:
+            current_section += line + "\n"
+    if current_section:
+        start_page, end_page = legacy_find_section_pages(current_section, page_texts)
+        sections.append({"title": current_title or "Introduction", "content": current_section, "start_page": start_page, "end_page": end_page})
+    return sections
+
+
+# --- Corpus ------------------------------------------------------------------
+
+WORDS = "model data results method analysis training network performance learning approach we show that the of and in".split()
+SECTIONS = ["Introduction", "Related Work", "Methodology", "Experiments", "Results", "Discussion", "Conclusion"]
+
+
+def synthetic_paper(rng, pages=12, lines_per_page=55):
+    page_texts = []
+    section_no = 0
+    for page_num in range(1, pages + 1):
+        lines = []
+        for _ in range(lines_per_page):
+            roll = rng.random()
+            if roll < 0.02 and section_no < len(SECTIONS):
+                section_no += 1
+                lines.append(f"{section_no}. {SECTIONS[section_no - 1]}")
+            elif roll < 0.05 and section_no:
+                lines.append(f"{section_no}.{rng.randint(1, 5)}. {rng.choice(WORDS).title()} {rng.choice(WORDS).title()}")
+            else:
+                lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 16))) + ".")
+        page_texts.append((page_num, "\n".join(lines)))
+    return page_texts
+
+
+def load_corpus(pdf_dir):
+    from PyPDF2 import PdfReader
+    corpus = []
+    for name in sorted(os.listdir(pdf_dir)):
+        if name.lower().endswith(".pdf"):
+            reader = PdfReader(os.path.join(pdf_dir, name))
+            corpus.append([(i + 1, page.extract_text() or "") for i, page in enumerate(reader.pages)])
+    return corpus
+
+
+def timed(fn, corpus, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for paper in corpus:
+            fn(paper)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf_dir", nargs="?")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--papers", type=int, default=200, help="size of the synthetic corpus")
+    args = parser.parse_args()
+
+    if args.pdf_dir:
+        corpus = load_corpus(args.pdf_dir)
+    else:
+        rng = random.Random(42)
+        corpus = [synthetic_paper(rng, pages=rng.randint(8, 40)) for _ in range(args.papers)]
+    total_pages = sum(len(paper) for paper in corpus)
+    print(f"Corpus: {len(corpus)} papers, {total_pages} pages")
+
+    def legacy_headings(paper):
+        for _, text in paper:
+            legacy_page_headings(text)
+
+    def new_headings(paper):
+        for _, text in paper:
+            detect_headings(text)
+
+    def legacy_sections(paper):
+        legacy_extract_sections("\n".join(text for _, text in paper), paper)
+
+    def new_sections(paper):
+        flatten_sections(segment_document(paper, include_content=True))
+
+    rows = [
+        ("per-page headings", timed(legacy_headings, corpus, args.repeat), timed(new_headings, corpus, args.repeat)),
+        ("document sections", timed(legacy_sections, corpus, args.repeat), timed(new_sections, corpus, args.repeat)),
+    ]
+    print(f"{'benchmark':<20}{'legacy (s)':>12}{'engine (s)':>12}{'speedup':>10}")
+    for name, legacy, new in rows:
+        print(f"{name:<20}{legacy:>12.4f}{new:>12.4f}{legacy / new:>9.1f}x")
+
+    # Sanity check: the per-page heading detection is unchanged
+    mismatches = sum(
+        legacy_page_headings(text) != detect_headings(text)
+        for paper in corpus for _, text in paper
+    )
+    print(f"per-page heading mismatches vs legacy: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark cold start: importing the app, and launching uvicorn until every worker answers.
+
+Usage (from backend/):
+    python benchmarks/bench_startup.py [--workers 1 4] [--runs 5] [--app main:create_app | --app main:app --no-factory]
+
+Each run is a fresh interpreter on a fresh database, uploads directory and LLM cache
+(all temporary). "import" is the time to import `main` and build the app; "ready"
+is the time from launching `uvicorn` until GET /health answers, and with several
+workers until each of them has answered once (told apart by the `worker` id of
+/health). "shutdown" is the time from SIGINT until the server has exited.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import shutil
+import argparse
+import tempfile
+import subprocess
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module}
+app = {module}.{attr}{call}
+print(time.perf_counter() - start)
+"""
+
+
+def fresh_env(workdir: str) -> dict:
+    return {
+        **os.environ,
+        "GROK_API_KEY": os.environ.get("GROK_API_KEY", "unused"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+        "UPLOAD_DIR": os.path.join(workdir, "uploads"),
+        "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+def time_import(app: str, factory: bool, workdir: str) -> float:
+    module, attr = app.split(":")
+    code = IMPORT_SNIPPET.format(module=module, attr=attr, call="()" if factory else "")
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=fresh_env(workdir),
+                            capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def time_serve(app: str, factory: bool, workers: int, port: int, workdir: str) -> tuple:
+    command = [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--log-level", "warning"]
+    if factory:
+        command.append("--factory")
+    start = time.perf_counter()
+    server = subprocess.Popen(command, cwd=BACKEND_DIR, env=fresh_env(workdir), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    seen, first = set(), None
+    try:
+        deadline = start + 60
+        while time.perf_counter() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited: {server.stderr.read().decode()[-500:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1) as response:
+                    health = json.loads(response.read())
+            except OSError:
+                time.sleep(0.005)
+                continue
+            first = first or time.perf_counter() - start
+            # Trees without worker ids count as one worker
+            seen.add((health.get("worker") or {}).get("id"))
+            if len(seen) >= workers or None in seen:
+                break
+        ready = time.perf_counter() - start
+    finally:
+        stop = time.perf_counter()
+        server.send_signal(signal.SIGINT)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return first, ready, time.perf_counter() - stop
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--app", default="main:create_app")
+    parser.add_argument("--factory", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8903)
+    args = parser.parse_args()
+
+    imports = []
+    for _ in range(args.runs):
+        workdir = tempfile.mkdtemp()
+        imports.append(time_import(args.app, args.factory, workdir))
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(f"{args.app}{' (factory)' if args.factory else ''}, median of {args.runs} runs")
+    print(f"{'import':<22}{median(imports) * 1000:>8.0f} ms")
+
+    for workers in args.workers:
+        results = []
+        for _ in range(args.runs):
+            workdir = tempfile.mkdtemp()
+            results.append(time_serve(args.app, args.factory, workers, args.port, workdir))
+            shutil.rmtree(workdir, ignore_errors=True)
+        first, ready, shutdown = (median(values) for values in zip(*results))
+        label = f"{workers} worker{'s' if workers > 1 else ''}"
+        print(f"{label + ' first answer':<22}{first * 1000:>8.0f} ms")
+        if workers > 1:
+            print(f"{label + ' all ready':<22}{ready * 1000:>8.0f} ms")
+        print(f"{label + ' shutdown':<22}{shutdown * 1000:>8.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Minimal OpenAI-compatible chat completions server for exercising the LLM client offline.
+
+Usage (from backend/):
+    python benchmarks/fake_llm_server.py [--port 8900] [--rpm 60] [--error-rate 0.05] [--latency 0.5]
+
+Then start the API with GROK_BASE_URL=http://127.0.0.1:8900/v1 (any GROK_API_KEY).
+Requests above --rpm get a 429 with a Retry-After header, a fraction of requests fail
+with a 503, and every response (streamed or not) takes about --latency seconds.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY = "This page describes the proposed method and reports its main results on the benchmark datasets."
+
+
+class FakeLimits:
+    def __init__(self, rpm: float, error_rate: float, latency: float):
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.latency = latency
+        self.window = []
+        self.lock = threading.Lock()
+        self.counts = {"ok": 0, "throttled": 0, "errors": 0}
+        self.scripted = []
+
+    def fail(self, status: int, times: int = 1, retry_after=None):
+        """Answer the next `times` requests with `status` (and a Retry-After header, if given)"""
+        with self.lock:
+            self.scripted += [(status, retry_after)] * times
+
+    def admit(self):
+        """None if the request may proceed, otherwise (status, retry_after)"""
+        now = time.monotonic()
+        with self.lock:
+            if self.scripted:
+                status, retry_after = self.scripted.pop(0)
+                self.counts["throttled" if status == 429 else "errors"] += 1
+                return status, retry_after
+            self.window = [t for t in self.window if now - t < 60]
+            if self.rpm and len(self.window) >= self.rpm:
+                self.counts["throttled"] += 1
+                return 429, max(1, int(60 - (now - self.window[0])) + 1)
+            if random.random() < self.error_rate:
+                self.counts["errors"] += 1
+                return 503, None
+            self.window.append(now)
+            self.counts["ok"] += 1
+        return None
+
+
+def make_handler(limits: FakeLimits):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, status, body, headers=None):
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def do_POST(self):
+            if not self.path.endswith("/chat/completions"):
+                return self._json(404, {"error": {"message": "not found"}})
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+            rejected = limits.admit()
+            if rejected:
+                status, retry_after = rejected
+                headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+                return self._json(status, {"error": {"message": "rate limited" if status == 429 else "unavailable"}}, headers)
+
+            model = request.get("model", "fake")
+            if not request.get("stream"):
+                time.sleep(limits.latency)
+                return self._json(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": REPLY}, "finish_reason": "stop"}],
+                    "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}
+                })
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            words = REPLY.split(" ")
+            for index, word in enumerate(words):
+                time.sleep(limits.latency / len(words))
+                chunk = {
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if index == 0 else " " + word}, "finish_reason": None}]
+                }
+                if index == len(words) - 1:
+                    # Groq reports usage on the last chunk
+                    chunk["x_groq"] = {"usage": {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words)}}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return Handler
+
+
+def serve(port: int = 8900, rpm: float = 60, error_rate: float = 0.0, latency: float = 0.5):
+    """Start the server in a daemon thread and return (server, limits)"""
+    limits = FakeLimits(rpm, error_rate, latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(limits))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, limits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--rpm", type=float, default=60, help="requests per minute before answering 429 (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds per response")
+    args = parser.parse_args()
+
+    server, limits = serve(args.port, args.rpm, args.error_rate, args.latency)
+    print(f"Fake LLM server on http://127.0.0.1:{args.port}/v1 (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"counts: {limits.counts}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Whole-paper summary, reduced from the stored page and section summaries.
+
+The page and section summaries written by the pipeline are the map output: they are
+read back from the database (the raw text is never sent to the LLM again), packed
+into groups of consecutive pages that fit DOC_SUMMARY_INPUT_TOKENS, and each group
+is condensed by one LLM call. All groups of a level are condensed concurrently and
+levels repeat until everything fits a single prompt, which gives the final summary
+stored in `PDF.summary`. A paper whose summaries fit one prompt needs one call; a
+long one needs a few rounds, each as slow as a single call.
+"""
+import os
+import json
+import time
+import asyncio
+from typing import List, Optional, Tuple
+from sqlalchemy import select
+import database as db_module
+from database import PDF, PageSummary, SectionSummary
+from helper import persistence
+from helper.llm import get_client, model_for
+from helper.metrics import DOCUMENT_SUMMARY_SECONDS
+from helper.process_help import is_failed_summary
+from helper.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+# Summarize the whole paper once its pages are summarized
+DOCUMENT_SUMMARY_ENABLED = os.getenv("DOCUMENT_SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Completion budgets of the intermediate (part) summaries and of the final summary
+PARTIAL_SUMMARY_TOKENS = 300
+FINAL_SUMMARY_TOKENS = 600
+# Prompt budget of one reduce call (summaries only, 4 characters per token); at least a few partial summaries
+DOCUMENT_SUMMARY_INPUT_TOKENS = max(4 * PARTIAL_SUMMARY_TOKENS, int(os.getenv("DOCUMENT_SUMMARY_INPUT_TOKENS", 6000)))
+
+# (first page, last page, text) of a page or of a condensed run of pages
+Part = Tuple[int, int, str]
+
+
+def _tokens(text: str) -> int:
+    return len(text) // 4
+
+
+def format_page(page_number: int, title: str, summary: str, sections: List[tuple]) -> str:
+    """One page of map output: its heading path, summary and section summaries"""
+    lines = [f"Page {page_number}" + (f" — {title}" if title else "")]
+    if not is_failed_summary(summary):
+        lines.append(summary.strip())
+    lines += [f"- {heading}: {section_summary.strip()}" for heading, section_summary in sections if section_summary]
+    return "\n".join(lines)
+
+
+async def load_map_output(pdf_id: int) -> List[Part]:
+    """The stored summaries of a PDF as one part per page, skipping pages with nothing summarized"""
+    async with db_module.AsyncSessionLocal() as db:
+        pages = (await db.execute(
+            select(PageSummary.id, PageSummary.page_number, PageSummary.title, PageSummary.summary)
+            .where(PageSummary.pdf_id == pdf_id).order_by(PageSummary.page_number)
+        )).all()
+        sections = (await db.execute(
+            select(SectionSummary.page_id, SectionSummary.section_title, SectionSummary.summary)
+            .where(SectionSummary.pdf_id == pdf_id).order_by(SectionSummary.page_number, SectionSummary.id)
+        )).all()
+    sections_by_page = {}
+    for page_id, heading, section_summary in sections:
+        sections_by_page.setdefault(page_id, []).append((heading, section_summary))
+
+    parts = []
+    for page_id, page_number, title, summary in pages:
+        page_sections = sections_by_page.get(page_id, [])
+        if is_failed_summary(summary) and not page_sections:
+            continue
+        parts.append((page_number, page_number, format_page(page_number, title, summary, page_sections)))
+    return parts
+
+
+def pack(parts: List[Part], budget: int = DOCUMENT_SUMMARY_INPUT_TOKENS) -> List[List[Part]]:
+    """
+    Split consecutive parts into groups whose text fits `budget` tokens.
+
+    A part is cut to half the budget, so every group but the last holds at least two
+    parts and each level of the reduction at least halves their number.
+    """
+    max_chars = budget * 2
+    groups, group, used = [], [], 0
+    for first, last, text in parts:
+        text = text[:max_chars]
+        if group and used + _tokens(text) > budget:
+            groups.append(group)
+            group, used = [], 0
+        group.append((first, last, text))
+        used += _tokens(text)
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _page_range(first: int, last: int) -> str:
+    return f"Page {first}" if first == last else f"Pages {first}–{last}"
+
+
+async def _reduce(group: List[Part], final: bool) -> str:
+    """Condense a group of parts with one LLM call"""
+    notes = "\n\n".join(text for _, _, text in group)
+    if final:
+        prompt = f"""Below are summaries of every part of a research paper, in order.
+
+        {notes}
+
+        Write a summary of the WHOLE paper (150-250 words): the problem, the approach,
+        the main results with their key numbers, and the conclusions.
+        Rules:
+        - Use only the information in the summaries above
+        - Plain text, no formatting"""
+    else:
+        prompt = f"""Below are summaries of consecutive pages of a research paper ({_page_range(group[0][0], group[-1][1]).lower()}).
+
+        {notes}
+
+        Combine them into ONE summary of this part of the paper (maximum 150 words).
+        Keep the methods, results, key numbers and conclusions; drop repetitions.
+        Plain text, no formatting."""
+
+    response = await get_client().chat.completions.create(
+        model=model_for("document_summary"),
+        messages=[
+            {"role": "system", "content": "You are a helpful research assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.3,
+        max_tokens=FINAL_SUMMARY_TOKENS if final else PARTIAL_SUMMARY_TOKENS
+    )
+    return response.choices[0].message.content.strip()
+
+
+async def reduce_parts(parts: List[Part], budget: int = DOCUMENT_SUMMARY_INPUT_TOKENS) -> str:
+    """Reduce parts level by level, condensing the groups of a level concurrently, into the final summary"""
+    level = 0
+    groups = pack(parts, budget)
+    while len(groups) > 1:
+        level += 1
+        log.debug("Document summary level %d: %d part(s) in %d group(s)", level, len(parts), len(groups))
+        summaries = await asyncio.gather(*(_reduce(group, final=False) for group in groups))
+        parts = [
+            (group[0][0], group[-1][1], f"{_page_range(group[0][0], group[-1][1])}\n{summary}")
+            for group, summary in zip(groups, summaries)
+        ]
+        groups = pack(parts, budget)
+    return await _reduce(groups[0], final=True)
+
+
+async def summarize_document(pdf_id: int) -> Optional[str]:
+    """Compute and store the whole-paper summary of a PDF; None when no page has a summary"""
+    parts = await load_map_output(pdf_id)
+    if not parts:
+        log.info("No page summaries to summarize for PDF %d", pdf_id)
+        return None
+    start = time.perf_counter()
+    summary = await reduce_parts(parts)
+    await persistence.writer.run(
+        lambda session: session.query(PDF).filter(PDF.id == pdf_id).update({PDF.summary: summary})
+    )
+    elapsed = time.perf_counter() - start
+    DOCUMENT_SUMMARY_SECONDS.observe(elapsed)
+    log.info("Summarized PDF %d from %d page(s) in %.2fs", pdf_id, len(parts), elapsed)
+    return summary
+
+
+def document_summary_event(pdf_id: int, summary: str) -> str:
+    """Build the `document_summary` SSE event carrying the whole-paper summary"""
+    return f"data: {json.dumps({'type': 'document_summary', 'pdf_id': pdf_id, 'summary': summary})}\n\n"
+
+
+async def document_summary_stream(pdf_id: int):
+    """Summarize the whole paper after its pages, yielding the `document_summary` (or error) SSE event"""
+    if not DOCUMENT_SUMMARY_ENABLED:
+        return
+    try:
+        with span("document_summary"):
+            summary = await summarize_document(pdf_id)
+    except Exception as e:
+        log.exception("Document summary failed for PDF %d: %s", pdf_id, e)
+        # The page summaries are unaffected; GET /pdfs/{pdf_id}/summary tries again
+        yield f"data: {json.dumps({'type': 'document_summary_error', 'pdf_id': pdf_id, 'message': str(e)[:200]})}\n\n"
+        return
+    if summary:
+        yield document_summary_event(pdf_id, summary)
@@ -0,0 +1,176 @@
+import os
+import time
+import mmap
+import signal
+import asyncio
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from helper.minhash import signature
+from helper.segmentation import detect_layout_headings
+from helper.metrics import EXTRACTION_SECONDS
+from helper.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+# PyPDF2 text extraction runs in a process pool so it never holds the event loop
+EXTRACT_WORKERS = max(1, int(os.getenv("EXTRACT_WORKERS", min(4, os.cpu_count() or 1))))
+EXTRACT_PAGE_TIMEOUT = float(os.getenv("EXTRACT_PAGE_TIMEOUT", 30))
+# How many pages are extracted ahead of the consumer
+EXTRACT_PREFETCH = max(1, int(os.getenv("EXTRACT_PREFETCH", EXTRACT_WORKERS * 2)))
+
+_executor = None
+
+# Per worker process: the reader of the most recently used file, with the (inode, mtime, size) it was opened at
+_worker_reader = {"path": None, "identity": None, "reader": None}
+
+
+def open_reader(file_path: str):
+    """Open a PDF through a read-only memory map instead of loading the file into memory; see close_reader"""
+    from PyPDF2 import PdfReader  # Deferred: only workers reading PDFs pay for the import
+    with open(file_path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return PdfReader(mapped)
+
+
+def close_reader(reader):
+    """Unmap the file of a reader from open_reader (the mapping keeps a deleted file's space in use)"""
+    reader.stream.close()
+
+
+def count_pages(file_path: str) -> int:
+    reader = open_reader(file_path)
+    try:
+        return len(reader.pages)
+    finally:
+        close_reader(reader)
+
+
+def _release_worker_reader():
+    if _worker_reader["reader"] is not None:
+        close_reader(_worker_reader["reader"])
+    _worker_reader.update(path=None, identity=None, reader=None)
+
+
+def _reader_for(file_path: str):
+    """The cached reader of `file_path`, reopened when another file is read or this one was replaced or deleted"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        _release_worker_reader()
+        raise
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if _worker_reader["path"] != file_path or _worker_reader["identity"] != identity:
+        _release_worker_reader()
+        _worker_reader.update(path=file_path, identity=identity, reader=open_reader(file_path))
+    return _worker_reader["reader"]
+
+
+def _on_timeout(signum, frame):
+    raise TimeoutError("page extraction timed out")
+
+
+def _extract_page(file_path: str, page_index: int, timeout: float) -> dict:
+    """Extract the text, layout-detected headings and MinHash signature of one page (runs inside a pool worker)"""
+    started = time.perf_counter()
+    reader = _reader_for(file_path)
+
+    # Enforce the timeout inside the worker too, so a pathological page cannot wedge it
+    use_alarm = hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    fragments = []
+
+    def visitor(text, cm, tm, font_dict, font_size):
+        # Effective size and baseline from the text and current transformation matrices
+        if not text or not font_size:
+            return
+        scale = abs(tm[3] * cm[3]) or 1.0
+        base_font = str(font_dict.get("/BaseFont", "")) if font_dict else ""
+        bold = "bold" in base_font.lower() or "black" in base_font.lower()
+        fragments.append((text, float(font_size) * scale, bold, tm[5] * cm[3] + cm[5]))
+
+    try:
+        text = reader.pages[page_index].extract_text(visitor_text=visitor) or ""
+        headings = detect_layout_headings(fragments)
+        # Measured in the worker (metrics live in the parent process), excluding pool queueing
+        return {
+            "text": text,
+            "headings": headings,
+            "has_layout": bool(fragments),
+            "minhash": signature(text),
+            "seconds": time.perf_counter() - started
+        }
+    finally:
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _reset_executor(broken: ProcessPoolExecutor):
+    """Replace a pool whose worker died (e.g. killed for memory on a bad page); the next page gets a fresh one"""
+    global _executor
+    if _executor is broken:
+        _executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def extract_page_text(file_path: str, page_index: int, timeout: float = EXTRACT_PAGE_TIMEOUT) -> dict:
+    """Extract one page in the process pool, retrying once on a fresh pool if a worker died; raises on failure"""
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        executor = get_executor()
+        try:
+            with span("extract", page=page_index + 1):
+                future = loop.run_in_executor(executor, _extract_page, file_path, page_index, timeout)
+                # Small grace period on top of the in-worker alarm
+                extraction = await asyncio.wait_for(future, timeout + 1)
+            EXTRACTION_SECONDS.observe(extraction["seconds"])
+            return extraction
+        except BrokenProcessPool:
+            log.error("Extraction pool broke on page %d, restarting it", page_index + 1)
+            _reset_executor(executor)
+            if attempt:
+                raise
+        except (asyncio.TimeoutError, TimeoutError):
+            raise TimeoutError(f"text extraction timed out after {timeout}s")
+
+
+async def extract_pages_stream(file_path: str, total_pages: int, prefetch: int = EXTRACT_PREFETCH):
+    """
+    Yield (page_num, extraction) in page order while up to `prefetch` pages are extracted ahead.
+
+    A page that cannot be extracted yields empty text with its `error`, so the other
+    pages (and the document outline) still go through.
+    """
+    pending = {}
+    next_to_submit = 0
+    try:
+        for page_index in range(total_pages):
+            while next_to_submit < total_pages and len(pending) < prefetch:
+                pending[next_to_submit] = asyncio.ensure_future(extract_page_text(file_path, next_to_submit))
+                next_to_submit += 1
+            try:
+                extraction = await pending.pop(page_index)
+            except Exception as e:
+                log.error("Text extraction failed on page %d: %s", page_index + 1, e)
+                extraction = {"text": "", "headings": [], "has_layout": False, "error": str(e) or type(e).__name__}
+            yield page_index + 1, extraction
+    finally:
+        for task in pending.values():
+            task.cancel()
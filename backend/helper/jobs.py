@@ -0,0 +1,448 @@
+import os
+import json
+import uuid
+import asyncio
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func, select
+import database as db_module
+from database import PDF, PageSummary, SectionSummary, Job, JobPage
+from helper import persistence
+from helper.document_summary import document_summary_stream
+from helper.metrics import SSE_EVENTS_PER_UPLOAD, UPLOADS_IN_FLIGHT
+from helper.sse import HEARTBEAT, SSE_HEARTBEAT_SECONDS, SSE_MAX_BATCH, merge_deltas, summary_page
+from helper.pipeline import replay_pdf_stream, run_page_pipeline
+from helper.rate_limit import reset_llm_owner, set_llm_owner
+from helper.tracing import end_trace, get_logger, start_trace
+from helper.workers import WORKER_ID, is_alive
+
+log = get_logger(__name__)
+
+# Number of uploads processed at the same time by this process
+JOB_WORKERS = max(1, int(os.getenv("JOB_WORKERS", 4)))
+# How long a finished job keeps its event log in memory for reconnecting clients
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 600))
+
+# Batch progress events are sent at most this often (seconds)
+BATCH_PROGRESS_INTERVAL = float(os.getenv("BATCH_PROGRESS_INTERVAL", 0.5))
+# Batch documents processed by other workers are followed by reading their status this often (seconds)
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", 2))
+
+COMPLETE_EVENT = "data: {\"type\": \"complete\"}\n\n"
+
+# Job statuses of documents that need no more work; "reused" is a batch document identical to an already processed PDF
+FINISHED_STATUSES = ("completed", "failed", "reused")
+
+
+def pdf_metadata(pdf, job_id: str = None) -> dict:
+    """PDF metadata as sent in the first (`metadata`) SSE event"""
+    metadata = {
+        "id": pdf.id,
+        "filename": pdf.filename,
+        "upload_date": pdf.upload_date.isoformat(),
+        "sections_count": pdf.sections_count,
+        "total_pages": pdf.total_pages
+    }
+    if job_id:
+        metadata["job_id"] = job_id
+    return metadata
+
+
+def _discard_partial_pages(db, pdf_id: int, done_pages: set):
+    """Drop rows of pages that were not finished, so resuming rewrites them cleanly"""
+    done = list(done_pages)
+    db.query(SectionSummary).filter(SectionSummary.pdf_id == pdf_id, ~SectionSummary.page_number.in_(done)).delete(synchronize_session=False)
+    db.query(PageSummary).filter(PageSummary.pdf_id == pdf_id, ~PageSummary.page_number.in_(done)).delete(synchronize_session=False)
+
+
+class UploadJob:
+    """
+    An upload being processed independently of any HTTP connection.
+
+    Every SSE event is appended to an in-memory log with a sequential id, so any
+    number of subscribers can attach, disconnect and reconnect with `Last-Event-ID`.
+    Ids are "<epoch>-<seq>"; a log rebuilt after a restart gets a new epoch, and a
+    subscriber presenting an id from another epoch is replayed from the start.
+    Once a page's final summary is logged, its streaming deltas are dropped (their
+    slots stay, as None, so ids keep their position).
+    """
+
+    def __init__(self, job_id: str, pdf, done_pages=()):
+        self.id = job_id
+        self.pdf_id = pdf.id
+        self.file_path = pdf.file_path
+        self.total_pages = pdf.total_pages
+        self.done_pages = set(done_pages)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.status = "queued"
+        self.events = [f"data: {json.dumps({'type': 'metadata', 'data': pdf_metadata(pdf, job_id)})}\n\n"]
+        self.finished = False
+        self._deltas = {}  # Page number -> indices of its streaming summary deltas in `events`
+        self._changed = asyncio.Condition()
+        self._listeners = []
+
+    def _set_status(self, status: str, error: str = ""):
+        self.status = status
+        job_id = self.id
+        persistence.writer.submit(
+            lambda session: session.query(Job).filter(Job.id == job_id).update(
+                {Job.status: status, Job.error: error, Job.updated_at: datetime.utcnow()}
+            )
+        )
+
+    async def emit(self, event: str):
+        async with self._changed:
+            page = summary_page(event)
+            if page:
+                page_num, final = page
+                if final:
+                    # The final summary carries the whole text: a subscriber replaying the log needs no deltas
+                    for index in self._deltas.pop(page_num, ()):
+                        self.events[index] = None
+                else:
+                    self._deltas.setdefault(page_num, []).append(len(self.events))
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self):
+        async with self._changed:
+            self.events.append(COMPLETE_EVENT)
+            self.finished = True
+            self._changed.notify_all()
+        SSE_EVENTS_PER_UPLOAD.observe(len(self.events))
+        self._notify()
+
+    def add_listener(self, callback):
+        """Call `callback(job)` after each finished page and when the job finishes (used by batch progress)"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self):
+        for callback in list(self._listeners):
+            callback(self)
+
+    async def _page_done(self, page_num: int):
+        self.done_pages.add(page_num)
+        job_id = self.id
+        persistence.writer.submit(lambda session: session.add(JobPage(job_id=job_id, page_number=page_num)))
+        self._notify()
+
+    async def run(self):
+        self._set_status("running")
+        UPLOADS_IN_FLIGHT.inc()
+        trace_token = start_trace(self.pdf_id)
+        # LLM concurrency is shared fairly between the documents being processed
+        owner_token = set_llm_owner(self.pdf_id)
+        try:
+            if self.done_pages:
+                # Resumed job: replay the finished pages, then process only the rest
+                await persistence.writer.run(lambda session: _discard_partial_pages(session, self.pdf_id, self.done_pages))
+                async for event in replay_pdf_stream(self.pdf_id):
+                    await self.emit(event)
+            pending = [page for page in range(1, self.total_pages + 1) if page not in self.done_pages]
+            log.info("Job %s processing %d of %d page(s) for PDF %d", self.id, len(pending), self.total_pages, self.pdf_id)
+            async for event in run_page_pipeline(self.pdf_id, self.file_path, self.total_pages, page_numbers=pending, on_page_done=self._page_done):
+                await self.emit(event)
+            # Whole-paper summary, reduced from the page summaries just stored
+            async for event in document_summary_stream(self.pdf_id):
+                await self.emit(event)
+            self._set_status("completed")
+        except asyncio.CancelledError:
+            # Shutdown: leave the job "running" so it is resumed at the next startup, but release the subscribers
+            await self.emit(f"data: {json.dumps({'type': 'interrupted', 'job_id': self.id})}\n\n")
+            await self.finish()
+            raise
+        except Exception as e:
+            log.exception("Job %s failed: %s", self.id, e)
+            self._set_status("failed", str(e))
+            await self.emit(f"data: {json.dumps({'type': 'error', 'job_id': self.id, 'message': str(e)})}\n\n")
+        finally:
+            UPLOADS_IN_FLIGHT.dec()
+            reset_llm_owner(owner_token)
+            end_trace(trace_token)
+        await self.finish()
+
+    async def subscribe(self, last_event_id: str = None):
+        """
+        Yield SSE frames (with ids) after `last_event_id`, following the job until it finishes.
+
+        Each write carries every event that accumulated since the previous one, so a
+        subscriber is never paced by the job and a slow client is never waited on by it:
+        when a client lags, its backlog is sent in bounded writes with consecutive
+        summary deltas merged (the id of a merged frame is that of its last delta).
+        An idle stream gets a heartbeat comment every SSE_HEARTBEAT_SECONDS.
+        """
+        index = 0
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            if epoch == self.epoch and seq.isdigit():
+                index = int(seq) + 1
+        while True:
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: index < len(self.events) or self.finished),
+                        SSE_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                batch = self.events[index:index + SSE_MAX_BATCH]
+                finished = self.finished and index + len(batch) >= len(self.events)
+            if not batch:
+                if finished:
+                    return
+                yield HEARTBEAT
+                continue
+            kept = [(offset, event) for offset, event in enumerate(batch) if event is not None]
+            if len(kept) > 1:
+                frames = [f"id: {self.epoch}-{index + kept[position][0]}\n{event}" for position, event in merge_deltas([event for _, event in kept])]
+            else:
+                frames = [f"id: {self.epoch}-{index + offset}\n{event}" for offset, event in kept]
+            if frames:
+                yield "".join(frames)
+            index += len(batch)
+            if finished:
+                return
+
+
+class JobManager:
+    """In-process worker pool running upload jobs, with their status persisted in `jobs` / `job_pages`"""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    def _ensure_workers(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                await job.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.exception("Job worker error")
+            finally:
+                loop.call_later(JOB_RETENTION_SECONDS, self.jobs.pop, job.id, None)
+
+    async def submit(self, job: UploadJob):
+        self._ensure_workers()
+        self.jobs[job.id] = job
+        await self._queue.put(job)
+
+    async def create_job(self, pdf, batch_id: str = None) -> UploadJob:
+        """Persist a new job for a freshly stored PDF and queue it"""
+        job_id = str(uuid.uuid4())
+        await persistence.writer.run(lambda session: session.add(Job(id=job_id, pdf_id=pdf.id, batch_id=batch_id, status="queued", worker=WORKER_ID)))
+        job = UploadJob(job_id, pdf)
+        await self.submit(job)
+        return job
+
+    async def record_reused(self, pdf, batch_id: str) -> str:
+        """Record a batch document identical to the already processed `pdf`; nothing is queued"""
+        job_id = str(uuid.uuid4())
+        await persistence.writer.run(lambda session: session.add(Job(id=job_id, pdf_id=pdf.id, batch_id=batch_id, status="reused")))
+        return job_id
+
+    async def subscribe_batch(self, batch_id: str, rejected: list = ()):
+        """
+        Yield one aggregated SSE stream for the documents of a batch.
+
+        A `batch` event carries the status of every document (and the files rejected
+        at upload), then `document_progress` and `batch_progress` events follow as
+        pages finish, at most every BATCH_PROGRESS_INTERVAL seconds, and `complete`
+        once every document is finished. Jobs running here report their progress
+        directly; those of other workers (or not resumed yet) are followed through the
+        database every BATCH_POLL_SECONDS. Per-page summaries are not included; they
+        are streamed by /jobs/{job_id}/events.
+        """
+        async with db_module.AsyncSessionLocal() as db:
+            status = await batch_status(db, batch_id)
+        documents = {document["job_id"]: document for document in status["documents"]}
+        order = {job_id: position for position, job_id in enumerate(documents)}
+        live = {job_id: self.jobs[job_id] for job_id in documents if job_id in self.jobs}
+        changed = asyncio.Queue()
+        listener = lambda job: changed.put_nowait(job.id)
+        for job in live.values():
+            job.add_listener(listener)
+        try:
+            for job in live.values():
+                _apply_live_state(documents[job.id], job)
+            pending = {job_id for job_id, job in live.items() if not job.finished}
+            remote = {job_id for job_id, document in documents.items() if job_id not in live and document["status"] not in FINISHED_STATUSES}
+            snapshot = {**status, "created_at": status["created_at"].isoformat(), **batch_totals(status["created_at"], documents.values())}
+            yield f"data: {json.dumps({'type': 'batch', **snapshot, 'rejected': list(rejected)})}\n\n"
+            while pending or remote:
+                updated = set()
+                try:
+                    updated.add(await asyncio.wait_for(changed.get(), BATCH_POLL_SECONDS if remote else None))
+                except asyncio.TimeoutError:
+                    pass
+                await asyncio.sleep(BATCH_PROGRESS_INTERVAL)
+                while not changed.empty():
+                    updated.add(changed.get_nowait())
+                if remote:
+                    updated |= await self._poll_stored(batch_id, documents, remote, live, listener)
+                for job_id in sorted(updated, key=order.get):
+                    document = documents[job_id]
+                    if job_id in live:
+                        _apply_live_state(document, live[job_id])
+                        if live[job_id].finished:
+                            pending.discard(job_id)
+                        else:
+                            pending.add(job_id)
+                    yield f"data: {json.dumps({'type': 'document_progress', **document})}\n\n"
+                yield f"data: {json.dumps({'type': 'batch_progress', 'batch_id': batch_id, **batch_totals(status['created_at'], documents.values())})}\n\n"
+            yield f"data: {json.dumps({'type': 'complete', 'batch_id': batch_id})}\n\n"
+        finally:
+            for job in live.values():
+                job.remove_listener(listener)
+
+    async def _poll_stored(self, batch_id: str, documents: dict, remote: set, live: dict, listener) -> set:
+        """
+        Refresh the batch documents in `remote` from the database, returning the ids whose
+        progress changed; finished ones leave `remote`, and a job that started running in
+        this process since (e.g. resumed here) is followed live from now on.
+        """
+        async with db_module.AsyncSessionLocal() as db:
+            stored = {document["job_id"]: document for document in (await batch_status(db, batch_id))["documents"]}
+        updated = set()
+        for job_id in list(remote):
+            job = self.jobs.get(job_id)
+            if job is not None:
+                remote.discard(job_id)
+                live[job_id] = job
+                job.add_listener(listener)
+                updated.add(job_id)
+                continue
+            fresh = stored.get(job_id)
+            if fresh is None:
+                remote.discard(job_id)
+                continue
+            if (fresh["status"], fresh["pages_done"]) != (documents[job_id]["status"], documents[job_id]["pages_done"]):
+                documents[job_id].update(fresh)
+                updated.add(job_id)
+            if fresh["status"] in FINISHED_STATUSES:
+                remote.discard(job_id)
+        return updated
+
+    async def get(self, job_id: str):
+        """The live job, or a finished one rebuilt from the database (None if unknown)"""
+        job = self.jobs.get(job_id)
+        if job:
+            return job
+        async with db_module.AsyncSessionLocal() as db:
+            row = await db.get(Job, job_id)
+            pdf = await db.get(PDF, row.pdf_id) if row else None
+            if not row or not pdf:
+                return None
+            done_pages = (await db.execute(select(JobPage.page_number).where(JobPage.job_id == job_id))).scalars().all()
+            status = row.status
+        job = UploadJob(job_id, pdf, done_pages)
+        job.status = status
+        if status in ("queued", "running"):
+            # Known but not running here (e.g. still waiting to be resumed)
+            return job
+        async for event in replay_pdf_stream(job.pdf_id):
+            job.events.append(event)
+        job.events.append(COMPLETE_EVENT)
+        job.finished = True
+        return job
+
+    async def resume_unfinished(self):
+        """
+        Queue every job that was queued or running when its worker process stopped.
+
+        Jobs of sibling workers that are still running are left alone; the others are
+        claimed by this worker. Callers hold `helper.workers.startup_lock()`, so workers
+        starting together do not claim the same job.
+        """
+        async with db_module.AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Job).where(Job.status.in_(["queued", "running"])))).scalars().all()
+            resumable = []
+            for row in rows:
+                if row.id in self.jobs or is_alive(row.worker):
+                    continue
+                row.worker = WORKER_ID
+                pdf = await db.get(PDF, row.pdf_id)
+                if not pdf or not os.path.exists(pdf.file_path or ""):
+                    row.status, row.error = "failed", "PDF no longer available"
+                    continue
+                done_pages = (await db.execute(select(JobPage.page_number).where(JobPage.job_id == row.id))).scalars().all()
+                resumable.append(UploadJob(row.id, pdf, done_pages))
+            await db.commit()
+        for job in resumable:
+            log.info("Resuming job %s for PDF %d (%d/%d pages done)", job.id, job.pdf_id, len(job.done_pages), job.total_pages)
+            await self.submit(job)
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+
+def _apply_live_state(document: dict, job: UploadJob) -> dict:
+    """Overlay the in-memory progress of a running job on its (write-behind, possibly stale) database status"""
+    document["status"] = job.status
+    document["pages_done"] = len(job.done_pages)
+    return document
+
+
+async def batch_status(db, batch_id: str) -> Optional[dict]:
+    """Documents of a batch with their job status and page progress, as stored in the database"""
+    rows = (await db.execute(
+        select(Job.id, Job.status, Job.error, Job.created_at, PDF.id, PDF.filename, PDF.total_pages)
+        .join(PDF, PDF.id == Job.pdf_id)
+        .where(Job.batch_id == batch_id)
+        .order_by(Job.created_at, Job.id)
+    )).all()
+    if not rows:
+        return None
+    done_counts = dict((await db.execute(
+        select(JobPage.job_id, func.count(JobPage.id))
+        .join(Job, Job.id == JobPage.job_id)
+        .where(Job.batch_id == batch_id)
+        .group_by(JobPage.job_id)
+    )).all())
+    documents = [
+        {
+            "job_id": job_id,
+            "pdf_id": pdf_id,
+            "filename": filename,
+            "status": status,
+            "error": error or "",
+            "pages_done": total_pages if status == "reused" else done_counts.get(job_id, 0),
+            "total_pages": total_pages or 0
+        }
+        for job_id, status, error, created_at, pdf_id, filename, total_pages in rows
+    ]
+    return {"batch_id": batch_id, "created_at": min(row[3] for row in rows), "documents": documents}
+
+
+def batch_totals(created_at: datetime, documents) -> dict:
+    """Aggregate progress of batch documents; the rate counts only pages processed (not reused)"""
+    documents = list(documents)
+    processed = sum(document["pages_done"] for document in documents if document["status"] != "reused")
+    minutes = max((datetime.utcnow() - created_at).total_seconds(), 1.0) / 60 if created_at else None
+    return {
+        "documents_total": len(documents),
+        "documents_done": sum(document["status"] in FINISHED_STATUSES for document in documents),
+        "pages_total": sum(document["total_pages"] for document in documents),
+        "pages_done": sum(document["pages_done"] for document in documents),
+        "pages_per_minute": round(processed / minutes, 1) if minutes else None
+    }
+
+
+manager = JobManager()
@@ -0,0 +1,79 @@
+"""
+The process-wide LLM client.
+
+Grok is called through the async OpenAI client, so LLM calls never block the event loop.
+Calls are rate limited and retried by the RateLimitedClient (the SDK's own retries are
+disabled), and identical requests are served from the persistent on-disk LLM cache
+without using the budget. GROK_BASE_URL can point at any OpenAI-compatible server,
+e.g. benchmarks/fake_llm_server.py.
+
+Each task asks for the model of its tier (`model_for`): the short heading and section
+calls can run on a small fast model while page and paper summaries keep the main one.
+With LLM_ENDPOINTS set, calls are spread over several OpenAI-compatible endpoints by
+helper.llm_router instead of going to GROK_BASE_URL.
+
+The client (and the openai package) is loaded on first use rather than at import, so
+workers start fast and need no credentials until they summarize; the app closes it,
+with its HTTP connection pool, at shutdown.
+"""
+import os
+
+GROK_MODEL_NAME = os.getenv("GROK_MODEL_NAME", "openai/gpt-oss-20b")
+# Model of the fast tier (e.g. llama-3.1-8b-instant), used for heading extraction and section summaries
+LLM_FAST_MODEL = os.getenv("LLM_FAST_MODEL", GROK_MODEL_NAME)
+TIER_MODELS = {"fast": LLM_FAST_MODEL, "default": GROK_MODEL_NAME}
+
+# Tier of each LLM task; LLM_TASK_TIERS overrides some, e.g. "sections=default,headings=fast"
+TASK_TIERS = {"headings": "fast", "sections": "fast", "page_summary": "default", "document_summary": "default"}
+TASK_TIERS.update(pair.replace(" ", "").split("=", 1) for pair in os.getenv("LLM_TASK_TIERS", "").split(",") if "=" in pair)
+_unknown_tiers = {task: tier for task, tier in TASK_TIERS.items() if tier not in TIER_MODELS}
+if _unknown_tiers:
+    raise ValueError(f"LLM_TASK_TIERS names unknown tiers {_unknown_tiers} (tiers: {', '.join(TIER_MODELS)})")
+
+# Several OpenAI-compatible endpoints as a JSON list (see helper.llm_router.load_endpoints)
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "")
+
+_rate_limited = None
+_client = None
+
+
+def model_for(task: str) -> str:
+    """The model of the tier that `task` runs on"""
+    return TIER_MODELS[TASK_TIERS.get(task, "default")]
+
+
+def get_client():
+    """The cached, rate-limited (and, with LLM_ENDPOINTS, routed) client, created on first use"""
+    global _rate_limited, _client
+    if _client is None:
+        from helper.llm_cache import with_cache
+        if LLM_ENDPOINTS:
+            from helper.llm_router import RoutedClient, load_endpoints
+            rate_limited = RoutedClient(load_endpoints(LLM_ENDPOINTS))
+            # Fail on the first call rather than on every call of a tier no endpoint serves
+            for model in TIER_MODELS.values():
+                rate_limited.routes_for(model)
+        else:
+            from openai import AsyncOpenAI
+            from helper.rate_limit import RateLimitedClient
+            rate_limited = RateLimitedClient(AsyncOpenAI(
+                api_key=os.getenv("GROK_API_KEY"),
+                base_url=os.getenv("GROK_BASE_URL", "https://api.groq.com/openai/v1"),
+                max_retries=0,
+            ))
+        _rate_limited = rate_limited
+        _client = with_cache(_rate_limited)
+    return _client
+
+
+def rate_limit_info():
+    """Counters of the rate limiter (per endpoint and route when routed), or None before the first LLM call"""
+    return _rate_limited.info() if _rate_limited else None
+
+
+async def close_client():
+    """Close the HTTP connections of the client; the next call opens a new one"""
+    global _rate_limited, _client
+    if _rate_limited is not None:
+        rate_limited, _rate_limited, _client = _rate_limited, None, None
+        await rate_limited.close()
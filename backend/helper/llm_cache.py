@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from types import SimpleNamespace
+from contextlib import contextmanager
+from helper.tracing import get_logger
+
+log = get_logger(__name__)
+
+# Persistent cache for chat completions, stored in a local SQLite file
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "llm_cache.db"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+
+# Size of the deltas used when replaying a cached streaming response
+REPLAY_CHUNK_CHARS = 24
+
+# Request parameters that influence the completion text and therefore the cache key
+KEY_PARAMS = ("model", "messages", "temperature", "top_p", "max_tokens", "stop", "seed", "presence_penalty", "frequency_penalty")
+
+
+class LLMCache:
+    """On-disk LRU/TTL cache of completion texts keyed on model, prompt and sampling parameters"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES, ttl_seconds: int = LLM_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        # Lookups and stores run in worker threads (asyncio.to_thread)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    model TEXT,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close it"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(params: dict) -> str:
+        """Hash the parameters that determine the completion (streaming is ignored on purpose)"""
+        material = {name: params.get(name) for name in KEY_PARAMS}
+        return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def get(self, key: str):
+        """Return the cached completion text, or None on a miss or expired entry"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._count("evictions")
+                row = None
+            if row is None:
+                self._count("misses")
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        """Store a completion text, then evict expired and least recently used entries over the size cap"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now),
+            )
+            self._count("stores")
+            expired = conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+            self._count("evictions", max(expired, 0))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM llm_cache WHERE key = ?", (old_key,))
+                    total -= old_size
+                    self._count("evictions")
+
+    def delete(self, key: str):
+        """Remove one entry, e.g. a completion its caller rejected"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def info(self) -> dict:
+        """Hit/miss counters plus the current number of entries and bytes"""
+        with self._connect() as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, "entries": entries, "bytes": total, "max_bytes": self.max_bytes}
+
+
+def _message_response(text: str):
+    """Minimal stand-in for a non-streaming ChatCompletion"""
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text), finish_reason="stop")])
+
+
+def _delta_chunk(text: str):
+    """Minimal stand-in for a streaming ChatCompletionChunk"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=None)])
+
+
+async def _replay_stream(text: str):
+    for start in range(0, len(text), REPLAY_CHUNK_CHARS):
+        yield _delta_chunk(text[start:start + REPLAY_CHUNK_CHARS])
+
+
+class _CachedCompletions:
+    def __init__(self, completions, cache: LLMCache):
+        self._completions = completions
+        self._cache = cache
+
+    async def create(self, **params):
+        key = self._cache.make_key(params)
+        try:
+            cached = await asyncio.to_thread(self._cache.get, key)
+        except Exception as e:
+            log.error("LLM cache lookup failed: %s", e)
+            cached = None
+
+        if cached is not None:
+            return _replay_stream(cached) if params.get("stream") else _message_response(cached)
+
+        response = await self._completions.create(**params)
+        if params.get("stream"):
+            return self._record_stream(response, key, params.get("model"))
+
+        await self._store(key, params.get("model"), response.choices[0].message.content or "")
+        return response
+
+    async def _record_stream(self, response, key: str, model: str):
+        """Pass upstream chunks through and store the full text once the stream completes"""
+        parts = []
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        await self._store(key, model, "".join(parts))
+
+    async def _store(self, key: str, model: str, text: str):
+        if not text:
+            return
+        try:
+            await asyncio.to_thread(self._cache.put, key, model, text)
+        except Exception as e:
+            log.exception("LLM cache store failed: %s", e)
+
+
+class CachedClient:
+    """Wraps an async OpenAI-compatible client so `chat.completions.create` goes through the cache"""
+
+    def __init__(self, client, cache: LLMCache):
+        self._client = client
+        self.cache = cache
+        self.chat = SimpleNamespace(completions=_CachedCompletions(client.chat.completions, cache))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+_active_cache = None
+
+
+def with_cache(client):
+    """Return `client` wrapped with the persistent cache, unless caching is disabled"""
+    global _active_cache
+    if not LLM_CACHE_ENABLED:
+        return client
+    _active_cache = LLMCache(LLM_CACHE_PATH)
+    return CachedClient(client, _active_cache)
+
+
+def forget_completion(params: dict):
+    """Drop the cached completion of a request whose answer the caller rejected, so a retry asks the model again"""
+    if _active_cache is not None:
+        _active_cache.delete(_active_cache.make_key(params))
+
+
+def cache_stats():
+    """Counters of the process-wide LLM cache, or None when caching is disabled"""
+    if _active_cache is None:
+        return None
+    return _active_cache.info()
@@ -0,0 +1,258 @@
+"""
+Routing of LLM calls across several OpenAI-compatible endpoints.
+
+Each endpoint listed in LLM_ENDPOINTS has its own client, provider limits and adaptive
+concurrency (a RateLimitedClient), and serves some models, possibly under other names
+(a local server may call the fast tier model "llama3.1:8b"). A call goes to the route
+(endpoint and model) with the lowest expected latency: its smoothed latency (time to
+first token for streams), stretched by the requests queued at the endpoint and by its
+smoothed error rate. A route never used, or idle for LLM_ROUTE_PROBE_SECONDS, is tried
+first, so a new or recovered endpoint gets noticed.
+
+A route that fails cools down (for its Retry-After, or an exponential backoff while it
+keeps failing) and the call moves to the best remaining route. Retries and the overall
+deadline are handled here rather than by the endpoints, so a failing endpoint costs a
+failover instead of a backoff.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from helper.metrics import LLM_ENDPOINT_REQUESTS
+from helper.rate_limit import (
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_CAP,
+    LLM_MAX_RETRIES,
+    LLM_REQUEST_DEADLINE,
+    LLM_RPM,
+    LLM_TPM,
+    WEB_CONCURRENCY,
+    RateLimitedClient,
+    is_retryable,
+    retry_after,
+    status_code,
+)
+from helper.tracing import get_logger
+
+log = get_logger(__name__)
+
+# Seconds after which an idle route is probed again with the next call
+LLM_ROUTE_PROBE_SECONDS = float(os.getenv("LLM_ROUTE_PROBE_SECONDS", 30))
+# Weight of the newest observation in the smoothed latency and error rate
+ROUTE_SMOOTHING = 0.2
+# Statuses that point at the endpoint rather than the request (bad key, unknown model)
+ENDPOINT_STATUSES = (401, 403, 404)
+
+
+class Endpoint:
+    """One OpenAI-compatible server: its rate-limited client and the models it serves"""
+
+    def __init__(self, name: str, client, models: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.client = client
+        self.models = models  # Model name -> name on this endpoint; None serves any model as is
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+    def served_name(self, model: str) -> str:
+        return model if self.models is None else self.models[model]
+
+
+class Route:
+    """One model on one endpoint, with its smoothed latency and error rate"""
+
+    def __init__(self, endpoint: Endpoint, model: str):
+        self.endpoint = endpoint
+        self.model = model
+        self.latency = {False: None, True: None}  # Seconds, by `stream`
+        self.error_rate = 0.0
+        self.failures = 0  # Consecutive
+        self.available_at = 0.0
+        self.last_used = 0.0
+        self.in_flight = 0
+
+    def expected_latency(self, now: float, stream: bool) -> float:
+        latency = self.latency[stream]
+        if latency is None or now - self.last_used > LLM_ROUTE_PROBE_SECONDS:
+            # One probe at a time; until it answers the route ranks last
+            return 0.0 if not self.in_flight else float("inf")
+        limiter = self.endpoint.client.limiter
+        return latency * (1 + limiter.waiting() / max(1.0, limiter.limit)) / max(0.05, 1 - self.error_rate)
+
+    def on_success(self, latency: float, stream: bool):
+        previous = self.latency[stream]
+        self.latency[stream] = latency if previous is None else previous + ROUTE_SMOOTHING * (latency - previous)
+        self.error_rate *= 1 - ROUTE_SMOOTHING
+        self.failures = 0
+
+    def on_failure(self, error):
+        self.error_rate += ROUTE_SMOOTHING * (1 - self.error_rate)
+        self.failures += 1
+        delay = retry_after(error)
+        if delay is None:
+            delay = LLM_BACKOFF_CAP if status_code(error) in ENDPOINT_STATUSES else min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** (self.failures - 1))
+        self.available_at = time.monotonic() + delay
+
+    def info(self, now: float) -> dict:
+        return {
+            "endpoint": self.endpoint.name,
+            "model": self.model,
+            "latency_ms": {"stream" if stream else "call": round(latency * 1000, 1) for stream, latency in self.latency.items() if latency is not None},
+            "error_rate": round(self.error_rate, 3),
+            "cooling_down_s": round(max(0.0, self.available_at - now), 1),
+            "in_flight": self.in_flight
+        }
+
+
+class _RoutedCompletions:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def create(self, **params):
+        return await self._owner.create(params)
+
+
+class RoutedClient:
+    """Sends each chat completion to the best route serving its model, failing over between endpoints"""
+
+    def __init__(self, endpoints: List[Endpoint], max_retries: int = LLM_MAX_RETRIES, deadline: float = LLM_REQUEST_DEADLINE):
+        self.endpoints = endpoints
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.routes = {}  # Model -> [Route]
+        self.stats = {"retries": 0, "failed": 0}
+        self.chat = SimpleNamespace(completions=_RoutedCompletions(self))
+
+    def routes_for(self, model: str) -> List[Route]:
+        routes = self.routes.get(model)
+        if routes is None:
+            routes = [Route(endpoint, endpoint.served_name(model)) for endpoint in self.endpoints if endpoint.serves(model)]
+            if not routes:
+                raise ValueError(f"No LLM endpoint serves model {model!r}")
+            self.routes[model] = routes
+        return routes
+
+    def pick(self, routes: List[Route], stream: bool) -> Route:
+        """The ready route with the lowest expected latency, or the one that recovers first"""
+        now = time.monotonic()
+        ready = [route for route in routes if route.available_at <= now]
+        if not ready:
+            return min(routes, key=lambda route: route.available_at)
+        return min(ready, key=lambda route: (route.expected_latency(now, stream), route.in_flight))
+
+    async def create(self, params: dict):
+        routes = self.routes_for(params.get("model", ""))
+        stream = bool(params.get("stream"))
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            route = self.pick(routes, stream)
+            wait = route.available_at - time.monotonic()
+            if wait > 0:
+                # Every route is cooling down
+                await asyncio.sleep(min(wait + random.uniform(0, LLM_BACKOFF_BASE), max(0.0, deadline - time.monotonic())))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"LLM request exceeded its {self.deadline}s deadline")
+
+            route.in_flight += 1
+            route.last_used = started = time.monotonic()
+            try:
+                response = await asyncio.wait_for(route.endpoint.client.chat.completions.create(**{**params, "model": route.model}), remaining)
+            except asyncio.CancelledError:
+                route.in_flight -= 1
+                raise
+            except Exception as error:
+                route.in_flight -= 1
+                LLM_ENDPOINT_REQUESTS.inc(endpoint=route.endpoint.name, outcome="error")
+                endpoint_error = is_retryable(error) or status_code(error) in ENDPOINT_STATUSES
+                if endpoint_error:
+                    route.on_failure(error)
+                if attempt >= self.max_retries or not endpoint_error:
+                    self.stats["failed"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                log.warning("LLM call to %s failed (%s, status %s), attempt %d goes to the best remaining route",
+                            route.endpoint.name, type(error).__name__, status_code(error), attempt + 1)
+                continue
+
+            if stream:
+                return self._observe_stream(route, response, started)
+            route.in_flight -= 1
+            route.on_success(time.monotonic() - started, stream=False)
+            LLM_ENDPOINT_REQUESTS.inc(endpoint=route.endpoint.name, outcome="ok")
+            return response
+
+    async def _observe_stream(self, route: Route, response, started: float):
+        """Pass the chunks through, timing the first one; a stream that fails midway cannot fail over"""
+        first = True
+        try:
+            async for chunk in response:
+                if first:
+                    route.on_success(time.monotonic() - started, stream=True)
+                    first = False
+                yield chunk
+            LLM_ENDPOINT_REQUESTS.inc(endpoint=route.endpoint.name, outcome="ok")
+        except Exception as error:
+            route.on_failure(error)
+            LLM_ENDPOINT_REQUESTS.inc(endpoint=route.endpoint.name, outcome="error")
+            raise
+        finally:
+            route.in_flight -= 1
+
+    def info(self) -> dict:
+        now = time.monotonic()
+        return {
+            **self.stats,
+            "endpoints": {endpoint.name: endpoint.client.info() for endpoint in self.endpoints},
+            "routes": [route.info(now) for routes in self.routes.values() for route in routes]
+        }
+
+    async def close(self):
+        await asyncio.gather(*(endpoint.client.close() for endpoint in self.endpoints))
+
+
+def load_endpoints(config: str) -> List[Endpoint]:
+    """
+    Endpoints described by LLM_ENDPOINTS, a JSON list of objects with:
+
+    - base_url (required) and name (default: the host);
+    - api_key, or api_key_env naming the variable that holds it (default GROK_API_KEY);
+    - models: the model names served, or an object mapping model names to the names on
+      this endpoint (default: any model, as is);
+    - rpm / tpm: limits of the endpoint for the whole deployment (0 disables a bucket;
+      default LLM_RPM / LLM_TPM).
+    """
+    from openai import AsyncOpenAI
+    try:
+        entries = json.loads(config)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"LLM_ENDPOINTS is not valid JSON: {e}") from None
+    if not isinstance(entries, list):
+        raise ValueError("LLM_ENDPOINTS must be a JSON list of endpoint objects")
+    endpoints = []
+    for position, entry in enumerate(entries):
+        if not isinstance(entry, dict) or not entry.get("base_url"):
+            raise ValueError(f"LLM_ENDPOINTS entry {position} needs a base_url: {entry!r}")
+        models = entry.get("models")
+        if isinstance(models, list):
+            models = {model: model for model in models}
+        client = AsyncOpenAI(
+            # Local servers accept any key, but the client requires one
+            api_key=entry.get("api_key") or os.getenv(entry.get("api_key_env", "GROK_API_KEY")) or "none",
+            base_url=entry["base_url"],
+            max_retries=0,
+        )
+        rpm = float(entry["rpm"]) / WEB_CONCURRENCY if "rpm" in entry else LLM_RPM
+        tpm = float(entry["tpm"]) / WEB_CONCURRENCY if "tpm" in entry else LLM_TPM
+        name = entry.get("name") or urlparse(entry["base_url"]).netloc
+        endpoints.append(Endpoint(name, RateLimitedClient(client, rpm=rpm, tpm=tpm, max_retries=0), models))
+    if not endpoints:
+        raise ValueError("LLM_ENDPOINTS lists no endpoint")
+    return endpoints
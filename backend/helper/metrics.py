@@ -0,0 +1,139 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Default latency buckets in seconds (Prometheus client defaults, extended for slow LLM calls)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COUNT_BUCKETS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        super().__init__(name, documentation, labels)
+        if not self.label_names:
+            self._values[()] = 0  # Exported as 0 before the first update
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _render_value(self, key, value):
+        counts, total, count = value[0], value[1], value[2]
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {count}")
+        lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Pipeline metrics --------------------------------------------------------
+
+EXTRACTION_SECONDS = Histogram("pdf_page_extraction_seconds", "Text and layout extraction time per page")
+HEADING_DETECTION_SECONDS = Histogram("pdf_heading_detection_seconds", "Heading detection time per page", ("method",))
+DOCUMENT_SUMMARY_SECONDS = Histogram("document_summary_seconds", "Time to reduce the stored page summaries of a PDF into its whole-paper summary")
+LLM_TTFT_SECONDS = Histogram("llm_time_to_first_token_seconds", "Time from sending an LLM request to its first token", ("model", "stream"))
+LLM_REQUEST_SECONDS = Histogram("llm_request_seconds", "Total time of an LLM request including the streamed body", ("model", "stream"))
+LLM_REQUESTS = Counter("llm_requests_total", "LLM requests by outcome", ("model", "outcome"))
+LLM_PROMPT_TOKENS = Counter("llm_prompt_tokens_total", "Prompt tokens reported in API usage", ("model",))
+LLM_COMPLETION_TOKENS = Counter("llm_completion_tokens_total", "Completion tokens reported in API usage", ("model",))
+LLM_ENDPOINT_REQUESTS = Counter("llm_endpoint_requests_total", "LLM requests routed to each endpoint by outcome", ("endpoint", "outcome"))
+NEAR_DUPLICATE_LOOKUP_SECONDS = Histogram("near_duplicate_lookup_seconds", "Time to look up a near-duplicate page in the LSH index")
+PAGES_REUSED = Counter("pages_reused_total", "Pages whose title and summaries were copied from a near-duplicate page")
+DB_WRITE_SECONDS = Histogram("db_write_batch_seconds", "Time to execute and commit one write-behind batch")
+DB_WRITE_BATCH_SIZE = Histogram("db_write_batch_size", "Operations per write-behind batch", buckets=(1, 2, 5, 10, 25, 50, 100, 256, 512))
+SSE_EVENTS_PER_UPLOAD = Histogram("sse_events_per_upload", "SSE events produced by one upload job", buckets=COUNT_BUCKETS)
+UPLOADS_IN_FLIGHT = Gauge("uploads_in_flight", "Upload jobs currently being processed")
@@ -0,0 +1,67 @@
+"""
+MinHash signatures and LSH band keys of page text, for near-duplicate detection.
+
+A page is reduced to its set of word shingles (SHINGLE_WORDS consecutive words);
+the fraction of equal positions in two signatures estimates the Jaccard similarity
+of the two sets. Signatures are cut into LSH_BANDS bands of LSH_ROWS values, and a
+band key is a hash of one band: two pages share at least one key with probability
+1 - (1 - s^LSH_ROWS)^LSH_BANDS, i.e. 99.7% at s = 0.75 and 11% at s = 0.3, so a
+lookup only needs an equality index on the keys.
+
+Pure functions of the text (stable across processes), computed by the extraction
+workers next to the text itself.
+"""
+import re
+import random
+import struct
+import hashlib
+from typing import List, Optional
+
+SHINGLE_WORDS = 3
+LSH_BANDS = 15
+LSH_ROWS = 4
+PERMUTATIONS = LSH_BANDS * LSH_ROWS
+# Pages with fewer shingles (blank, title-only) are neither indexed nor matched
+MIN_SHINGLES = 20
+
+_MASK64 = (1 << 64) - 1
+# Fixed seed: signatures are stored, so every process must use the same permutations
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.getrandbits(64) | 1, _rng.getrandbits(64)) for _ in range(PERMUTATIONS)]
+_SIGNATURE = struct.Struct(f"<{PERMUTATIONS}I")
+_WORD = re.compile(r"\w+")
+
+
+def _hash64(value: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), "little")
+
+
+def shingles(text: str) -> set:
+    words = _WORD.findall(text.lower())
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def signature(text: str) -> Optional[bytes]:
+    """Packed MinHash signature of a page (PERMUTATIONS 32-bit values), or None for near-empty pages"""
+    items = shingles(text)
+    if len(items) < MIN_SHINGLES:
+        return None
+    hashes = [_hash64(item.encode("utf-8")) for item in items]
+    # (a * x + b) mod 2^64 with odd a permutes 64-bit values; the high half of the minimum is kept
+    return _SIGNATURE.pack(*(min([(a * value + b) & _MASK64 for value in hashes]) >> 32 for a, b in _PERMUTATIONS))
+
+
+def similarity(first: bytes, second: bytes) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures"""
+    return sum(a == b for a, b in zip(_SIGNATURE.unpack(first), _SIGNATURE.unpack(second))) / PERMUTATIONS
+
+
+def band_keys(packed: bytes) -> List[int]:
+    """One signed 64-bit key per LSH band (the band number is part of the key)"""
+    values = _SIGNATURE.unpack(packed)
+    keys = []
+    for band in range(LSH_BANDS):
+        rows = values[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(struct.pack(f"<B{LSH_ROWS}I", band, *rows), digest_size=8).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
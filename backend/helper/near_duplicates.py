@@ -0,0 +1,99 @@
+"""
+Reuse of the title and summaries of near-duplicate pages (e.g. another version of a paper).
+
+Every page is stored with its MinHash signature and LSH band keys (helper.minhash).
+Before a new page is summarized, the stored pages sharing a band key with it are
+ranked by the number of keys they share, their signatures are compared, and the
+most similar one at or above NEAR_DUPLICATE_THRESHOLD that has a summary is copied:
+title, page summary and section summaries, without any LLM call. The lookup is one
+query over the key index (plus one for the sections of a match), whatever the size
+of the library.
+"""
+import os
+import json
+import time
+from typing import Optional
+from sqlalchemy import select, text
+import database as db_module
+from database import SectionSummary
+from helper import persistence
+from helper.metrics import NEAR_DUPLICATE_LOOKUP_SECONDS, PAGES_REUSED
+from helper.minhash import LSH_BANDS, band_keys, similarity
+from helper.process_help import is_failed_summary, section_summary_event
+from helper.tracing import get_logger
+
+log = get_logger(__name__)
+
+# Look up near-duplicate pages before summarizing (pages are indexed either way)
+NEAR_DUPLICATE_ENABLED = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Minimum estimated Jaccard similarity of the word shingles of two pages for reuse;
+# 0.75 is about one word in twenty changed (raise it to reuse only lighter edits)
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", 0.75))
+# Candidates compared per lookup, most shared band keys first
+NEAR_DUPLICATE_CANDIDATES = 20
+# Pages read per band key, newest first: a page stored in thousands of versions
+# (boilerplate) costs a lookup no more than a page stored once
+NEAR_DUPLICATE_PER_KEY = 50
+
+# One index range scan per band key, then the candidates with their signatures
+CANDIDATES_QUERY = text(
+    "SELECT p.id, p.pdf_id, p.title, p.summary, f.signature FROM ("
+    "SELECT page_id, count(*) AS shared FROM ("
+    + " UNION ALL ".join(
+        f'SELECT * FROM (SELECT page_id FROM page_bands WHERE "key" = :key_{band} ORDER BY page_id DESC LIMIT :per_key) AS band_{band}'
+        for band in range(LSH_BANDS)
+    )
+    + ") AS bands GROUP BY page_id ORDER BY shared DESC, page_id DESC LIMIT :candidates"
+    ") AS c JOIN page_summaries p ON p.id = c.page_id JOIN page_fingerprints f ON f.page_id = c.page_id"
+)
+
+
+def candidate_params(signature: bytes) -> dict:
+    params = {f"key_{band}": key for band, key in enumerate(band_keys(signature))}
+    return {**params, "per_key": NEAR_DUPLICATE_PER_KEY, "candidates": NEAR_DUPLICATE_CANDIDATES}
+
+
+async def find_near_duplicate(signature: bytes) -> Optional[dict]:
+    """The most similar summarized page at or above the threshold, with its section summaries, if any"""
+    started = time.perf_counter()
+    async with db_module.AsyncSessionLocal() as db:
+        rows = (await db.execute(CANDIDATES_QUERY, candidate_params(signature))).all()
+        best, best_similarity = None, 0.0
+        for row in rows:
+            # Pages still being summarized (or whose summary failed) are not reused
+            if is_failed_summary(row.summary):
+                continue
+            score = similarity(signature, row.signature)
+            if score >= NEAR_DUPLICATE_THRESHOLD and score > best_similarity:
+                best, best_similarity = row, score
+        sections = []
+        if best:
+            sections = (await db.execute(
+                select(SectionSummary.section_title, SectionSummary.summary)
+                .where(SectionSummary.page_id == best.id).order_by(SectionSummary.id)
+            )).all()
+    NEAR_DUPLICATE_LOOKUP_SECONDS.observe(time.perf_counter() - started)
+    if not best:
+        return None
+    return {
+        "page_id": best.id,
+        "pdf_id": best.pdf_id,
+        "title": best.title or "",
+        "summary": best.summary,
+        "sections": [tuple(section) for section in sections],
+        "similarity": round(best_similarity, 3)
+    }
+
+
+async def reuse_page_stream(pdf_id: int, page_num: int, page_text: str, signature: bytes, match: dict):
+    """Store a page with the title and summaries of its near duplicate, yielding the page's SSE events marked `reused`"""
+    page_id, section_ids = await persistence.insert_reused_page(pdf_id, page_num, page_text, signature, match)
+    PAGES_REUSED.inc()
+    log.debug("Page %d reuses page %d of PDF %d (similarity %.2f)", page_num, match["page_id"], match["pdf_id"], match["similarity"])
+
+    reused_from = {"page_id": match["page_id"], "pdf_id": match["pdf_id"], "similarity": match["similarity"]}
+    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'title': match['title'], 'content': page_text[:500], 'summary': '', 'reused': True, 'reused_from': reused_from})}\n\n"
+    for section_id, (heading, section_summary) in zip(section_ids, match["sections"]):
+        yield section_summary_event(page_num, heading, section_summary, section_id)
+    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': match['summary'], 'streaming': False, 'complete': True, 'reused': True})}\n\n"
+    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'done': True})}\n\n"
@@ -0,0 +1,173 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from concurrent.futures import Future
+import database as db_module
+from database import PageBand, PageContent, PageFingerprint, PageSummary, SectionSummary, compress_text
+from helper.minhash import band_keys
+from helper.metrics import DB_WRITE_BATCH_SIZE, DB_WRITE_SECONDS
+from helper.tracing import get_logger
+
+log = get_logger(__name__)
+
+# Group-commit settings: a batch closes after this many operations or this delay
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", 256))
+WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY", 0.05))
+
+_STOP = object()
+
+
+class WriteBehind:
+    """
+    Single background writer that groups queued DB operations into few transactions.
+
+    Each operation is a callable taking a Session. Operations submitted while a
+    batch is collecting are executed together and committed once, off the event
+    loop, so SSE streaming never waits on SQLite commits or fsync. Callers that need
+    a result (e.g. a new row id) await it; updates can be fired and forgotten.
+    Having one writer also removes "database is locked" races between uploads.
+    """
+
+    def __init__(self, batch_size: int = WRITE_BATCH_SIZE, batch_delay: float = WRITE_BATCH_DELAY):
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, operation) -> Future:
+        """Queue `operation(session)`; the returned future resolves after its batch commits"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((operation, future))
+        return future
+
+    async def run(self, operation):
+        """Queue an operation and wait for its result without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(operation))
+
+    async def flush(self):
+        """Wait until everything queued so far is committed"""
+        await self.run(lambda session: None)
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put((_STOP, None))
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            stop = batch[0][0] is _STOP
+            while not stop and len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=self.batch_delay)
+                except queue.Empty:
+                    break
+                if item[0] is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            batch = [item for item in batch if item[0] is not _STOP]
+            if batch:
+                self._commit_batch(batch)
+            if stop:
+                return
+
+    def _commit_batch(self, batch):
+        started = time.perf_counter()
+        try:
+            with db_module.SessionLocal() as session:
+                results = [operation(session) for operation, _ in batch]
+                session.commit()
+            DB_WRITE_SECONDS.observe(time.perf_counter() - started)
+            DB_WRITE_BATCH_SIZE.observe(len(batch))
+        except Exception:
+            # Retry one by one so a single bad operation does not fail the whole batch
+            log.exception("Write-behind batch failed, retrying operations one by one")
+            for operation, future in batch:
+                self._commit_one(operation, future)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _commit_one(self, operation, future):
+        try:
+            with db_module.SessionLocal() as session:
+                result = operation(session)
+                session.commit()
+        except Exception as e:
+            log.error("Write-behind operation failed: %s", e)
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+writer = WriteBehind()
+
+
+def add_fingerprint(session, page_id: int, signature: bytes, keys: list):
+    """Add a page to the near-duplicate index (its MinHash signature and LSH band keys)"""
+    session.add(PageFingerprint(page_id=page_id, signature=signature))
+    session.add_all([PageBand(page_id=page_id, key=key) for key in keys])
+
+
+async def insert_page(pdf_id: int, page_num: int, title: str, content: str, signature: bytes = None) -> int:
+    """Insert a page row with its compressed text (and MinHash signature, when given) and return its id"""
+    # On the caller's thread, keeping the writer thread free
+    data = compress_text(content or "")
+    keys = band_keys(signature) if signature else []
+    def operation(session):
+        page = PageSummary(pdf_id=pdf_id, page_number=page_num, title=title)
+        session.add(page)
+        session.flush()
+        session.add(PageContent(page_id=page.id, data=data))
+        if signature:
+            add_fingerprint(session, page.id, signature, keys)
+        return page.id
+    return await writer.run(operation)
+
+
+async def insert_reused_page(pdf_id: int, page_num: int, content: str, signature: bytes, source: dict) -> tuple:
+    """Insert a page with the title, summary and section summaries of a near-duplicate `source` page; returns (page id, section ids)"""
+    data = compress_text(content or "")
+    keys = band_keys(signature)
+    def operation(session):
+        page = PageSummary(pdf_id=pdf_id, page_number=page_num, title=source["title"], summary=source["summary"], reused_from=source["page_id"])
+        session.add(page)
+        session.flush()
+        session.add(PageContent(page_id=page.id, data=data))
+        add_fingerprint(session, page.id, signature, keys)
+        sections = [
+            SectionSummary(page_id=page.id, pdf_id=pdf_id, page_number=page_num, section_title=heading, summary=summary)
+            for heading, summary in source["sections"]
+        ]
+        session.add_all(sections)
+        session.flush()
+        return page.id, [section.id for section in sections]
+    return await writer.run(operation)
+
+
+async def insert_section(page_id: int, pdf_id: int, page_num: int, heading: str, summary: str) -> int:
+    """Insert a section summary row and return its id"""
+    def operation(session):
+        section = SectionSummary(page_id=page_id, pdf_id=pdf_id, page_number=page_num, section_title=heading, summary=summary)
+        session.add(section)
+        session.flush()
+        return section.id
+    return await writer.run(operation)
+
+
+def update_page(page_id: int, **values) -> Future:
+    """Queue a column update of a page row (no read-back, no waiting)"""
+    def operation(session):
+        session.query(PageSummary).filter(PageSummary.id == page_id).update(values, synchronize_session=False)
+    return writer.submit(operation)
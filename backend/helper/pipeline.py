@@ -0,0 +1,368 @@
+import os
+import json
+import asyncio
+from typing import List, Optional
+import database as db_module
+from sqlalchemy import func, select
+from helper.document_summary import document_summary_event
+from helper.extraction import extract_pages_stream
+from helper.near_duplicates import NEAR_DUPLICATE_ENABLED, find_near_duplicate, reuse_page_stream
+from helper import persistence
+from database import PDF, PageContent, PageSummary, SectionSummary, DocumentSection, decompress_text
+from helper.segmentation import segment_document
+from helper.process_help import (
+    COMBINED_SUMMARIES,
+    extract_page_title,
+    is_failed_summary,
+    section_summary_event,
+    generate_section_summaries_stream,
+    summarize_page_combined_stream,
+    summarize_page_stream,
+)
+from helper.tracing import get_logger, span
+
+log = get_logger(__name__)
+
+# Number of pages processed (and buffered) concurrently per upload
+PAGE_CONCURRENCY = max(1, int(os.getenv("PAGE_CONCURRENCY", 4)))
+
+_PAGE_DONE = None  # Sentinel marking the end of a page's event stream
+
+
+async def process_page_stream(pdf_id: int, page_num: int, page_text: str, layout: dict = None, heading_stats: dict = None):
+    """
+    Run heading detection, persistence and summarization for one page, yielding SSE events.
+
+    A page nearly identical to an already summarized one (another version of the
+    paper) gets that page's title and summaries instead, and its events are marked `reused`.
+    """
+    log.debug("Processing page %d, text length: %d", page_num, len(page_text))
+    signature = layout.get("minhash") if layout else None
+
+    if signature and NEAR_DUPLICATE_ENABLED:
+        with span("near_duplicate_lookup", page=page_num):
+            match = await find_near_duplicate(signature)
+        if match:
+            if heading_stats is not None:
+                heading_stats["reused"] += 1
+            async for event in reuse_page_stream(pdf_id, page_num, page_text, signature, match):
+                yield event
+            return
+
+    # Extract section title from page content
+    with span("heading_detection", page=page_num):
+        page_title = await extract_page_title(page_text, layout, heading_stats)
+    log.debug("Page %d title: %r", page_num, page_title)
+
+    # Store Page Content and Title in DB (group-committed by the write-behind writer)
+    with span("db.insert_page", page=page_num):
+        page_id = await persistence.insert_page(pdf_id, page_num, page_title, page_text, signature)
+    log.debug("Stored page %d in DB with ID %d", page_num, page_id)
+
+    # Send page content and title to frontend immediately
+    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'title': page_title, 'content': page_text[:500], 'summary': ''})}\n\n"
+
+    with span("summarize", page=page_num):
+        async for event in summarize_stored_page(page_id, pdf_id, page_num, page_text, page_title):
+            yield event
+
+
+async def summarize_stored_page(page_id: int, pdf_id: int, page_num: int, page_text: str, page_title: str):
+    """Generate and persist the section and page summaries of an already stored page"""
+    # One streamed call for all section summaries plus the page summary
+    if COMBINED_SUMMARIES and page_title and page_title.strip():
+        log.debug("Generating combined section and page summaries for page %d", page_num)
+        async for chunk in summarize_page_combined_stream(page_id, pdf_id, page_num, page_text, page_title):
+            yield chunk
+        return
+
+    # Generate individual section summaries if headings exist
+    if page_title and page_title.strip():
+        log.debug("Generating individual section summaries for page %d", page_num)
+        async for section_chunk in generate_section_summaries_stream(page_id, pdf_id, page_num, page_text, page_title):
+            yield section_chunk
+
+    # Summarize this page (overall summary) and stream results
+    log.debug("Starting overall page summarization for page %d", page_num)
+    async for chunk in summarize_page_stream(page_id, page_num, page_text, page_title):
+        yield chunk
+
+
+async def extraction_failed_stream(page_num: int, error: str):
+    """The error event of a page whose text could not be extracted"""
+    yield f"data: {json.dumps({'page_num': page_num, 'error': f'Text extraction failed: {error}'})}\n\n"
+
+
+async def stream_pages_in_order(pending_pages: List[int], source, process, concurrency: int = PAGE_CONCURRENCY, on_page_done=None):
+    """
+    Run `process(page_num, item)` for several pages concurrently and yield their events in page order.
+
+    `source` is an async iterable of (page_num, item) in page order; items of pages
+    not in `pending_pages` are skipped. A bounded queue feeds `concurrency` workers,
+    each running one page into a per-page event queue, and this generator drains
+    those queues in page order. The events of the page currently being emitted are
+    forwarded live; later pages are buffered. A window semaphore keeps at most
+    `concurrency` pages in flight or buffered at any time. `on_page_done` is awaited
+    with each page number once all of its events were emitted.
+    """
+    concurrency = max(1, min(concurrency, len(pending_pages)))
+    item_queue = asyncio.Queue(maxsize=concurrency)
+    page_events = {page_num: asyncio.Queue() for page_num in pending_pages}
+    window = asyncio.Semaphore(concurrency)
+
+    async def feeder():
+        fed = set()
+        error = "page not found in the document"
+        try:
+            async for page_num, item in source:
+                if page_num in page_events:
+                    fed.add(page_num)
+                    await item_queue.put((page_num, item))
+        except Exception as e:
+            log.exception("Reading pages failed: %s", e)
+            error = str(e)
+        # Close the pages that will never reach a worker (the source failed or ended early,
+        # e.g. a truncated PDF), so the consumer does not wait on them forever
+        for page_num in pending_pages:
+            if page_num not in fed:
+                await page_events[page_num].put(f"data: {json.dumps({'page_num': page_num, 'error': error})}\n\n")
+                await page_events[page_num].put(_PAGE_DONE)
+        for _ in range(concurrency):
+            await item_queue.put(None)
+
+    async def worker():
+        while True:
+            await window.acquire()
+            entry = await item_queue.get()
+            if entry is None:
+                window.release()
+                return
+            page_num, item = entry
+            events = page_events[page_num]
+            try:
+                async for event in process(page_num, item):
+                    await events.put(event)
+            except Exception as e:
+                log.exception("Pipeline failed on page %d: %s", page_num, e)
+                await events.put(f"data: {json.dumps({'page_num': page_num, 'error': str(e)})}\n\n")
+            finally:
+                await events.put(_PAGE_DONE)
+
+    tasks = [asyncio.create_task(feeder())]
+    tasks += [asyncio.create_task(worker()) for _ in range(concurrency)]
+
+    try:
+        for page_num in pending_pages:
+            events = page_events[page_num]
+            while True:
+                event = await events.get()
+                if event is _PAGE_DONE:
+                    break
+                yield event
+            # Free the buffered events and let a worker pick up the next page
+            del page_events[page_num]
+            window.release()
+            if on_page_done:
+                await on_page_done(page_num)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def run_page_pipeline(
+    pdf_id: int,
+    file_path: str,
+    total_pages: int,
+    concurrency: int = PAGE_CONCURRENCY,
+    page_numbers: Optional[List[int]] = None,
+    on_page_done=None
+):
+    """
+    Extract, persist and summarize PDF pages concurrently, yielding their SSE events in page order.
+
+    Pages are extracted by the extraction process pool and processed by
+    `stream_pages_in_order`. `page_numbers` restricts processing to a subset of
+    pages (e.g. when resuming a job); every page is still extracted for the
+    document outline.
+    """
+    pending_pages = sorted(page_numbers) if page_numbers is not None else list(range(1, total_pages + 1))
+    if not pending_pages:
+        return
+
+    # How page headings were found; "reused" pages copied a near duplicate's
+    heading_stats = {"regex": 0, "layout": 0, "none": 0, "llm": 0, "reused": 0}
+
+    async def extracted_pages():
+        page_texts = []
+        async for page_num, extraction in extract_pages_stream(file_path, total_pages):
+            page_texts.append((page_num, extraction["text"]))
+            yield page_num, extraction
+
+        # Whole-document outline with page spans, built once every page is extracted
+        try:
+            with span("segmentation"):
+                sections_count = await persistence.writer.run(
+                    lambda session: persist_document_sections(session, pdf_id, page_texts)
+                )
+            log.debug("Stored %d document section(s) for PDF %d", sections_count, pdf_id)
+        except Exception as e:
+            log.exception("Document segmentation failed for PDF %d: %s", pdf_id, e)
+
+    def process(page_num, extraction):
+        if "error" in extraction:
+            # Nothing to summarize: report the page instead of sending empty text to the LLM
+            return extraction_failed_stream(page_num, extraction["error"])
+        return process_page_stream(pdf_id, page_num, extraction["text"], extraction, heading_stats)
+
+    async for event in stream_pages_in_order(pending_pages, extracted_pages(), process, concurrency, on_page_done):
+        yield event
+
+    # Per-document heading detection report (how many pages needed the LLM fallback)
+    log.info("Heading detection for PDF %d: %s", pdf_id, heading_stats)
+    llm_fallbacks = heading_stats["llm"]
+    persistence.writer.submit(
+        lambda session: session.query(PDF).filter(PDF.id == pdf_id).update({PDF.heading_llm_fallbacks: llm_fallbacks})
+    )
+    # Everything of this document is committed before the stream reports completion
+    with span("db.flush"):
+        await persistence.writer.flush()
+    yield f"data: {json.dumps({'type': 'heading_stats', 'data': heading_stats})}\n\n"
+
+
+def persist_document_sections(db, pdf_id: int, page_texts: List[tuple]) -> int:
+    """Segment a document, store its outline with page spans and update `PDF.sections_count`
+
+    Runs as a write-behind operation; the writer commits the session.
+    """
+    tree = segment_document(page_texts)
+    position = 0
+    db.query(DocumentSection).filter(DocumentSection.pdf_id == pdf_id).delete()
+    pending = [(section, None) for section in reversed(tree)]
+    while pending:
+        section, parent_id = pending.pop()
+        row = DocumentSection(
+            pdf_id=pdf_id,
+            parent_id=parent_id,
+            position=position,
+            level=section["level"],
+            title=section["title"],
+            start_page=section["start_page"],
+            end_page=section["end_page"]
+        )
+        db.add(row)
+        db.flush()  # Assigns row.id for the children
+        position += 1
+        pending.extend((child, row.id) for child in reversed(section["children"]))
+    db.query(PDF).filter(PDF.id == pdf_id).update({PDF.sections_count: position})
+    return position
+
+
+async def find_processed_pdf(db, content_hash: str):
+    """
+    Return the most recent PDF with the given content hash whose pages are all stored, if any.
+
+    Some of its pages may have failed to summarize; `find_incomplete_pages` lists them.
+    """
+    candidates = (await db.execute(select(PDF).where(PDF.content_hash == content_hash).order_by(PDF.upload_date.desc()))).scalars().all()
+    for pdf in candidates:
+        stored_pages = await db.scalar(select(func.count(PageSummary.id)).where(PageSummary.pdf_id == pdf.id))
+        if pdf.total_pages and stored_pages == pdf.total_pages:
+            return pdf
+    return None
+
+
+async def replay_pdf_stream(pdf_id: int, skip_pages: Optional[set] = None):
+    """
+    Replay the stored pages, section summaries and whole-paper summary of a PDF as the live SSE event sequence.
+
+    Pages in `skip_pages` (about to be summarized again) are left out, and so is the
+    whole-paper summary, which is then out of date.
+    """
+    # Everything is read up front, so no connection is held while a slow client reads the stream
+    async with db_module.AsyncSessionLocal() as db:
+        pages = (await db.execute(
+            select(PageSummary.id, PageSummary.page_number, PageSummary.title, PageSummary.summary, PageSummary.reused_from)
+            .where(PageSummary.pdf_id == pdf_id).order_by(PageSummary.page_number)
+        )).all()
+        sections = (await db.execute(
+            select(SectionSummary.id, SectionSummary.page_id, SectionSummary.section_title, SectionSummary.summary)
+            .where(SectionSummary.pdf_id == pdf_id).order_by(SectionSummary.page_number, SectionSummary.id)
+        )).all()
+        texts = dict((await db.execute(
+            select(PageContent.page_id, PageContent.data)
+            .join(PageSummary, PageSummary.id == PageContent.page_id)
+            .where(PageSummary.pdf_id == pdf_id)
+        )).all())
+        document_summary = await db.scalar(select(PDF.summary).where(PDF.id == pdf_id))
+    sections_by_page = {}
+    for section in sections:
+        sections_by_page.setdefault(section.page_id, []).append(section)
+
+    log.info("Replaying %d stored page(s) for PDF %d", len(pages), pdf_id)
+    for page in pages:
+        if skip_pages and page.page_number in skip_pages:
+            continue
+        content = decompress_text(texts.get(page.id), 500)
+        reused = {'reused': True} if page.reused_from else {}
+        yield f"data: {json.dumps({'page_id': page.id, 'page_num': page.page_number, 'title': page.title, 'content': content, 'summary': '', **reused})}\n\n"
+        for section in sections_by_page.get(page.id, []):
+            yield section_summary_event(page.page_number, section.section_title, section.summary, section.id)
+        yield f"data: {json.dumps({'page_id': page.id, 'page_num': page.page_number, 'summary': page.summary, 'streaming': False, 'complete': True, **reused})}\n\n"
+        yield f"data: {json.dumps({'page_id': page.id, 'page_num': page.page_number, 'done': True})}\n\n"
+    if document_summary and not skip_pages:
+        yield document_summary_event(pdf_id, document_summary)
+
+
+async def find_incomplete_pages(db, pdf_id: int) -> List[int]:
+    """Page numbers whose summary is empty or an error, or with fewer section summaries than headings"""
+    section_counts = dict((await db.execute(
+        select(SectionSummary.page_id, func.count(SectionSummary.id))
+        .where(SectionSummary.pdf_id == pdf_id)
+        .group_by(SectionSummary.page_id)
+    )).all())
+    pages = await db.execute(
+        select(PageSummary.id, PageSummary.page_number, PageSummary.title, PageSummary.summary)
+        .where(PageSummary.pdf_id == pdf_id).order_by(PageSummary.page_number)
+    )
+    incomplete = []
+    for page_id, page_number, title, summary in pages:
+        headings = [heading for heading in (title or "").split(" > ") if heading.strip()]
+        if is_failed_summary(summary) or section_counts.get(page_id, 0) < len(headings):
+            incomplete.append(page_number)
+    return incomplete
+
+
+def _reset_page(db, page_id: int):
+    """Drop the section summaries and the summary of a page about to be summarized again"""
+    db.query(SectionSummary).filter(SectionSummary.page_id == page_id).delete(synchronize_session=False)
+    db.query(PageSummary).filter(PageSummary.id == page_id).update({PageSummary.summary: None}, synchronize_session=False)
+
+
+async def reprocess_pdf_stream(pdf_id: int, page_numbers: List[int], concurrency: int = PAGE_CONCURRENCY):
+    """Summarize the given stored pages again from their stored text, yielding their SSE events in page order"""
+
+    async def stored_pages():
+        for page_num in page_numbers:
+            async with db_module.AsyncSessionLocal() as db:
+                page = (await db.execute(
+                    select(PageSummary.id, PageSummary.title, PageContent.data)
+                    .outerjoin(PageContent, PageContent.page_id == PageSummary.id)
+                    .where(PageSummary.pdf_id == pdf_id, PageSummary.page_number == page_num)
+                )).first()
+            yield page_num, page
+
+    async def process(page_num, page):
+        if page is None:
+            return  # Deleted meanwhile
+        page_id, title, data = page
+        await persistence.writer.run(lambda session: _reset_page(session, page_id))
+        content = decompress_text(data)
+        yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'title': title, 'content': content[:500], 'summary': ''})}\n\n"
+        with span("summarize", page=page_num):
+            async for event in summarize_stored_page(page_id, pdf_id, page_num, content, title or ""):
+                yield event
+
+    async for event in stream_pages_in_order(page_numbers, stored_pages(), process, concurrency):
+        yield event
+    await persistence.writer.flush()
@@ -1,31 +1,38 @@
-
 import os
 import json
 import io
-import uuid
-import sys
+import time
 import asyncio
-import traceback
-from openai import OpenAI
-from PyPDF2 import PdfReader
-import database as db_module
 from typing import List, Dict
-from datetime import datetime
-from dotenv import load_dotenv
 from fastapi import HTTPException
-from database import PageSummary, SectionSummary
+from helper import persistence
+from helper.llm import get_client, model_for
+from helper.llm_cache import forget_completion
+from helper.metrics import HEADING_DETECTION_SECONDS
+from helper.sse import DeltaCoalescer, summary_delta_event, with_flush_deadlines
+from helper.segmentation import detect_headings, flatten_sections, segment_document
+from helper.tracing import get_logger
+
+log = get_logger(__name__)
+
+# Summarize all sections and the page in a single streamed call (1 request per page instead of N+1)
+COMBINED_SUMMARIES = os.getenv("COMBINED_SUMMARIES", "true").lower() in ("1", "true", "yes")
+
+# Markers of the line-oriented format used by the combined summary response
+SECTION_MARKER = "### SECTION:"
+PAGE_MARKER = "### PAGE SUMMARY"
 
-load_dotenv(override=True)
+# Prefixes of the messages stored as the page summary when summarization fails
+SUMMARY_FAILED = "❌ Summary generation failed"
+STREAM_FAILED = "Error iterating response"
 
-# Configure Grok API (via OpenAI client)
-client = OpenAI(
-    api_key=os.getenv("GROK_API_KEY"),
-    base_url="https://api.groq.com/openai/v1",
-)
-GROK_MODEL_NAME = os.getenv("GROK_MODEL_NAME", "openai/gpt-oss-20b")
+def is_failed_summary(summary: str) -> bool:
+    """True for a missing, empty or error page summary"""
+    return not summary or not summary.strip() or summary.startswith((SUMMARY_FAILED, STREAM_FAILED))
 
 def extract_text_and_pages_from_pdf(pdf_bytes: bytes) -> tuple[str, int, Dict[str, int]]:
     """Extract text content from PDF and track page numbers for sections"""
+    from PyPDF2 import PdfReader
     try:
         pdf_reader = PdfReader(io.BytesIO(pdf_bytes))
         total_pages = len(pdf_reader.pages)
@@ -43,117 +50,65 @@ def extract_text_and_pages_from_pdf(pdf_bytes: bytes) -> tuple[str, int, Dict[st
         raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
 
 
-def find_section_pages(section_text: str, page_texts: List[tuple]) -> tuple[int, int]:
-    """Find the start and end page numbers for a section"""
-    # Get first 200 characters of section to search for
-    search_text = section_text[:200].strip()
-    
-    start_page = None
-    end_page = None
-    
-    for page_num, page_text in page_texts:
-        if search_text in page_text:
-            if start_page is None:
-                start_page = page_num
-            end_page = page_num
-    
-    return start_page or 1, end_page or 1
-
-
 def extract_sections(text: str, page_texts: List[tuple]) -> List[Dict]:
-    """Split the paper into logical sections based on common headers"""
-    # Common section headers in research papers
-    section_markers = [
-        "abstract", "introduction", "related work", "methodology",
-        "methods", "approach", "dataset", "experiments", "experimental setup",
-        "results", "discussion", "conclusion", "future work", "references"
+    """Split the paper into logical sections (flattened outline with page spans and content)"""
+    tree = segment_document(page_texts, include_content=True)
+    return [
+        {
+            "title": section["title"],
+            "content": section["content"],
+            "start_page": section["start_page"],
+            "end_page": section["end_page"]
+        }
+        for section in flatten_sections(tree)
     ]
 
-    # Simple section extraction (can be enhanced)
-    sections = []
-    lines = text.split('\n')
-    current_section = ""
-    current_title = ""
-
-    for line in lines:
-        line_lower = line.lower().strip()
-        if any(marker in line_lower for marker in section_markers) and len(line) < 100:
-            if current_section:
-                start_page, end_page = find_section_pages(current_section, page_texts)
-                sections.append({
-                    "title": current_title,
-                    "content": current_section,
-                    "start_page": start_page,
-                    "end_page": end_page
-                })
-            current_title = line.strip()
-            current_section = line + "\n"
-        else:
-            current_section += line + "\n"
 
-    if current_section:
-        start_page, end_page = find_section_pages(current_section, page_texts)
-        sections.append({
-            "title": current_title or "Introduction",
-            "content": current_section,
-            "start_page": start_page,
-            "end_page": end_page
-        })
+async def extract_page_title(page_content: str, layout: dict = None, stats: dict = None) -> str:
+    """Extract ALL section/subsection titles from page content (main heading, subheadings, etc.)
 
-    return sections
+    Detection order: precompiled regex patterns, then the layout-aware detector
+    (font size, boldness, spacing) when `layout` comes from the extraction pool,
+    and only when no layout information is available, the LLM. `stats` counts
+    which method resolved the page ("regex", "layout", "none" or "llm").
+    """
+    started = time.perf_counter()
+    resolved = ["none"]
 
+    def count(method: str):
+        resolved[0] = method
+        if stats is not None:
+            stats[method] = stats.get(method, 0) + 1
 
-def extract_page_title(page_content: str) -> str:
-    """Extract ALL section/subsection titles from page content (main heading, subheadings, etc.)"""
-    import re
-    
     try:
         if not page_content or len(page_content.strip()) < 20:
+            count("none")
             return ""
         
-        found_headings = []
-        
-        # Regex patterns for different heading styles
-        patterns = [
-            # Numbered sections with dot: "1. Introduction", "3.1. Research", "3.1.1. Dataset"
-            r'^(\d+(?:\.\d+)+\.?\s+[A-Z][^\n]{3,100})$',  # Require at least one dot for subsections or strict format
-            r'^(\d+\.\s+[A-Z][^\n]{3,100})$',             # Top level "1. Title"
-            
-            # All caps headings: "INTRODUCTION", "METHODOLOGY"
-            r'^([A-Z][A-Z\s]{3,50})$',
-            
-            # Title case with limited keywords (avoid sentences): "Related Work", "Data Analysis"
-            # Must look like a title (Capitalized Words)
-            r'^([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,7})$' 
-        ]
-        
-        # Split content into lines and check all lines (not just first 15)
-        lines = page_content.split('\n')
-        
-        for line in lines:
-            line = line.strip()
-            if not line or len(line) < 3:
-                continue
-                
-            # Check each pattern
-            for pattern in patterns:
-                match = re.match(pattern, line, re.MULTILINE)
-                if match:
-                    title = match.group(1).strip()
-                    # Validate it's not too long and looks like a heading
-                    if 3 <= len(title) <= 100 and not title.endswith('.'):
-                        # Avoid duplicates
-                        if title not in found_headings:
-                            found_headings.append(title)
-                        break  # Move to next line once we found a match
+        # Precompiled heading patterns shared with the document segmentation engine
+        found_headings = detect_headings(page_content)
         
         # If we found headings via regex, return them
         if found_headings:
             # Join multiple headings with " > " separator
             result = " > ".join(found_headings)
-            print(f"DEBUG: Extracted {len(found_headings)} heading(s) via regex: '{result}'")
+            log.debug("Extracted %d heading(s) via regex: %r", len(found_headings), result)
+            count("regex")
             return result
         
+        # Font-size / boldness aware detection from the extraction pass
+        if layout and layout.get("headings"):
+            result = " > ".join(layout["headings"])
+            log.debug("Extracted %d heading(s) via layout: %r", len(layout["headings"]), result)
+            count("layout")
+            return result
+        
+        # The layout was readable and shows no heading: trust it instead of asking the LLM
+        if layout and layout.get("has_layout"):
+            count("none")
+            return ""
+        
+        count("llm")
         # If regex didn't find anything, use AI as fallback
         prompt = f"""Analyze this page from a research paper and extract ALL section and subsection titles/headings.
 
@@ -169,8 +124,8 @@ def extract_page_title(page_content: str) -> str:
 
         Headings:"""
 
-        response = client.chat.completions.create(
-            model=GROK_MODEL_NAME,
+        response = await get_client().chat.completions.create(
+            model=model_for("headings"),
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that extracts headings from research papers."},
                 {"role": "user", "content": prompt}
@@ -189,14 +144,15 @@ def extract_page_title(page_content: str) -> str:
         return title
         
     except Exception as e:
-        print(f"ERROR extracting title: {str(e)}")
-        traceback.print_exc()
+        log.exception("Title extraction failed: %s", e)
         return ""
+    finally:
+        HEADING_DETECTION_SECONDS.observe(time.perf_counter() - started, method=resolved[0])
 
 
-def summarize_page_stream(page_id: int, page_num: int, page_content: str, page_headings: str = ""):
+async def summarize_page_stream(page_id: int, page_num: int, page_content: str, page_headings: str = ""):
     """Generate streaming summary for a page, organized by headings if available"""
-    print(f"DEBUG: summarize_page_stream called for page {page_num}, content length: {len(page_content)}, headings: '{page_headings}'")
+    log.debug("summarize_page_stream called for page %d, content length: %d, headings: %r", page_num, len(page_content), page_headings)
     try:
         # Build prompt based on whether we have headings
         if page_headings and page_headings.strip():
@@ -239,92 +195,79 @@ def summarize_page_stream(page_id: int, page_num: int, page_content: str, page_h
             - Plain text only
             - Be extremely concise"""
 
-        print(f"DEBUG: About to call Grok API for page {page_num}")
         
         try:
             # Use OpenAI compatible client for Grok
-            response = client.chat.completions.create(
-                model=GROK_MODEL_NAME,
+            response = await get_client().chat.completions.create(
+                model=model_for("page_summary"),
                 messages=[
                     {"role": "system", "content": "You are a helpful research assistant."},
                     {"role": "user", "content": prompt}
                 ],
                 stream=True
             )
-            print(f"DEBUG: Grok API call successful for page {page_num}, starting to read chunks")
+            log.debug("Grok API call successful for page %d, starting to read chunks", page_num)
         except Exception as api_error:
-            print(f"ERROR: Grok API call failed for page {page_num}: {str(api_error)}")
+            log.error("Grok API call failed for page %d: %s", page_num, api_error)
             
-            error_msg = f"❌ Summary generation failed: {str(api_error)[:100]}"
+            error_msg = f"{SUMMARY_FAILED}: {str(api_error)[:100]}"
             
-            with db_module.SessionLocal() as db:
-                page = db.query(PageSummary).filter(PageSummary.id == page_id).first()
-                if page:
-                    page.summary = error_msg
-                    db.commit()
+            _store_page_summary(page_id, error_msg)
             
             # Still yield the error to frontend
             yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': error_msg, 'error': True})}\n\n"
             return
 
         summary_parts = []
-        chunk_count = 0
+        coalescer = DeltaCoalescer()
         try:
-            for chunk in response:
-                chunk_count += 1
-                content_delta = chunk.choices[0].delta.content
+            async for chunk in with_flush_deadlines(response, coalescer):
+                if chunk is None:
+                    # The model paused with deltas buffered: send them now
+                    yield summary_delta_event(page_id, page_num, coalescer.flush())
+                    continue
+                content_delta = chunk.choices[0].delta.content if chunk.choices else None
                 if content_delta:
                     summary_parts.append(content_delta)
-                    # Stream each chunk immediately to frontend for real-time display
-                    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': content_delta, 'content': page_content[:500], 'streaming': True})}\n\n"
-                else:
-                    # Keepalive or empty chunk
-                    pass
+                    # Stream deltas in small time/size bounded frames for real-time display
+                    text = coalescer.add(content_delta)
+                    if text:
+                        yield summary_delta_event(page_id, page_num, text)
+            text = coalescer.flush()
+            if text:
+                yield summary_delta_event(page_id, page_num, text)
         except Exception as loop_error:
-            print(f"ERROR: Exception in for loop for page {page_num}: {type(loop_error).__name__}: {str(loop_error)}")
-            import traceback
-            traceback.print_exc()
+            log.exception("Exception while streaming page %d: %s: %s", page_num, type(loop_error).__name__, loop_error)
             
-            error_msg = f"Error iterating response: {str(loop_error)}"
-            with db_module.SessionLocal() as db:
-                page = db.query(PageSummary).filter(PageSummary.id == page_id).first()
-                if page:
-                    page.summary = error_msg
-                    db.commit()
+            error_msg = f"{STREAM_FAILED}: {str(loop_error)}"
+            _store_page_summary(page_id, error_msg)
             return
         
         # Update database with complete summary
         final_summary = ''.join(summary_parts)        
-        # Save to database
-        with db_module.SessionLocal() as db:
-            page = db.query(PageSummary).filter(PageSummary.id == page_id).first()
-            if page:
-                page.summary = final_summary
-                db.commit()
-                db.refresh(page)
-                print(f"DEBUG: ✓ Summary saved to DB for page {page_num}, ID={page_id}, summary='{page.summary[:100]}...'")
-            else:
-                print(f"ERROR: Page with ID {page_id} not found in database!")
+        # Save to database (write-behind, the stream does not wait for the commit)
+        _store_page_summary(page_id, final_summary)
+        log.debug("Summary queued for DB for page %d, ID=%d", page_num, page_id)
         
         # Send final complete summary to frontend
-        yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': final_summary, 'content': page_content[:500], 'streaming': False, 'complete': True})}\n\n"
+        yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': final_summary, 'streaming': False, 'complete': True})}\n\n"
         yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'done': True})}\n\n"
 
     except Exception as e:
         yield f"data: {json.dumps({'error': str(e)})}\n\n"
 
 
-def generate_section_summaries_stream(page_id: int, pdf_id: int, page_num: int, page_content: str, page_headings: str):
+async def generate_section_summaries_stream(page_id: int, pdf_id: int, page_num: int, page_content: str, page_headings: str):
     """Generate individual summaries for each section/heading on a page"""
     
     if not page_headings or not page_headings.strip():
-        print(f"DEBUG: No headings found for page {page_num}, skipping section summaries")
+        log.debug("No headings found for page %d, skipping section summaries", page_num)
         return
     
     # Split headings
     headings_list = page_headings.split(" > ")
     
-    for idx, heading in enumerate(headings_list):
+    for heading in headings_list:
         heading = heading.strip()
         if not heading:
             continue
@@ -344,8 +287,8 @@ def generate_section_summaries_stream(page_id: int, pdf_id: int, page_num: int,
         - Plain text, no formatting"""
 
         try:
-            response = client.chat.completions.create(
-                model=GROK_MODEL_NAME,
+            response = await get_client().chat.completions.create(
+                model=model_for("sections"),
                 messages=[
                     {"role": "system", "content": "You are a helpful research assistant."},
                     {"role": "user", "content": prompt}
@@ -355,25 +298,210 @@ def generate_section_summaries_stream(page_id: int, pdf_id: int, page_num: int,
             )
             
             section_summary = response.choices[0].message.content.strip()
-            print(f"DEBUG: Generated summary for '{heading}': {section_summary[:80]}...")
+            log.debug("Generated summary for %r (%d chars)", heading, len(section_summary))
             
-            # Store in database
-            with db_module.SessionLocal() as db:
-                new_section = SectionSummary(
-                    page_id=page_id,
-                    pdf_id=pdf_id,
-                    page_number=page_num,
-                    section_title=heading,
-                    summary=section_summary
-                )
-                db.add(new_section)
-                db.commit()
-                db.refresh(new_section)
-                print(f"DEBUG: ✓ Saved section summary to DB: ID={new_section.id}")
-                
-                # Yield to frontend
-                yield f"data: {json.dumps({'type': 'section_summary', 'page_num': page_num, 'section_title': heading, 'summary': section_summary, 'section_id': new_section.id})}\n\n"
+            # Store in database and yield to frontend
+            yield await _store_section_summary(page_id, pdf_id, page_num, heading, section_summary)
                 
         except Exception as e:
-            print(f"ERROR generating summary for section '{heading}': {str(e)}")
-            traceback.print_exc()
+            log.exception("Summary generation failed for section %r: %s", heading, e)
+            # Nothing is stored for this section; report it instead of dropping it silently
+            yield section_error_event(page_num, heading, e)
+
+
+async def _store_section_summary(page_id: int, pdf_id: int, page_num: int, heading: str, section_summary: str) -> str:
+    """Persist a section summary and return its `section_summary` SSE event"""
+    section_id = await persistence.insert_section(page_id, pdf_id, page_num, heading, section_summary)
+    log.debug("Saved section summary to DB: ID=%d", section_id)
+    return section_summary_event(page_num, heading, section_summary, section_id)
+
+
+def section_error_event(page_num: int, heading: str, error: Exception) -> str:
+    """Build the `section_error` SSE event sent when a section summary could not be generated"""
+    return f"data: {json.dumps({'type': 'section_error', 'page_num': page_num, 'section_title': heading, 'message': str(error)[:200]})}\n\n"
+
+
+def section_summary_event(page_num: int, heading: str, section_summary: str, section_id: int) -> str:
+    """Build the `section_summary` SSE event consumed by the Dashboard"""
+    return f"data: {json.dumps({'type': 'section_summary', 'page_num': page_num, 'section_title': heading, 'summary': section_summary, 'section_id': section_id})}\n\n"
+
+
+def _store_page_summary(page_id: int, summary: str):
+    """Queue the overall summary of a page on the write-behind writer"""
+    persistence.update_page(page_id, summary=summary)
+
+
+def _match_heading(title: str, headings_list: List[str], index: int) -> str:
+    """Map a section title echoed by the model back onto the detected heading"""
+    if title in headings_list:
+        return title
+    if index < len(headings_list):
+        return headings_list[index]
+    return title
+
+
+async def summarize_page_combined_stream(page_id: int, pdf_id: int, page_num: int, page_content: str, page_headings: str):
+    """Generate every section summary and the overall page summary with ONE streamed call.
+
+    The model answers in a line-oriented format that is parsed incrementally:
+    each finished section becomes a `section_summary` event and `SectionSummary` row,
+    and the page summary is streamed as regular page deltas before being saved.
+    """
+    headings_list = [h.strip() for h in page_headings.split(" > ") if h.strip()]
+    if not headings_list:
+        async for chunk in summarize_page_stream(page_id, page_num, page_content, page_headings):
+            yield chunk
+        return
+
+    headings_formatted = "\n".join([f"- {h}" for h in headings_list])
+    prompt = f"""You are analyzing page {page_num} of a research paper.
+        This page contains the following section(s)/subsection(s):
+        {headings_formatted}
+
+        Page Content:
+        {page_content[:3000]}
+
+        Summarize EACH section above, then the page as a whole, using EXACTLY this format:
+        {SECTION_MARKER} <exact section name>
+        <summary of that section, 1-2 sentences>
+        (repeat for every section, in the order listed)
+        {PAGE_MARKER}
+        <overall page summary, 2-3 sentences>
+
+        Rules:
+        - Maximum 50 words per section and 50 words for the page summary
+        - Use the exact section names from the list above
+        - Plain text only, no extra formatting"""
+
+    params = {
+        "model": model_for("page_summary"),
+        "messages": [
+            {"role": "system", "content": "You are a helpful research assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3,
+        "stream": True
+    }
+    try:
+        response = await get_client().chat.completions.create(**params)
+    except Exception as api_error:
+        log.error("Grok API call failed for page %d: %s", page_num, api_error)
+        error_msg = f"{SUMMARY_FAILED}: {str(api_error)[:100]}"
+        _store_page_summary(page_id, error_msg)
+        yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': error_msg, 'error': True})}\n\n"
+        return
+
+    sections = []
+    current_title = None
+    current_parts = []
+    summary_parts = []
+    pending = ""
+    in_page_summary = False
+    marker_seen = False
+    coalescer = DeltaCoalescer()
+
+    async def close_section():
+        """Persist the section being parsed, returning its SSE event (or None)"""
+        nonlocal current_title, current_parts
+        event = None
+        section_summary = " ".join(current_parts).strip()
+        if current_title is not None and section_summary:
+            heading = _match_heading(current_title, headings_list, len(sections))
+            sections.append((heading, section_summary))
+            event = await _store_section_summary(page_id, pdf_id, page_num, heading, section_summary)
+        current_title = None
+        current_parts = []
+        return event
+
+    def page_delta(text: str):
+        """Record a page summary delta, returning a streaming SSE event when a coalesced frame is due (or None)"""
+        if not summary_parts:
+            text = text.lstrip(": \n")
+        if not text:
+            return None
+        summary_parts.append(text)
+        text = coalescer.add(text)
+        return summary_delta_event(page_id, page_num, text) if text else None
+
+    async def consume_lines(final: bool = False):
+        """Parse complete lines of `pending`, yielding section and page events"""
+        nonlocal pending, in_page_summary, current_title, marker_seen
+        while not in_page_summary:
+            stripped = pending.lstrip()
+            if stripped.upper().startswith(PAGE_MARKER):
+                marker_seen = True
+                event = await close_section()
+                if event:
+                    yield event
+                in_page_summary = True
+                rest, pending = stripped[len(PAGE_MARKER):], ""
+                event = page_delta(rest)
+                if event:
+                    yield event
+                return
+            if "\n" in pending:
+                line, pending = pending.split("\n", 1)
+            elif final and pending:
+                line, pending = pending, ""
+            else:
+                return
+            line = line.strip()
+            if line.upper().startswith(SECTION_MARKER):
+                marker_seen = True
+                event = await close_section()
+                if event:
+                    yield event
+                current_title = line[len(SECTION_MARKER):].strip()
+            elif line and current_title is not None:
+                current_parts.append(line)
+
+    try:
+        async for chunk in with_flush_deadlines(response, coalescer):
+            if chunk is None:
+                yield summary_delta_event(page_id, page_num, coalescer.flush())
+                continue
+            content_delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not content_delta:
+                continue
+            if in_page_summary:
+                event = page_delta(content_delta)
+                if event:
+                    yield event
+                continue
+            pending += content_delta
+            async for event in consume_lines():
+                yield event
+        async for event in consume_lines(final=True):
+            yield event
+        event = await close_section()
+        if event:
+            yield event
+        text = coalescer.flush()
+        if text:
+            yield summary_delta_event(page_id, page_num, text)
+    except Exception as loop_error:
+        log.exception("Exception in combined stream for page %d: %s: %s", page_num, type(loop_error).__name__, loop_error)
+        _store_page_summary(page_id, f"{STREAM_FAILED}: {str(loop_error)}")
+        return
+
+    if not marker_seen:
+        # The model ignored the format, so nothing was parsed or sent: summarize with separate calls instead
+        log.warning("Combined summary for page %d has no section markers, falling back to separate calls", page_num)
+        # Otherwise the cache would replay the same unusable answer on every reprocess
+        await asyncio.to_thread(forget_completion, params)
+        async for event in generate_section_summaries_stream(page_id, pdf_id, page_num, page_content, page_headings):
+            yield event
+        async for event in summarize_page_stream(page_id, page_num, page_content, page_headings):
+            yield event
+        return
+
+    final_summary = "".join(summary_parts).strip()
+    if not final_summary:
+        # Model skipped the page summary block; fall back to the section summaries
+        final_summary = "\n".join(f"{heading}: {summary}" for heading, summary in sections)
+    log.debug("Combined summary for page %d: %d section(s), page summary length %d", page_num, len(sections), len(final_summary))
+    _store_page_summary(page_id, final_summary)
+
+    # Send final complete summary to frontend
+    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': final_summary, 'streaming': False, 'complete': True})}\n\n"
+    yield f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'done': True})}\n\n"
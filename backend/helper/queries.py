@@ -0,0 +1,85 @@
+import json
+import base64
+from datetime import datetime
+from typing import List, Optional
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, select
+from database import PDF, PageContent, PageSummary, decompress_text
+
+# Columns returned by the library list unless `fields` asks for others
+PDF_LIST_FIELDS = ["id", "filename", "upload_date", "sections_count", "total_pages"]
+PDF_FIELDS = {column.name for column in PDF.__table__.columns}
+
+# Page columns sent with PDF details; the page text (`content`) is only included on request
+PAGE_FIELDS = ["id", "pdf_id", "page_number", "title", "summary", "created_at"]
+
+
+def encode_cursor(upload_date: datetime, pdf_id: int) -> str:
+    raw = json.dumps([upload_date.isoformat() if upload_date else None, pdf_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        upload_date, pdf_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return (datetime.fromisoformat(upload_date) if upload_date else None), int(pdf_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> List[str]:
+    """Validate a comma separated projection; `id` and `upload_date` are always kept for the cursor"""
+    if not fields:
+        return PDF_LIST_FIELDS
+    requested = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in requested if name not in PDF_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown field(s): {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", "upload_date", *requested]))
+
+
+async def list_pdfs(db, limit: int, cursor: Optional[str] = None, fields: Optional[str] = None) -> dict:
+    """One keyset page of the library, newest first, projected onto the requested columns"""
+    names = parse_fields(fields)
+    query = select(*[getattr(PDF, name) for name in names])
+    if cursor:
+        upload_date, pdf_id = decode_cursor(cursor)
+        query = query.where(or_(
+            PDF.upload_date < upload_date,
+            and_(PDF.upload_date == upload_date, PDF.id < pdf_id)
+        ))
+    rows = (await db.execute(query.order_by(PDF.upload_date.desc(), PDF.id.desc()).limit(limit + 1))).all()
+
+    items = [dict(zip(names, row)) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last["upload_date"], last["id"])
+    return {"pdfs": items, "next_cursor": next_cursor}
+
+
+async def list_pages(db, pdf_id: int, include_content: bool = False) -> List[dict]:
+    """Pages of a PDF in order; the compressed page text is only read and inflated when requested"""
+    columns = [getattr(PageSummary, name) for name in PAGE_FIELDS]
+    if include_content:
+        query = select(*columns, PageContent.data).outerjoin(PageContent, PageContent.page_id == PageSummary.id)
+    else:
+        query = select(*columns)
+    rows = (await db.execute(query.where(PageSummary.pdf_id == pdf_id).order_by(PageSummary.page_number))).all()
+    pages = []
+    for row in rows:
+        page = dict(zip(PAGE_FIELDS, row))
+        if include_content:
+            page["content"] = decompress_text(row[-1])
+        pages.append(page)
+    return pages
+
+
+async def get_page_text(db, pdf_id: int, page_number: int) -> Optional[tuple]:
+    """(page_id, text) of one page, or None if the page does not exist"""
+    row = (await db.execute(
+        select(PageSummary.id, PageContent.data)
+        .outerjoin(PageContent, PageContent.page_id == PageSummary.id)
+        .where(PageSummary.pdf_id == pdf_id, PageSummary.page_number == page_number)
+    )).first()
+    return (row[0], decompress_text(row[1])) if row else None
@@ -0,0 +1,330 @@
+import os
+import time
+import random
+import asyncio
+import contextvars
+from collections import deque
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from helper.metrics import (
+    LLM_COMPLETION_TOKENS,
+    LLM_PROMPT_TOKENS,
+    LLM_REQUESTS,
+    LLM_REQUEST_SECONDS,
+    LLM_TTFT_SECONDS,
+)
+from helper.tracing import get_logger, record_span
+
+log = get_logger(__name__)
+
+# Worker processes serving the app (WEB_CONCURRENCY, as read by uvicorn and gunicorn);
+# they split the provider limits between them
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", 1)))
+# Provider limits for the whole deployment, off by default (0 disables a bucket); without
+# them 429s still shrink the adaptive concurrency and are retried after their Retry-After
+LLM_RPM = float(os.getenv("LLM_RPM", 0)) / WEB_CONCURRENCY
+LLM_TPM = float(os.getenv("LLM_TPM", 0)) / WEB_CONCURRENCY
+# Adaptive concurrency bounds and the latency above which concurrency is reduced
+LLM_MIN_CONCURRENCY = max(1, int(os.getenv("LLM_MIN_CONCURRENCY", 1)))
+LLM_MAX_CONCURRENCY = max(LLM_MIN_CONCURRENCY, int(os.getenv("LLM_MAX_CONCURRENCY", 16)))
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", 20))
+# Retries and the overall deadline of one logical request (including retries and streaming)
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+LLM_REQUEST_DEADLINE = float(os.getenv("LLM_REQUEST_DEADLINE", 120))
+LLM_BACKOFF_BASE = 0.5
+LLM_BACKOFF_CAP = 30.0
+
+# Token estimate used when a request does not set max_tokens
+DEFAULT_COMPLETION_TOKENS = 512
+
+# Document (or other share) on whose behalf LLM calls in the current context are made
+_llm_owner = contextvars.ContextVar("llm_owner", default=None)
+
+
+def set_llm_owner(owner):
+    """Attribute LLM calls of the current context (and tasks it starts) to `owner`; returns a token for `reset_llm_owner`"""
+    return _llm_owner.set(owner)
+
+
+def reset_llm_owner(token):
+    try:
+        _llm_owner.reset(token)
+    except ValueError:
+        pass  # Reset from another context (e.g. an abandoned stream being finalized)
+
+
+class TokenBucket:
+    """Refilling bucket of `per_minute` units; callers wait (FIFO) until enough units are available"""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0):
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AdaptiveLimiter:
+    """
+    Concurrency limit adjusted by AIMD: each success adds 1/limit (about +1 per
+    round of requests), a 429 halves the limit, and a slow response shrinks it by 10%.
+
+    Slots are shared fairly between owners (documents): a free slot goes to the
+    waiting owner with the fewest requests in flight, ties broken by who has waited
+    longest, so one large document cannot crowd out the others.
+    """
+
+    def __init__(self, minimum: int = LLM_MIN_CONCURRENCY, maximum: int = LLM_MAX_CONCURRENCY, latency_target: float = LLM_LATENCY_TARGET):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.limit = float(min(maximum, max(minimum, 4)))
+        self.in_flight = 0
+        self._running = {}  # owner -> requests in flight
+        self._waiters = {}  # owner -> deque of (arrival, future)
+        self._arrivals = 0
+
+    async def acquire(self, owner=None):
+        if not self._waiters and self.in_flight < int(self.limit):
+            self._grant(owner)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._arrivals += 1
+        self._waiters.setdefault(owner, deque()).append((self._arrivals, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release(owner)  # Granted just as the caller was cancelled
+            else:
+                self._forget(owner, future)
+            raise
+
+    async def release(self, owner=None):
+        self._release(owner)
+
+    def _grant(self, owner):
+        self.in_flight += 1
+        self._running[owner] = self._running.get(owner, 0) + 1
+
+    def _release(self, owner):
+        self.in_flight -= 1
+        self._running[owner] -= 1
+        if not self._running[owner]:
+            del self._running[owner]
+        self._dispatch()
+
+    def _forget(self, owner, future):
+        waiters = self._waiters.get(owner)
+        if waiters:
+            self._waiters[owner] = deque(entry for entry in waiters if entry[1] is not future)
+            if not self._waiters[owner]:
+                del self._waiters[owner]
+
+    def _dispatch(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            owner = min(self._waiters, key=lambda key: (self._running.get(key, 0), self._waiters[key][0][0]))
+            waiters = self._waiters[owner]
+            _, future = waiters.popleft()
+            if not waiters:
+                del self._waiters[owner]
+            if future.cancelled():
+                continue
+            self._grant(owner)
+            future.set_result(None)
+
+    def on_success(self, latency: float):
+        if latency > self.latency_target:
+            self.limit = max(self.minimum, self.limit * 0.9)
+        else:
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._dispatch()
+
+    def on_throttled(self):
+        self.limit = max(self.minimum, self.limit * 0.5)
+
+    def waiting(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+
+def status_code(error) -> int:
+    return getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None) or 0
+
+
+def is_retryable(error) -> bool:
+    status = status_code(error)
+    if status:
+        return status == 429 or status == 408 or status >= 500
+    # No HTTP status: connection errors and timeouts
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+def retry_after(error):
+    """Seconds requested by a Retry-After header (delta-seconds or HTTP date), if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def _field(obj, name: str):
+    """Attribute or key lookup (provider extensions such as `x_groq` arrive as plain dicts)"""
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def _record_usage(usage, model: str):
+    """Count the tokens of an API `usage` object (absent on most streamed chunks)"""
+    if not usage:
+        return
+    LLM_PROMPT_TOKENS.inc(_field(usage, "prompt_tokens") or 0, model=model)
+    LLM_COMPLETION_TOKENS.inc(_field(usage, "completion_tokens") or 0, model=model)
+
+
+def _estimate_tokens(params: dict) -> int:
+    """Rough prompt size (4 characters per token) plus the completion budget"""
+    chars = sum(len(str(message.get("content", ""))) for message in params.get("messages", []))
+    return chars // 4 + int(params.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+class _RateLimitedCompletions:
+    def __init__(self, completions, owner):
+        self._completions = completions
+        self._owner = owner
+
+    async def create(self, **params):
+        owner = self._owner
+        deadline = time.monotonic() + owner.deadline
+        tokens = _estimate_tokens(params)
+        model = params.get("model", "")
+        llm_owner = _llm_owner.get()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"LLM request exceeded its {owner.deadline}s deadline")
+
+            # The fair slot is taken first, so the owners' shares also apply to the RPM/TPM budget
+            queued = time.monotonic()
+            await asyncio.wait_for(owner.limiter.acquire(llm_owner), remaining)
+            try:
+                await asyncio.wait_for(owner.wait_for_budget(tokens), max(0.0, deadline - time.monotonic()))
+            except BaseException:
+                await owner.limiter.release(llm_owner)
+                raise
+            started = time.monotonic()
+            if started - queued > 0.001:
+                record_span("llm.queue", started - queued, model=model)
+            try:
+                response = await asyncio.wait_for(self._completions.create(**params), max(0.1, deadline - started))
+            except Exception as error:
+                await owner.limiter.release(llm_owner)
+                throttled = status_code(error) == 429
+                LLM_REQUESTS.inc(model=model, outcome="throttled" if throttled else "error")
+                if throttled:
+                    owner.limiter.on_throttled()
+                    owner.stats["throttled"] += 1
+                if attempt >= owner.max_retries or not is_retryable(error):
+                    owner.stats["failed"] += 1
+                    raise
+                attempt += 1
+                owner.stats["retries"] += 1
+                delay = retry_after(error)
+                if delay is None:
+                    # Full jitter exponential backoff
+                    delay = random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * 2 ** attempt))
+                log.warning("LLM call failed (%s, status %s), retry %d in %.1fs", type(error).__name__, status_code(error), attempt, delay)
+                await asyncio.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+                continue
+
+            if params.get("stream"):
+                # The concurrency slot is held until the stream is fully consumed
+                return self._guard_stream(response, model, started, deadline, llm_owner)
+            await owner.limiter.release(llm_owner)
+            elapsed = time.monotonic() - started
+            owner.limiter.on_success(elapsed)
+            LLM_REQUESTS.inc(model=model, outcome="ok")
+            LLM_TTFT_SECONDS.observe(elapsed, model=model, stream="false")
+            LLM_REQUEST_SECONDS.observe(elapsed, model=model, stream="false")
+            _record_usage(_field(response, "usage"), model)
+            record_span("llm", elapsed, model=model, attempts=attempt + 1)
+            return response
+
+    async def _guard_stream(self, response, model: str, started: float, deadline: float, llm_owner):
+        owner = self._owner
+        iterator = response.__aiter__()
+        first_token = None
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), max(0.1, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                    LLM_TTFT_SECONDS.observe(first_token, model=model, stream="true")
+                # Usage arrives on the last chunk (Groq reports it under `x_groq`)
+                _record_usage(_field(chunk, "usage") or _field(_field(chunk, "x_groq"), "usage"), model)
+                yield chunk
+            elapsed = time.monotonic() - started
+            owner.limiter.on_success(elapsed)
+            LLM_REQUESTS.inc(model=model, outcome="ok")
+            LLM_REQUEST_SECONDS.observe(elapsed, model=model, stream="true")
+            record_span("llm", elapsed, model=model, stream=True, ttft_ms=round((first_token or elapsed) * 1000, 3))
+        finally:
+            await owner.limiter.release(llm_owner)
+
+
+class RateLimitedClient:
+    """Wraps an async OpenAI-compatible client with RPM/TPM buckets, adaptive concurrency, retries and a deadline"""
+
+    def __init__(self, client, rpm: float = LLM_RPM, tpm: float = LLM_TPM, max_retries: int = LLM_MAX_RETRIES, deadline: float = LLM_REQUEST_DEADLINE):
+        self._client = client
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.limiter = AdaptiveLimiter()
+        self.max_retries = max_retries
+        self.deadline = deadline
+        self.stats = {"retries": 0, "throttled": 0, "failed": 0}
+        self.chat = SimpleNamespace(completions=_RateLimitedCompletions(client.chat.completions, self))
+
+    async def wait_for_budget(self, tokens: int):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+    def info(self) -> dict:
+        return {
+            **self.stats,
+            "concurrency_limit": round(self.limiter.limit, 2),
+            "in_flight": self.limiter.in_flight,
+            "waiting": self.limiter.waiting()
+        }
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
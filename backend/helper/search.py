@@ -0,0 +1,142 @@
+import re
+import json
+import base64
+from typing import Optional
+from fastapi import HTTPException
+from sqlalchemy import text
+
+# Result kinds and the relative weight of their columns in the bm25 ranking
+SEARCH_KINDS = ("page", "section")
+PAGE_WEIGHTS = (1.0, 2.0)      # content, summary
+SECTION_WEIGHTS = (3.0, 2.0)   # section_title, summary
+
+SNIPPET_TOKENS = 16
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+_TERM = re.compile(r'"([^"]+)"|(\w+\*?)', re.UNICODE)
+
+
+def to_match_query(query: str) -> str:
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word (or "quoted phrase")
+    must appear; a trailing * keeps prefix matching. FTS5 operators are not interpreted.
+    """
+    terms = []
+    for phrase, word in _TERM.findall(query or ""):
+        if phrase:
+            words = re.findall(r"\w+", phrase, re.UNICODE)
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+        elif word.endswith("*"):
+            terms.append(f'"{word[:-1]}"*')
+        else:
+            terms.append(f'"{word}"')
+    return " ".join(terms)
+
+
+def _encode_offset(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode("utf-8")).decode("ascii")
+
+
+def _decode_offset(cursor: str) -> int:
+    try:
+        return max(0, int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["offset"]))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def _ranked_ids(db, table: str, weights: tuple, match: str, depth: int, pdf_id: Optional[int]) -> list:
+    """
+    (score, rowid) of the best `depth` matches of one index; bm25 is negative, lower is better.
+    FTS5 ranks the whole match set (`ORDER BY rank` with the column weights) and keeps
+    only the top `depth` while scanning, so common terms cost time but not memory.
+    """
+    source = "page_summaries" if table == "page_search" else "section_summaries"
+    scope, limit, params, members = "", f"LIMIT {int(depth)}", {"match": match, "rank": f"bm25({weights[0]}, {weights[1]})"}, None
+    if pdf_id is not None:
+        # A PDF's rows are written together: the rowid range lets FTS5 skip every other
+        # document, and membership is checked here in case rows of several PDFs interleave
+        # (so the few matches of the range are all ranked, then filtered)
+        members = {row_id for (row_id,) in (await db.execute(text(f"SELECT id FROM {source} WHERE pdf_id = :pdf_id"), {"pdf_id": pdf_id})).all()}
+        if not members:
+            return []
+        scope, limit = "AND rowid BETWEEN :low AND :high", ""
+        params.update(low=min(members), high=max(members))
+    rows = (await db.execute(
+        text(f"SELECT rank, rowid FROM {table} WHERE {table} MATCH :match AND rank MATCH :rank {scope} ORDER BY rank {limit}"),
+        params
+    )).all()
+    return [(score, rowid) for score, rowid in rows if members is None or rowid in members][:depth]
+
+
+async def _page_hits(db, match: str, ids: list) -> dict:
+    if not ids:
+        return {}
+    rows = (await db.execute(
+        text(
+            "SELECT p.id, p.pdf_id, pdfs.filename, p.page_number, p.title, "
+            f"snippet(page_search, -1, :open, :close, '…', {SNIPPET_TOKENS}) "
+            "FROM page_search JOIN page_summaries p ON p.id = page_search.rowid JOIN pdfs ON pdfs.id = p.pdf_id "
+            f"WHERE page_search MATCH :match AND page_search.rowid IN ({', '.join(str(int(i)) for i in ids)})"
+        ),
+        {"match": match, "open": HIGHLIGHT_OPEN, "close": HIGHLIGHT_CLOSE}
+    )).all()
+    return {
+        row[0]: {"type": "page", "id": row[0], "pdf_id": row[1], "filename": row[2], "page_number": row[3], "title": row[4], "snippet": row[5]}
+        for row in rows
+    }
+
+
+async def _section_hits(db, match: str, ids: list) -> dict:
+    if not ids:
+        return {}
+    rows = (await db.execute(
+        text(
+            "SELECT s.id, s.pdf_id, pdfs.filename, s.page_number, s.section_title, "
+            f"snippet(section_search, -1, :open, :close, '…', {SNIPPET_TOKENS}) "
+            "FROM section_search JOIN section_summaries s ON s.id = section_search.rowid JOIN pdfs ON pdfs.id = s.pdf_id "
+            f"WHERE section_search MATCH :match AND section_search.rowid IN ({', '.join(str(int(i)) for i in ids)})"
+        ),
+        {"match": match, "open": HIGHLIGHT_OPEN, "close": HIGHLIGHT_CLOSE}
+    )).all()
+    return {
+        row[0]: {"type": "section", "id": row[0], "pdf_id": row[1], "filename": row[2], "page_number": row[3], "title": row[4], "snippet": row[5]}
+        for row in rows
+    }
+
+
+async def search(db, query: str, limit: int, cursor: Optional[str] = None, kind: Optional[str] = None, pdf_id: Optional[int] = None) -> dict:
+    """
+    One page of ranked full-text results over pages and section summaries.
+
+    Each index returns only its best `offset + limit + 1` rowids (scores only),
+    the two lists are merged by score, and snippets are built for the returned
+    page of hits alone, so cost does not grow with the number of matches shown.
+    """
+    match = to_match_query(query)
+    if not match:
+        raise HTTPException(status_code=400, detail="Empty search query")
+    if kind and kind not in SEARCH_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown type: {kind}")
+    offset = _decode_offset(cursor) if cursor else 0
+    depth = offset + limit + 1
+
+    ranked = []
+    if kind in (None, "page"):
+        ranked += [(score, "page", rowid) for score, rowid in await _ranked_ids(db, "page_search", PAGE_WEIGHTS, match, depth, pdf_id)]
+    if kind in (None, "section"):
+        ranked += [(score, "section", rowid) for score, rowid in await _ranked_ids(db, "section_search", SECTION_WEIGHTS, match, depth, pdf_id)]
+    ranked.sort()
+    window = ranked[offset:offset + limit]
+
+    pages = await _page_hits(db, match, [rowid for _, hit_kind, rowid in window if hit_kind == "page"])
+    sections = await _section_hits(db, match, [rowid for _, hit_kind, rowid in window if hit_kind == "section"])
+    results = []
+    for score, hit_kind, rowid in window:
+        hit = (pages if hit_kind == "page" else sections).get(rowid)
+        if hit:
+            results.append({**hit, "score": round(-score, 6)})
+
+    next_cursor = _encode_offset(offset + limit) if len(ranked) > offset + limit else None
+    return {"query": query, "results": results, "next_cursor": next_cursor}
@@ -0,0 +1,168 @@
+import re
+from typing import List, Dict
+
+# Heading patterns, compiled once (order matters: the first match wins)
+HEADING_PATTERNS = [
+    # Numbered subsections: "3.1. Research", "3.1.1 Dataset"
+    re.compile(r'^(\d+(?:\.\d+)+\.?\s+[A-Z][^\n]{3,100})$'),
+    # Top level numbered sections: "1. Introduction"
+    re.compile(r'^(\d+\.\s+[A-Z][^\n]{3,100})$'),
+    # All caps headings: "INTRODUCTION", "METHODOLOGY"
+    re.compile(r'^([A-Z][A-Z\s]{3,50})$'),
+    # Title case without sentence punctuation: "Related Work", "Data Analysis"
+    re.compile(r'^([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,7})$'),
+]
+_NUMBERING = re.compile(r'^(\d+(?:\.\d+)*)\.?\s')
+
+
+def match_heading(line: str) -> str:
+    """Return the heading text if `line` (already stripped) looks like a heading, else ""."""
+    if len(line) < 3:
+        return ""
+    for pattern in HEADING_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            title = match.group(1).strip()
+            if 3 <= len(title) <= 100 and not title.endswith('.'):
+                return title
+    return ""
+
+
+def heading_level(title: str) -> int:
+    """Depth of a heading in the outline: "3" -> 1, "3.1" -> 2; unnumbered headings are top level"""
+    match = _NUMBERING.match(title)
+    if not match:
+        return 1
+    return match.group(1).count(".") + 1
+
+
+def detect_headings(page_content: str) -> List[str]:
+    """All distinct headings on a page, in reading order"""
+    found = []
+    seen = set()
+    for line in page_content.split('\n'):
+        title = match_heading(line.strip())
+        if title and title not in seen:
+            seen.add(title)
+            found.append(title)
+    return found
+
+
+def segment_document(page_texts: List[tuple], include_content: bool = False) -> List[Dict]:
+    """
+    Segment a whole document into a section tree in a single pass over its lines.
+
+    `page_texts` is a list of (page_number, text). Each section is a dict with
+    title, level, start_page, end_page and children; a section's span covers
+    its subsections, so sections running over several pages are linked.
+    With `include_content`, each section also carries its own body text.
+    Text before the first heading is collected under a "Front Matter" section.
+    """
+    roots = []
+    flat = []
+    stack = []  # open sections, from outermost to innermost
+    current = None
+
+    def open_section(title: str, level: int, page_num: int) -> Dict:
+        section = {"title": title, "level": level, "start_page": page_num, "end_page": page_num, "children": []}
+        if include_content:
+            section["lines"] = []
+        while stack and stack[-1]["level"] >= level:
+            stack.pop()
+        (stack[-1]["children"] if stack else roots).append(section)
+        stack.append(section)
+        flat.append(section)
+        for ancestor in stack:
+            ancestor["end_page"] = page_num
+        return section
+
+    for page_num, text in page_texts:
+        for raw_line in (text or "").split('\n'):
+            line = raw_line.strip()
+            title = match_heading(line)
+            if title:
+                current = open_section(title, heading_level(title), page_num)
+                continue
+            if not line:
+                continue
+            if current is None:
+                current = open_section("Front Matter", 1, page_num)
+            # Extend the span of the section and every ancestor still open
+            if current["end_page"] != page_num:
+                for section in stack:
+                    section["end_page"] = page_num
+            if include_content:
+                current["lines"].append(raw_line)
+
+    if include_content:
+        for section in flat:
+            section["content"] = "\n".join(section.pop("lines"))
+
+    return roots
+
+
+def flatten_sections(tree: List[Dict]) -> List[Dict]:
+    """Depth-first list of the sections of a tree, in document order"""
+    flat = []
+    pending = list(reversed(tree))
+    while pending:
+        section = pending.pop()
+        flat.append(section)
+        pending.extend(reversed(section["children"]))
+    return flat
+
+
+
+def detect_layout_headings(fragments: List[tuple]) -> List[str]:
+    """
+    Classify headings from text layout instead of text patterns.
+
+    `fragments` are (text, font_size, bold, y) tuples in content-stream order, as
+    collected by the PyPDF2 text visitor. Fragments are grouped into lines; a line
+    is a heading when it is short, not a sentence, and either set noticeably larger
+    than the body font or bold (while the body is not) with extra space above it.
+    """
+    lines = []
+    for text, size, bold, y in fragments:
+        for i, part in enumerate(text.split('\n')):
+            if i > 0 or not lines or abs(lines[-1]["y"] - y) > max(size, 1.0) * 0.5:
+                lines.append({"parts": [], "size": 0.0, "chars": 0, "bold_chars": 0, "y": y})
+            if not part.strip():
+                continue
+            line = lines[-1]
+            line["parts"].append(part)
+            line["size"] = max(line["size"], size)
+            line["chars"] += len(part)
+            line["bold_chars"] += len(part) if bold else 0
+
+    lines = [line for line in lines if line["chars"]]
+    if not lines:
+        return []
+
+    # Body font: the size (and weight) carrying most of the characters
+    size_chars = {}
+    for line in lines:
+        key = round(line["size"], 1)
+        size_chars[key] = size_chars.get(key, 0) + line["chars"]
+    body_size = max(size_chars, key=size_chars.get)
+    body_bold = sum(line["bold_chars"] for line in lines) > 0.5 * sum(line["chars"] for line in lines)
+
+    gaps = sorted(abs(prev["y"] - line["y"]) for prev, line in zip(lines, lines[1:]) if prev["y"] != line["y"])
+    median_gap = gaps[len(gaps) // 2] if gaps else 0.0
+
+    headings = []
+    seen = set()
+    for index, line in enumerate(lines):
+        title = " ".join("".join(line["parts"]).split())
+        if not (3 <= len(title) <= 100) or title.endswith('.') or len(title.split()) > 15:
+            continue
+        if not any(ch.isalpha() for ch in title):
+            continue
+        larger = body_size > 0 and line["size"] >= body_size * 1.15
+        bold = not body_bold and line["bold_chars"] >= 0.8 * line["chars"]
+        gap_above = abs(lines[index - 1]["y"] - line["y"]) if index else float("inf")
+        isolated = median_gap > 0 and gap_above >= median_gap * 1.3
+        if (larger or (bold and isolated)) and title not in seen:
+            seen.add(title)
+            headings.append(title)
+    return headings
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import asyncio
+
+# Summary deltas are sent in frames of at most this many seconds / characters of text
+SSE_COALESCE_INTERVAL = float(os.getenv("SSE_COALESCE_INTERVAL", 0.05))
+SSE_COALESCE_CHARS = int(os.getenv("SSE_COALESCE_CHARS", 512))
+# A comment frame is sent after this many idle seconds so proxies keep the stream open
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", 15))
+# Upper bound of events written at once to a subscriber that fell behind
+SSE_MAX_BATCH = int(os.getenv("SSE_MAX_BATCH", 256))
+
+HEARTBEAT = ": keepalive\n\n"
+
+
+def summary_delta_event(page_id: int, page_num: int, text: str) -> str:
+    """Streaming page summary delta; static page fields (title, content) are only sent in the page event"""
+    return f"data: {json.dumps({'page_id': page_id, 'page_num': page_num, 'summary': text, 'streaming': True})}\n\n"
+
+
+class DeltaCoalescer:
+    """
+    Buffers LLM token deltas and releases them as one frame once the oldest
+    buffered delta is `interval` seconds old or `max_chars` are buffered.
+    `with_flush_deadlines` makes the time bound hold while the model is silent.
+    """
+
+    def __init__(self, interval: float = SSE_COALESCE_INTERVAL, max_chars: int = SSE_COALESCE_CHARS):
+        self.interval = interval
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+        self._since = 0.0
+
+    def add(self, text: str):
+        """Buffer `text`; returns the coalesced text when a frame is due, else None"""
+        if not self._parts:
+            self._since = time.monotonic()
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or time.monotonic() - self._since >= self.interval:
+            return self.flush()
+        return None
+
+    def remaining(self):
+        """Seconds until the buffered frame is due, or None when nothing is buffered"""
+        if not self._parts:
+            return None
+        return max(0.0, self._since + self.interval - time.monotonic())
+
+    def flush(self) -> str:
+        text = "".join(self._parts)
+        self._parts = []
+        self._size = 0
+        return text
+
+
+def summary_page(frame: str):
+    """(page_num, final) of a page summary frame, final being False for a streaming delta; None for other frames"""
+    if '"streaming": true' in frame:
+        return json.loads(frame[len("data: "):])["page_num"], False
+    if '"complete": true' in frame and '"page_num"' in frame:
+        return json.loads(frame[len("data: "):])["page_num"], True
+    return None
+
+
+def _delta_of(frame: str):
+    """(page_num, data) of a streaming summary delta frame, else None"""
+    if '"streaming": true' not in frame:
+        return None
+    data = json.loads(frame[len("data: "):])
+    return data["page_num"], data
+
+
+def merge_deltas(events: list) -> list:
+    """
+    Merge runs of consecutive summary deltas of the same page into single events,
+    returning (last_index, event) pairs. Used for subscribers with a backlog, so a
+    slow client receives fewer, larger frames instead of every token.
+    """
+    merged = []
+    run = None  # (page_num, data, texts)
+    for index, event in enumerate(events):
+        delta = _delta_of(event)
+        if delta and run and run[0] == delta[0]:
+            run[2].append(delta[1]["summary"])
+            merged[-1] = (index, None)
+            continue
+        if run:
+            _close_run(merged, run)
+            run = None
+        if delta:
+            run = (delta[0], delta[1], [delta[1]["summary"]])
+            merged.append((index, None))
+        else:
+            merged.append((index, event))
+    if run:
+        _close_run(merged, run)
+    return merged
+
+
+def _close_run(merged: list, run: tuple):
+    _, data, texts = run
+    data["summary"] = "".join(texts)
+    merged[-1] = (merged[-1][0], f"data: {json.dumps(data)}\n\n")
+
+
+async def with_flush_deadlines(chunks, coalescer: DeltaCoalescer):
+    """
+    Forward the chunks of an LLM stream, yielding None whenever the frame buffered
+    by `coalescer` falls due before the next chunk arrives; the caller then flushes it.
+    """
+    iterator = chunks.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=coalescer.remaining())
+            if not done:
+                yield None
+                continue
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+
+
+async def with_heartbeats(frames, interval: float = SSE_HEARTBEAT_SECONDS):
+    """Forward an async iterable of SSE frames, inserting a heartbeat whenever it is idle for `interval` seconds"""
+    iterator = frames.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield HEARTBEAT
+                continue
+            try:
+                frame = pending.result()
+            except StopAsyncIteration:
+                return
+            finally:
+                pending = None
+            yield frame
+    finally:
+        if pending is not None:
+            pending.cancel()
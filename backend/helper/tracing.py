@@ -0,0 +1,204 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from logging.handlers import QueueHandler, QueueListener
+
+# Span recording is off by default; trace ids are always attached to log records
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes")
+# Fraction of uploads whose spans are recorded when tracing is enabled
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 1.0))
+# Number of recent traces kept for /debug/trace, and the span cap per trace
+TRACE_RETENTION = int(os.getenv("TRACE_RETENTION", 50))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 5000))
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# "text" or "json" (one object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+
+_current = contextvars.ContextVar("trace", default=None)
+_recent = OrderedDict()  # pdf_id -> most recent sampled Trace
+
+
+# --- Logging -------------------------------------------------------------------
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", None),
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _BackgroundQueueHandler(QueueHandler):
+    """
+    Hands records to a listener thread that formats and writes them, so logging on
+    the event loop never blocks on stdout. Messages are formatted by the listener;
+    only the trace id is captured in the calling context.
+    """
+
+    def __init__(self):
+        super().__init__(queue.SimpleQueue())
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        trace = _current.get()
+        record.trace_id = trace.trace_id if trace else None
+        return record
+
+    def enqueue(self, record):
+        if self._listener is None:
+            self._start()
+        self.queue.put_nowait(record)
+
+    def _start(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            stream = logging.StreamHandler(sys.stdout)
+            if LOG_FORMAT == "json":
+                stream.setFormatter(_JsonFormatter())
+            else:
+                stream.setFormatter(logging.Formatter("%(levelname)s: [%(trace_id)s] %(message)s"))
+            self._listener = QueueListener(self.queue, stream)
+            self._listener.start()
+            atexit.register(self._listener.stop)
+
+
+_root = logging.getLogger("summarizer")
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the shared non-blocking "summarizer" handler"""
+    if not _root.handlers:
+        _root.addHandler(_BackgroundQueueHandler())
+        _root.setLevel(LOG_LEVEL)
+        _root.propagate = False
+    return _root.getChild(name)
+
+
+# --- Tracing -------------------------------------------------------------------
+
+class Trace:
+    """Timing spans of one upload; `sampled` traces record spans, others only carry an id"""
+
+    def __init__(self, pdf_id: int, sampled: bool):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.pdf_id = pdf_id
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.origin = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, name: str, start: float, end: float, attrs: dict):
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped += 1
+            return
+        self.spans.append((name, start - self.origin, end - start, attrs))
+
+    def to_dict(self) -> dict:
+        spans = sorted(self.spans, key=lambda span: span[1])
+        return {
+            "trace_id": self.trace_id,
+            "pdf_id": self.pdf_id,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "dropped_spans": self.dropped,
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "duration_ms": round(duration * 1000, 3), **attrs}
+                for name, start, duration, attrs in spans
+            ]
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "attrs", "start")
+
+    def __init__(self, trace: Trace, name: str, attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.attrs["error"] = exc_type.__name__
+        self.trace.add(self.name, self.start, time.perf_counter(), self.attrs)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def start_trace(pdf_id: int):
+    """Open the trace of an upload in the current context; returns a token for `end_trace`"""
+    sampled = TRACING_ENABLED and random.random() < TRACE_SAMPLE_RATE
+    trace = Trace(pdf_id, sampled)
+    if sampled:
+        _recent[pdf_id] = trace
+        _recent.move_to_end(pdf_id)
+        while len(_recent) > TRACE_RETENTION:
+            _recent.popitem(last=False)
+    return _current.set(trace)
+
+
+def end_trace(token):
+    trace = _current.get()
+    if trace is not None:
+        trace.duration = time.perf_counter() - trace.origin
+    try:
+        _current.reset(token)
+    except ValueError:
+        pass  # Closed from another context (e.g. an abandoned stream being finalized)
+
+
+def span(name: str, **attrs):
+    """Context manager timing a pipeline stage of the current trace (a shared no-op when not sampled)"""
+    trace = _current.get()
+    if trace is None or not trace.sampled:
+        return _NO_SPAN
+    return _Span(trace, name, attrs)
+
+
+def record_span(name: str, duration: float, **attrs):
+    """Record a stage that just ended after `duration` seconds"""
+    trace = _current.get()
+    if trace is not None and trace.sampled:
+        end = time.perf_counter()
+        trace.add(name, end - duration, end, attrs)
+
+
+def get_trace(pdf_id: int):
+    """The timing waterfall of the most recent sampled upload of a PDF, if still retained"""
+    trace = _recent.get(pdf_id)
+    return trace.to_dict() if trace else None
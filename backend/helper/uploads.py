@@ -0,0 +1,95 @@
+import os
+import uuid
+import hashlib
+import zipfile
+import aiofiles
+from fastapi import HTTPException, UploadFile
+
+# Stored PDFs (content-addressed) and in-progress uploads; shared by all worker processes
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "uploads"))
+
+# Uploads are copied to disk in chunks of this size, so memory per upload stays constant
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+# Limits of /upload-batch: number of PDFs, and size of an uploaded zip archive
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 500))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", 2 * 1024 * 1024 * 1024))
+
+
+async def spool_upload(file: UploadFile, upload_dir: str, max_bytes: int = MAX_UPLOAD_BYTES) -> tuple[str, str]:
+    """Stream an upload to a temporary file while hashing it; returns (temp_path, sha256 hex digest)"""
+    temp_path = os.path.join(upload_dir, f".{uuid.uuid4()}.part")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"PDF exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        discard(temp_path)
+        raise
+    return temp_path, digest.hexdigest()
+
+
+def store_content_addressed(temp_path: str, upload_dir: str, content_hash: str) -> str:
+    """Move a spooled upload to its content-addressed path, keeping any existing copy"""
+    file_path = os.path.join(upload_dir, f"{content_hash}.pdf")
+    if os.path.exists(file_path):
+        discard(temp_path)
+    else:
+        os.replace(temp_path, file_path)
+    return file_path
+
+
+def discard(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def spool_zip_pdfs(zip_path: str, upload_dir: str, max_bytes: int = MAX_UPLOAD_BYTES, max_files: int = BATCH_MAX_FILES) -> tuple[list, list]:
+    """
+    Copy every PDF of a zip archive to its own temporary file while hashing it (blocking; run in a thread).
+
+    Returns ([(filename, temp_path, sha256 hex digest)], [{"filename", "error"}]). Members are
+    read in chunks and cut off at `max_bytes`, so a compressed bomb never reaches the disk.
+    """
+    spooled, rejected = [], []
+    with zipfile.ZipFile(zip_path) as archive:
+        for info in archive.infolist():
+            name = info.filename
+            base = os.path.basename(name)
+            if info.is_dir() or not base or base.startswith(".") or name.startswith("__MACOSX/"):
+                continue
+            if not base.lower().endswith(".pdf"):
+                rejected.append({"filename": name, "error": "Not a PDF"})
+                continue
+            if len(spooled) >= max_files:
+                rejected.append({"filename": name, "error": f"More than {max_files} PDFs in the batch"})
+                continue
+            temp_path = os.path.join(upload_dir, f".{uuid.uuid4()}.part")
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with archive.open(info) as member, open(temp_path, "wb") as out:
+                    while True:
+                        chunk = member.read(UPLOAD_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise ValueError(f"PDF exceeds the maximum upload size of {max_bytes // (1024 * 1024)} MB")
+                        digest.update(chunk)
+                        out.write(chunk)
+            except (ValueError, RuntimeError, NotImplementedError, zipfile.BadZipFile, OSError) as e:  # Too large, encrypted, unsupported, corrupt
+                discard(temp_path)
+                rejected.append({"filename": name, "error": str(e)})
+                continue
+            spooled.append((base, temp_path, digest.hexdigest()))
+    return spooled, rejected
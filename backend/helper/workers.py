@@ -0,0 +1,85 @@
+"""
+Coordination of the worker processes serving the app on one host.
+
+Workers share the uploads directory, the database and WORKER_LOCK_DIR. Each worker
+holds an exclusive lock on its own file there for as long as it lives (the operating
+system drops it however the process exits), so a worker can tell the jobs of a live
+sibling from those left behind by a dead one. Startup work that must not run in two
+workers at once (migrations, resuming jobs) holds `startup.lock`.
+"""
+import os
+import uuid
+from contextlib import contextmanager
+from helper.uploads import UPLOAD_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker, nothing to coordinate
+    fcntl = None
+
+WORKER_LOCK_DIR = os.getenv("WORKER_LOCK_DIR", os.path.join(UPLOAD_DIR, ".workers"))
+
+# Recorded on the jobs this process runs
+WORKER_ID = uuid.uuid4().hex
+
+_lock_file = None
+
+
+def _path(worker_id: str) -> str:
+    return os.path.join(WORKER_LOCK_DIR, f"{worker_id}.lock")
+
+
+def register():
+    """Hold this worker's lock file, and remove those of workers that have exited"""
+    global _lock_file
+    if fcntl is None or _lock_file is not None:
+        return
+    os.makedirs(WORKER_LOCK_DIR, exist_ok=True)
+    for name in os.listdir(WORKER_LOCK_DIR):
+        if name.endswith(".lock") and name != "startup.lock" and not is_alive(name[:-len(".lock")]):
+            try:
+                os.remove(os.path.join(WORKER_LOCK_DIR, name))
+            except FileNotFoundError:
+                pass
+    _lock_file = open(_path(WORKER_ID), "w")
+    fcntl.flock(_lock_file, fcntl.LOCK_EX)
+    _lock_file.write(f"{os.getpid()}\n")  # For operators
+    _lock_file.flush()
+
+
+def unregister():
+    global _lock_file
+    if _lock_file is not None:
+        os.remove(_path(WORKER_ID))
+        _lock_file.close()
+        _lock_file = None
+
+
+def is_alive(worker_id: str) -> bool:
+    """Whether the worker process that recorded `worker_id` is still running"""
+    if worker_id == WORKER_ID:
+        return True
+    if fcntl is None or not worker_id:
+        return False
+    try:
+        lock_file = open(_path(worker_id))
+    except FileNotFoundError:
+        return False
+    with lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+    return False
+
+
+@contextmanager
+def startup_lock():
+    """Run the enclosed startup work in one worker at a time"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(WORKER_LOCK_DIR, exist_ok=True)
+    with open(os.path.join(WORKER_LOCK_DIR, "startup.lock"), "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
@@ -1,39 +1,92 @@
-from fastapi import FastAPI
+from fastapi import APIRouter, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from contextlib import asynccontextmanager
 import os
 from dotenv import load_dotenv
-from api.v1.router import api_router
-
-# Load environment variables
-load_dotenv()
-
-# Create FastAPI app
-app = FastAPI(
-    title="Research Paper Summarizer API",
-    description="AI-powered research paper section summarization using Grok API",
-    version="1.0.0",
-    docs_url="/docs",
-    redoc_url="/redoc"
-)
-
-# CORS configuration - Allow all origins for development
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Allow all origins during development
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Include API v1 router with prefix
-app.include_router(api_router, prefix="/api/v1")
-
-
-@app.get("/", tags=["Health"])
+
+# Root endpoints; the API routes are included by create_app()
+router = APIRouter()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Per-worker resources: the schema is migrated and interrupted jobs are resumed at
+    startup (one worker at a time); jobs, the extraction pool, pending DB writes, the
+    LLM client and the DB pool are shut down in that order (jobs resume at next startup).
+    """
+    from database import async_engine, init_db
+    from helper import persistence, workers
+    from helper.extraction import shutdown_executor
+    from helper.jobs import manager as job_manager
+    from helper.llm import close_client
+    from helper.uploads import UPLOAD_DIR
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    workers.register()
+    with workers.startup_lock():
+        init_db()
+        await job_manager.resume_unfinished()
+    try:
+        yield
+    finally:
+        await job_manager.shutdown()
+        shutdown_executor()
+        persistence.writer.close()
+        await close_client()
+        await async_engine.dispose()
+        workers.unregister()
+
+
+def create_app() -> FastAPI:
+    """
+    Build the application.
+
+    Settings are read from the environment, and from .env for anything not set there,
+    before the modules that read them are imported; nothing touches the database, the
+    disk or the LLM until the lifespan starts.
+    """
+    load_dotenv()
+    from api.v1.router import api_router
+
+    app = FastAPI(
+        title="Research Paper Summarizer API",
+        description="AI-powered research paper section summarization using Grok API",
+        version="1.0.0",
+        docs_url="/docs",
+        redoc_url="/redoc",
+        lifespan=lifespan
+    )
+
+    # CORS configuration - Allow all origins for development
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],  # Allow all origins during development
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+
+    # Include API v1 router with prefix
+    app.include_router(api_router, prefix="/api/v1")
+    app.include_router(router)
+    return app
+
+
+def __getattr__(name: str):
+    """`main:app` (uvicorn without --factory, scripts) builds the app on first access"""
+    if name == "app":
+        app = globals()["app"] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@router.get("/", tags=["Health"])
 async def root():
     """
     Health check endpoint.
-    
+
     Returns API status and available endpoints.
     """
     return {
@@ -48,19 +101,36 @@ async def root():
     }
 
 
-@app.get("/health", tags=["Health"])
+@router.get("/health", tags=["Health"])
 async def health_check():
     """
     Detailed health check endpoint.
     """
+    from helper.llm_cache import cache_stats
+    from helper.llm import rate_limit_info
+    from helper.workers import WORKER_ID
     return {
         "status": "healthy",
         "api_version": "1.0.0",
-        "grok_configured": bool(os.getenv("GROK_API_KEY"))
+        "grok_configured": bool(os.getenv("GROK_API_KEY")),
+        "worker": {"id": WORKER_ID, "pid": os.getpid()},
+        "llm_cache": cache_stats(),
+        "llm_rate_limit": rate_limit_info()
     }
 
 
+@router.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms, LLM token counters and in-flight uploads.
+    """
+    from helper.metrics import render_metrics
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
+    load_dotenv()
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Several workers share the uploads directory and the database (see README, "Multiple workers")
+    uvicorn.run("main:create_app", factory=True, host="0.0.0.0", port=port, workers=int(os.getenv("WEB_CONCURRENCY", 1)))
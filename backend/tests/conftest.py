@@ -0,0 +1,44 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+
+# Settings are read at import: keep the database, uploads and LLM cache of the tests out of the tree
+_workdir = tempfile.mkdtemp(prefix="summarizer-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_workdir, 'test.db')}")
+os.environ.setdefault("UPLOAD_DIR", os.path.join(_workdir, "uploads"))
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(_workdir, "llm_cache.db"))
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("GROK_API_KEY", "fake")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from fake_llm_server import serve
+
+
+@pytest.fixture
+def fake_llm():
+    """Start a fake OpenAI-compatible server on a free port; yields a factory of (base_url, limits)"""
+    servers = []
+
+    def start(rpm: float = 0, error_rate: float = 0.0, latency: float = 0.0):
+        server, limits = serve(0, rpm=rpm, error_rate=error_rate, latency=latency)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}/v1", limits
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def database():
+    """The database module with its schema created; tests dispose `async_engine` before their event loop closes"""
+    import database
+    database.init_db()
+    return database
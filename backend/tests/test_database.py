@@ -0,0 +1,36 @@
+import sqlite3
+
+from sqlalchemy import create_engine
+
+
+def test_legacy_database_is_copied_to_a_new_location(database, tmp_path, monkeypatch):
+    legacy = tmp_path / "research_papers.db"
+    with sqlite3.connect(legacy) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE pdfs (id INTEGER PRIMARY KEY, filename TEXT)")
+        conn.execute("INSERT INTO pdfs (filename) VALUES ('paper.pdf')")
+    conn.close()
+    target = tmp_path / "data" / "research_papers.db"
+    target.parent.mkdir()
+    monkeypatch.setattr(database, "engine", create_engine(f"sqlite:///{target}"))
+    monkeypatch.setattr(database, "LEGACY_DATABASE_PATH", str(legacy))
+
+    database._adopt_legacy_database()
+    with sqlite3.connect(target) as conn:
+        assert conn.execute("SELECT filename FROM pdfs").fetchall() == [("paper.pdf",)]
+        conn.execute("UPDATE pdfs SET filename = 'renamed.pdf'")
+    conn.close()
+
+    # An existing database is never overwritten
+    database._adopt_legacy_database()
+    with sqlite3.connect(target) as conn:
+        assert conn.execute("SELECT filename FROM pdfs").fetchall() == [("renamed.pdf",)]
+    conn.close()
+
+
+def test_postgresql_urls_use_the_installed_drivers(database):
+    for url in ("postgresql://user:pw@localhost/papers", "postgres://user:pw@localhost/papers"):
+        assert database._sync_url(url) == "postgresql+psycopg://user:pw@localhost/papers"
+        assert database._async_url(database._sync_url(url)) == "postgresql+asyncpg://user:pw@localhost/papers"
+    assert database._sync_url("postgresql+psycopg://user:pw@localhost/papers") == "postgresql+psycopg://user:pw@localhost/papers"
+    assert database._sync_url("sqlite:////data/papers.db") == "sqlite:////data/papers.db"
@@ -0,0 +1,52 @@
+import asyncio
+
+from helper import document_summary
+from helper.document_summary import _tokens, pack, reduce_parts
+
+
+def pages(count, chars):
+    return [(page, page, f"Page {page}\n" + "x" * chars) for page in range(1, count + 1)]
+
+
+def test_pack_keeps_order_and_fits_the_budget():
+    parts = pages(9, 300) + [(10, 10, "Page 10\n" + "y" * 5000)]
+    groups = pack(parts, budget=200)
+    assert [part[0] for group in groups for part in group] == list(range(1, 11))
+    for group in groups:
+        assert sum(_tokens(text) for _, _, text in group) <= 200
+    for group in groups[:-1]:
+        assert len(group) >= 2
+    # An oversized part is cut to half the budget
+    assert len(groups[-1][-1][2]) == 400
+
+
+def test_small_paper_is_one_group():
+    assert pack(pages(3, 100), budget=1000) == [pages(3, 100)]
+
+
+def run_reduce(monkeypatch, parts, budget, summary_chars):
+    calls = []
+
+    async def fake_reduce(group, final):
+        calls.append((final, group[0][0], group[-1][1], len(group)))
+        return "s" * summary_chars
+
+    monkeypatch.setattr(document_summary, "_reduce", fake_reduce)
+    return asyncio.run(reduce_parts(parts, budget)), calls
+
+
+def test_reduction_ends_with_one_final_call(monkeypatch):
+    summary, calls = run_reduce(monkeypatch, pages(40, 300), budget=300, summary_chars=200)
+    assert summary == "s" * 200
+    assert [final for final, *_ in calls].count(True) == 1
+    assert calls[-1][0] is True
+    # The final call covers the whole paper
+    assert calls[-1][1:3] == (1, 40)
+
+
+def test_reduction_terminates_when_summaries_do_not_shrink(monkeypatch):
+    # Every partial summary is longer than a whole prompt: parts are cut, so each level still halves their number
+    summary, calls = run_reduce(monkeypatch, pages(64, 2000), budget=300, summary_chars=5000)
+    partial = [call for call in calls if not call[0]]
+    assert len(partial) < 64 * 2
+    assert calls[-1][0] is True and calls[-1][1:3] == (1, 64)
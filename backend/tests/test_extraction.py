@@ -0,0 +1,50 @@
+import pytest
+
+from bench_batch_ingest import make_pdf
+from helper import extraction
+
+
+@pytest.fixture(autouse=True)
+def no_cached_reader():
+    yield
+    extraction._release_worker_reader()
+
+
+def write_pdf(path, pages):
+    path.write_bytes(make_pdf(pages))
+    return str(path)
+
+
+def test_evicted_reader_is_unmapped(tmp_path):
+    first = write_pdf(tmp_path / "first.pdf", ["First paper", "Second page"])
+    second = write_pdf(tmp_path / "second.pdf", ["Other paper"])
+
+    assert "First paper" in extraction._extract_page(first, 0, 5)["text"]
+    reader = extraction._worker_reader["reader"]
+    assert "Second page" in extraction._extract_page(first, 1, 5)["text"]
+    assert extraction._worker_reader["reader"] is reader
+
+    assert "Other paper" in extraction._extract_page(second, 0, 5)["text"]
+    assert reader.stream.closed
+
+
+def test_reader_of_a_deleted_file_is_unmapped(tmp_path):
+    path = tmp_path / "paper.pdf"
+    extraction._extract_page(write_pdf(path, ["Deleted paper"]), 0, 5)
+    reader = extraction._worker_reader["reader"]
+
+    path.unlink()
+    with pytest.raises(FileNotFoundError):
+        extraction._extract_page(str(path), 0, 5)
+    assert reader.stream.closed
+    assert extraction._worker_reader["reader"] is None
+
+
+def test_replaced_file_is_read_again(tmp_path):
+    path = tmp_path / "paper.pdf"
+    extraction._extract_page(write_pdf(path, ["Old version"]), 0, 5)
+    write_pdf(tmp_path / "new.pdf", ["New version, longer text"])
+    (tmp_path / "new.pdf").replace(path)
+
+    assert "New version" in extraction._extract_page(str(path), 0, 5)["text"]
+    assert extraction.count_pages(str(path)) == 1
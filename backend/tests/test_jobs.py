@@ -0,0 +1,117 @@
+import json
+import uuid
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+from helper import jobs
+from helper.sse import summary_delta_event
+
+
+def make_job(total_pages=2):
+    pdf = SimpleNamespace(id=1, filename="paper.pdf", file_path="paper.pdf", upload_date=datetime(2026, 1, 1), sections_count=0, total_pages=total_pages)
+    job = jobs.UploadJob(str(uuid.uuid4()), pdf)
+    job._set_status = lambda status, error="": setattr(job, "status", status)
+    return job
+
+
+def final_event(page_num, summary):
+    return f"data: {json.dumps({'page_id': page_num, 'page_num': page_num, 'summary': summary, 'streaming': False, 'complete': True})}\n\n"
+
+
+def parse(frames):
+    """Events of SSE frames as (id, data) pairs"""
+    events = []
+    for frame in frames.split("\n\n"):
+        if frame.startswith("id: "):
+            event_id, data = frame.split("\n", 1)
+            events.append((event_id[len("id: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+async def collect(job, last_event_id=None):
+    return parse("".join([frames async for frames in job.subscribe(last_event_id)]))
+
+
+def test_cancelled_job_releases_its_subscribers(monkeypatch):
+    async def stalled_pipeline(*args, **kwargs):
+        yield summary_delta_event(1, 1, "Partial")
+        await asyncio.Event().wait()
+        yield ""
+
+    monkeypatch.setattr(jobs, "run_page_pipeline", stalled_pipeline)
+
+    async def scenario():
+        job = make_job()
+        runner = asyncio.create_task(job.run())
+        subscriber = asyncio.create_task(collect(job))
+        await asyncio.sleep(0.05)
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        return job, await asyncio.wait_for(subscriber, 2)
+
+    job, events = asyncio.run(scenario())
+    assert [data.get("type") for _, data in events][-2:] == ["interrupted", "complete"]
+    assert job.finished
+    # Left "running" so the next startup resumes it
+    assert job.status == "running"
+
+
+def test_deltas_are_dropped_once_the_page_summary_is_final():
+    async def scenario():
+        job = make_job()
+        for text in ("The ", "page ", "summary."):
+            await job.emit(summary_delta_event(1, 1, text))
+        await job.emit(summary_delta_event(2, 2, "Other "))
+        mid_page = f"{job.epoch}-1"
+        await job.emit(final_event(1, "The page summary."))
+        await job.finish()
+        return job, await collect(job), await collect(job, mid_page)
+
+    job, replayed, resumed = asyncio.run(scenario())
+    assert job.events[1:4] == [None, None, None]
+    assert [data.get("summary") for _, data in replayed[1:]] == ["Other ", "The page summary.", None]
+    # Ids keep their position in the log, so Last-Event-ID still resumes at the right place
+    assert [event_id for event_id, _ in replayed] == [f"{job.epoch}-{seq}" for seq in (0, 4, 5, 6)]
+    assert [event_id for event_id, _ in resumed] == [f"{job.epoch}-{seq}" for seq in (4, 5, 6)]
+
+
+def test_batch_follows_jobs_of_other_workers_through_the_database(database, monkeypatch):
+    monkeypatch.setattr(jobs, "BATCH_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(jobs, "BATCH_PROGRESS_INTERVAL", 0.01)
+    batch_id, job_id = str(uuid.uuid4()), str(uuid.uuid4())
+    with database.SessionLocal() as session:
+        pdf = database.PDF(filename="remote.pdf", total_pages=2)
+        session.add(pdf)
+        session.flush()
+        session.add(database.Job(id=job_id, pdf_id=pdf.id, batch_id=batch_id, status="running", worker="other-worker"))
+        session.commit()
+
+    def record(status, pages):
+        with database.SessionLocal() as session:
+            session.query(database.Job).filter(database.Job.id == job_id).update({database.Job.status: status})
+            session.add_all(database.JobPage(job_id=job_id, page_number=page) for page in pages)
+            session.commit()
+
+    async def follow():
+        events = []
+        stream = jobs.JobManager().subscribe_batch(batch_id)
+        try:
+            events.append(json.loads((await stream.__anext__())[len("data: "):]))
+            # The job is not live in this manager: its progress only shows up in the database
+            await asyncio.to_thread(record, "running", [1])
+            while events[-1].get("pages_done") != 1:
+                events.append(json.loads((await asyncio.wait_for(stream.__anext__(), 5))[len("data: "):]))
+            await asyncio.to_thread(record, "completed", [2])
+            async for event in stream:
+                events.append(json.loads(event[len("data: "):]))
+            return events
+        finally:
+            await database.async_engine.dispose()
+
+    events = asyncio.run(asyncio.wait_for(follow(), 10))
+    assert events[0]["type"] == "batch"
+    assert events[0]["documents"][0]["status"] == "running"
+    progress = [event for event in events if event["type"] == "document_progress"]
+    assert [(event["status"], event["pages_done"]) for event in progress] == [("running", 1), ("completed", 2)]
+    assert events[-1] == {"type": "complete", "batch_id": batch_id}
@@ -0,0 +1,95 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from helper import llm_cache
+from helper.llm_cache import CachedClient, LLMCache
+
+
+class CountingCompletions:
+    """Answers every call with `text` (streamed in 5-character deltas when asked), counting the calls"""
+
+    def __init__(self, text):
+        self.text = text
+        self.calls = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        if params.get("stream"):
+            return self._stream()
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.text))])
+
+    async def _stream(self):
+        for start in range(0, len(self.text), 5):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.text[start:start + 5]))])
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return LLMCache(str(tmp_path / "llm_cache.db"), max_bytes=1000, ttl_seconds=60)
+
+
+def cached_client(cache, text="A cached summary that spans several replay chunks of text."):
+    completions = CountingCompletions(text)
+    return CachedClient(SimpleNamespace(chat=SimpleNamespace(completions=completions)), cache), completions
+
+
+def test_entries_expire_after_the_ttl(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now)
+    cache.put("key", "model", "text")
+    now += 59
+    assert cache.get("key") == "text"
+    now += 2
+    assert cache.get("key") is None
+    assert cache.info()["entries"] == 0
+    assert cache.stats["evictions"] == 1
+
+
+def test_least_recently_used_entries_are_evicted_over_the_size_cap(cache, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now)
+    for key in ("a", "b", "c"):
+        cache.put(key, "model", key * 400)
+        now += 1
+    # Storing "c" went over 1000 bytes and evicted "a", the oldest
+    assert cache.get("a") is None
+    assert cache.get("b") == "b" * 400
+    now += 1
+    cache.put("d", "model", "d" * 400)
+    # "b" was read after "c" was stored, so "c" is now the least recently used
+    assert cache.get("c") is None
+    assert cache.get("b") == "b" * 400
+    assert cache.info()["bytes"] == 800
+
+
+def test_streamed_completion_is_replayed_from_the_cache(cache):
+    client, completions = cached_client(cache)
+    params = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.3}
+
+    async def stream():
+        response = await client.chat.completions.create(**params, stream=True)
+        return [chunk.choices[0].delta.content async for chunk in response]
+
+    first = asyncio.run(stream())
+    replayed = asyncio.run(stream())
+    assert "".join(replayed) == "".join(first) == completions.text
+    assert len(replayed) > 1
+    assert completions.calls == 1
+
+    # The same request without streaming shares the entry
+    response = asyncio.run(client.chat.completions.create(**params))
+    assert response.choices[0].message.content == completions.text
+    assert completions.calls == 1
+
+
+def test_forgotten_completion_is_requested_again(cache, monkeypatch):
+    client, completions = cached_client(cache)
+    monkeypatch.setattr(llm_cache, "_active_cache", cache)
+    params = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+
+    asyncio.run(client.chat.completions.create(**params))
+    llm_cache.forget_completion(params)
+    asyncio.run(client.chat.completions.create(**params))
+    assert completions.calls == 2
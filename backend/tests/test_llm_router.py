@@ -0,0 +1,81 @@
+import json
+import asyncio
+
+import pytest
+
+from fake_llm_server import REPLY
+from helper.llm_router import RoutedClient, load_endpoints
+
+MESSAGES = [{"role": "user", "content": "Summarize this page."}]
+
+
+def routed_client(*base_urls) -> RoutedClient:
+    return RoutedClient(load_endpoints(json.dumps([
+        {"name": f"endpoint-{index}", "base_url": base_url, "models": ["fake"]} for index, base_url in enumerate(base_urls)
+    ])))
+
+
+async def complete(client, count, stream=False):
+    replies = []
+    for _ in range(count):
+        response = await client.chat.completions.create(model="fake", messages=MESSAGES, max_tokens=20, stream=stream)
+        if stream:
+            replies.append("".join([chunk.choices[0].delta.content async for chunk in response if chunk.choices]))
+        else:
+            replies.append(response.choices[0].message.content)
+    return replies
+
+
+def run(client, scenario):
+    async def closing():
+        try:
+            return await scenario()
+        finally:
+            await client.close()
+
+    return asyncio.run(closing())
+
+
+def test_failing_endpoint_fails_over(fake_llm):
+    failing_url, failing = fake_llm(error_rate=1.0)
+    healthy_url, healthy = fake_llm()
+    client = routed_client(failing_url, healthy_url)
+
+    assert run(client, lambda: complete(client, 1)) == [REPLY]
+    assert failing.counts["errors"] == 1
+    assert healthy.counts["ok"] == 1
+    assert client.stats == {"retries": 1, "failed": 0}
+
+
+def test_endpoint_in_cooldown_is_skipped_until_it_recovers(fake_llm):
+    cooling_url, cooling = fake_llm()
+    cooling.fail(503, retry_after=30)
+    healthy_url, healthy = fake_llm()
+    client = routed_client(cooling_url, healthy_url)
+
+    async def scenario():
+        # The first call fails over; the next ones avoid the endpoint, although it would answer now
+        assert await complete(client, 4, stream=True) == [REPLY] * 4
+        assert cooling.counts == {"ok": 0, "throttled": 0, "errors": 1}
+        assert healthy.counts["ok"] == 4
+        routes = {route["endpoint"]: route for route in client.info()["routes"]}
+        assert routes["endpoint-0"]["cooling_down_s"] > 25
+
+        # Once the cooldown is over, the next call probes it again
+        for route in client.routes["fake"]:
+            route.available_at = 0.0
+        assert await complete(client, 1) == [REPLY]
+        assert cooling.counts["ok"] == 1
+
+    run(client, scenario)
+
+
+@pytest.mark.parametrize("config, message", [
+    ("[{'base_url': 'http://localhost'}]", "not valid JSON"),
+    ('{"base_url": "http://localhost"}', "JSON list"),
+    ('[{"name": "local", "models": ["fake"]}]', "entry 0 needs a base_url"),
+    ("[]", "lists no endpoint"),
+])
+def test_malformed_endpoints_are_rejected_clearly(config, message):
+    with pytest.raises(ValueError, match=message):
+        load_endpoints(config)
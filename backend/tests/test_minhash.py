@@ -0,0 +1,53 @@
+import random
+
+from helper.minhash import LSH_BANDS, PERMUTATIONS, band_keys, shingles, signature, similarity
+
+
+def words(seed, count=200):
+    rng = random.Random(seed)
+    return [f"w{rng.randrange(5000)}" for _ in range(count)]
+
+
+def edited(text_words, every):
+    """A copy with one word in `every` replaced"""
+    return [f"edit{index}" if index % every == 0 else word for index, word in enumerate(text_words)]
+
+
+def jaccard(first, second):
+    first, second = shingles(first), shingles(second)
+    return len(first & second) / len(first | second)
+
+
+def shared_keys(first, second):
+    return len(set(band_keys(signature(first))) & set(band_keys(signature(second))))
+
+
+def test_identical_pages_share_every_band():
+    text = " ".join(words(1))
+    assert similarity(signature(text), signature(text)) == 1.0
+    assert shared_keys(text, text) == LSH_BANDS
+
+
+def test_similarity_estimates_the_jaccard_index():
+    original = words(2)
+    for every in (40, 20, 8, 3):
+        first, second = " ".join(original), " ".join(edited(original, every))
+        expected = jaccard(first, second)
+        # Within three standard errors of the estimate from PERMUTATIONS values
+        assert abs(similarity(signature(first), signature(second)) - expected) <= 3 * (expected * (1 - expected) / PERMUTATIONS) ** 0.5 + 0.01
+
+
+def test_banding_separates_near_duplicates_from_other_pages():
+    original = words(3)
+    light_edit = " ".join(edited(original, 20))
+    assert jaccard(" ".join(original), light_edit) > 0.75
+    assert shared_keys(" ".join(original), light_edit) > 0
+    # Unrelated pages share no band key, so they are never even compared
+    for seed in range(4, 14):
+        assert shared_keys(" ".join(original), " ".join(words(seed))) == 0
+
+
+def test_near_empty_pages_have_no_signature():
+    assert signature("Title only") is None
+    assert signature(" ".join(words(5, count=21))) is None
+    assert signature(" ".join(words(5, count=22))) is not None
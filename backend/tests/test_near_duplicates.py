@@ -0,0 +1,63 @@
+import random
+import asyncio
+
+from helper import persistence
+from helper.minhash import band_keys, signature
+from helper.near_duplicates import NEAR_DUPLICATE_THRESHOLD, find_near_duplicate
+from helper.process_help import SUMMARY_FAILED
+
+
+def page_text(seed):
+    rng = random.Random(seed)
+    return " ".join(f"nd{seed}x{rng.randrange(3000)}" for _ in range(150))
+
+
+def store_page(database, text, summary, sections=()):
+    with database.SessionLocal() as session:
+        pdf = database.PDF(filename="paper.pdf", total_pages=1)
+        session.add(pdf)
+        session.flush()
+        page = database.PageSummary(pdf_id=pdf.id, page_number=1, title="1. Introduction", summary=summary)
+        session.add(page)
+        session.flush()
+        session.add_all(database.SectionSummary(page_id=page.id, pdf_id=pdf.id, page_number=1, section_title=title, summary=text)
+                        for title, text in sections)
+        packed = signature(text)
+        persistence.add_fingerprint(session, page.id, packed, band_keys(packed))
+        session.commit()
+        return page.id
+
+
+def lookup(database, text):
+    async def go():
+        try:
+            return await find_near_duplicate(signature(text))
+        finally:
+            await database.async_engine.dispose()
+
+    return asyncio.run(go())
+
+
+def test_failed_summaries_are_not_reused(database):
+    text = page_text(101)
+    store_page(database, text, f"{SUMMARY_FAILED}: rate limited")
+    store_page(database, text, "")
+    assert lookup(database, text) is None
+
+    # A lightly edited copy with a summary is reused instead
+    edited = text.replace("nd101x", "nd101y", 3)
+    page_id = store_page(database, edited, "The introduction.", [("1. Introduction", "Why it matters.")])
+    match = lookup(database, text)
+    assert match["page_id"] == page_id
+    assert match["summary"] == "The introduction."
+    assert match["sections"] == [("1. Introduction", "Why it matters.")]
+    assert match["similarity"] >= NEAR_DUPLICATE_THRESHOLD
+
+
+def test_candidates_below_the_threshold_are_not_reused(database):
+    # One word in eight changed: about half the shingles differ, yet the pages still share a band key
+    text = page_text(209)
+    rewritten = " ".join(f"rewritten{index}" if index % 8 == 0 else word for index, word in enumerate(text.split()))
+    assert set(band_keys(signature(text))) & set(band_keys(signature(rewritten)))
+    store_page(database, rewritten, "A rewritten page.")
+    assert lookup(database, text) is None
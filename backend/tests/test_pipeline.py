@@ -0,0 +1,67 @@
+import json
+import asyncio
+
+from helper.pipeline import stream_pages_in_order
+
+
+async def pages_of(page_numbers):
+    for page_num in page_numbers:
+        yield page_num, f"text {page_num}"
+
+
+def collect(pending, source, process, concurrency):
+    async def run():
+        return [event async for event in stream_pages_in_order(pending, source, process, concurrency)]
+    return asyncio.run(asyncio.wait_for(run(), 5))
+
+
+def test_events_are_emitted_in_page_order_when_pages_finish_out_of_order():
+    async def process(page_num, item):
+        yield f"{page_num}:start"
+        # Later pages finish first
+        await asyncio.sleep(0.01 * (10 - page_num))
+        yield f"{page_num}:end"
+
+    events = collect(list(range(1, 9)), pages_of(range(1, 9)), process, 4)
+    assert events == [f"{page_num}:{step}" for page_num in range(1, 9) for step in ("start", "end")]
+
+
+def test_at_most_concurrency_pages_are_processed_at_once():
+    active, peak = 0, 0
+
+    async def process(page_num, item):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        yield str(page_num)
+
+    events = collect(list(range(1, 21)), pages_of(range(1, 21)), process, 3)
+    assert events == [str(page_num) for page_num in range(1, 21)]
+    assert peak == 3
+
+
+def test_pages_missing_from_the_source_are_closed_with_an_error():
+    async def process(page_num, item):
+        yield str(page_num)
+
+    events = collect([1, 2, 3, 4], pages_of([1, 2]), process, 2)
+    assert events[:2] == ["1", "2"]
+    assert [json.loads(event[len("data: "):])["page_num"] for event in events[2:]] == [3, 4]
+
+
+def test_pages_after_a_failing_source_are_closed_with_an_error():
+    async def failing():
+        yield 1, "text 1"
+        raise RuntimeError("pool timeout")
+
+    async def process(page_num, item):
+        yield str(page_num)
+
+    events = collect([1, 2, 3], failing(), process, 2)
+    assert events[0] == "1"
+    assert [json.loads(event[len("data: "):]) for event in events[1:]] == [
+        {"page_num": 2, "error": "pool timeout"},
+        {"page_num": 3, "error": "pool timeout"},
+    ]
@@ -0,0 +1,100 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+from fake_llm_server import REPLY
+from helper import llm, llm_cache, process_help
+
+
+class FakeCompletions:
+    """Answers streamed calls with `streamed` and plain calls with `reply`, recording every request"""
+
+    def __init__(self, streamed, reply):
+        self.streamed = streamed
+        self.reply = reply
+        self.calls = []
+
+    async def create(self, **params):
+        self.calls.append(params)
+        if params.get("stream"):
+            return self._stream(self.streamed.pop(0))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))])
+
+    async def _stream(self, text):
+        for start in range(0, len(text), 7):
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text[start:start + 7]))])
+
+
+def record_storage(monkeypatch):
+    """Capture stored page and section summaries instead of writing them; returns (pages, sections)"""
+    pages, sections = {}, []
+
+    async def insert_section(page_id, pdf_id, page_num, heading, summary):
+        sections.append((heading, summary))
+        return len(sections)
+
+    monkeypatch.setattr(process_help.persistence, "insert_section", insert_section)
+    monkeypatch.setattr(process_help.persistence, "update_page", lambda page_id, summary: pages.__setitem__(page_id, summary))
+    return pages, sections
+
+
+async def collect_combined():
+    stream = process_help.summarize_page_combined_stream(1, 1, 3, "Page text about the method.", "2. Method > 2.1. Data")
+    return [json.loads(event[len("data: "):]) async for event in stream]
+
+
+def run_combined(monkeypatch, streamed, reply="A section summary."):
+    completions = FakeCompletions(list(streamed), reply)
+    pages, sections = record_storage(monkeypatch)
+    monkeypatch.setattr(process_help, "get_client", lambda: SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    return asyncio.run(collect_combined()), pages, sections, completions.calls
+
+
+def test_combined_summary_is_parsed(monkeypatch):
+    response = (
+        f"{process_help.SECTION_MARKER} 2. Method\nThe method.\n"
+        f"{process_help.SECTION_MARKER} 2.1. Data\nThe data.\n"
+        f"{process_help.PAGE_MARKER}\nThe page."
+    )
+    events, pages, sections, calls = run_combined(monkeypatch, [response])
+    assert sections == [("2. Method", "The method."), ("2.1. Data", "The data.")]
+    assert pages == {1: "The page."}
+    assert len(calls) == 1
+    assert events[-1] == {"page_id": 1, "page_num": 3, "done": True}
+
+
+def test_combined_summary_without_markers_falls_back_to_separate_calls(monkeypatch):
+    events, pages, sections, calls = run_combined(monkeypatch, ["This page describes the method.", "The page, summarized alone."])
+    # One combined call, then one call per section and the streamed page summary
+    assert len(calls) == 4
+    assert sections == [("2. Method", "A section summary."), ("2.1. Data", "A section summary.")]
+    assert pages == {1: "The page, summarized alone."}
+    assert any(event.get("complete") for event in events)
+    assert events[-1] == {"page_id": 1, "page_num": 3, "done": True}
+
+
+def test_unformatted_answer_of_a_real_server_falls_back_and_is_not_cached(monkeypatch, fake_llm, tmp_path):
+    # The fake server answers every request with REPLY, which has no section markers
+    base_url, limits = fake_llm()
+    monkeypatch.setenv("GROK_BASE_URL", base_url)
+    monkeypatch.setattr(llm, "_client", None)
+    monkeypatch.setattr(llm, "_rate_limited", None)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_cache, "_active_cache", None)
+    pages, sections = record_storage(monkeypatch)
+
+    async def twice():
+        try:
+            return await collect_combined(), await collect_combined()
+        finally:
+            await llm.close_client()
+
+    first, second = asyncio.run(twice())
+    assert sections == [("2. Method", REPLY), ("2.1. Data", REPLY)] * 2
+    assert pages == {1: REPLY}
+    for events in (first, second):
+        assert events[-1] == {"page_id": 1, "page_num": 3, "done": True}
+    # First run: the combined call, two section calls and the page summary. Second run: the
+    # rejected combined answer was dropped from the cache and asked again; the rest is cached
+    assert limits.counts["ok"] == 5
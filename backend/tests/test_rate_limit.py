@@ -0,0 +1,85 @@
+import time
+import asyncio
+
+import pytest
+from openai import AsyncOpenAI
+
+from helper import rate_limit
+from helper.rate_limit import RateLimitedClient
+
+MESSAGES = [{"role": "user", "content": "Summarize this page."}]
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(rate_limit, "LLM_BACKOFF_BASE", 0.01)
+
+
+def make_client(base_url: str, **options) -> RateLimitedClient:
+    return RateLimitedClient(AsyncOpenAI(api_key="fake", base_url=base_url, max_retries=0), rpm=0, tpm=0, **options)
+
+
+async def complete(client, stream: bool = False) -> str:
+    response = await client.chat.completions.create(model="fake", messages=MESSAGES, max_tokens=20, stream=stream)
+    if not stream:
+        return response.choices[0].message.content
+    return "".join([chunk.choices[0].delta.content async for chunk in response if chunk.choices])
+
+
+def test_retry_after_of_a_429_is_honoured(fake_llm):
+    base_url, limits = fake_llm()
+    limits.fail(429, retry_after=1)
+    client = make_client(base_url)
+
+    started = time.monotonic()
+    assert asyncio.run(complete(client))
+    assert time.monotonic() - started >= 1.0
+    assert limits.counts == {"ok": 1, "throttled": 1, "errors": 0}
+    assert client.stats["throttled"] == 1 and client.stats["retries"] == 1
+
+
+def test_server_errors_are_retried_up_to_max_retries(fake_llm):
+    base_url, limits = fake_llm()
+    limits.fail(503, times=2)
+    assert asyncio.run(complete(make_client(base_url, max_retries=2), stream=True))
+    assert limits.counts["errors"] == 2 and limits.counts["ok"] == 1
+
+    base_url, limits = fake_llm(error_rate=1.0)
+    client = make_client(base_url, max_retries=2)
+    with pytest.raises(Exception) as error:
+        asyncio.run(complete(client))
+    assert rate_limit.status_code(error.value) == 503
+    assert limits.counts["errors"] == 3
+    assert client.stats == {"retries": 2, "throttled": 0, "failed": 1}
+
+
+def test_deadline_stops_further_attempts(fake_llm, monkeypatch):
+    monkeypatch.setattr(rate_limit, "LLM_BACKOFF_BASE", 5.0)
+    base_url, limits = fake_llm(error_rate=1.0)
+    client = make_client(base_url, max_retries=10, deadline=0.5)
+
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(complete(client))
+    assert time.monotonic() - started < 2.0
+    # The backoff after the first failure runs into the deadline, so no second request is sent
+    assert limits.counts["errors"] <= 2
+
+
+def test_concurrency_limit_halves_on_throttling_and_recovers(fake_llm):
+    base_url, limits = fake_llm()
+    client = make_client(base_url)
+    initial = client.limiter.limit
+
+    async def run():
+        limits.fail(429, retry_after=0)
+        await complete(client)
+        throttled = client.limiter.limit
+        for _ in range(20):
+            await asyncio.gather(*[complete(client) for _ in range(4)])
+        return throttled
+
+    throttled = asyncio.run(run())
+    # Halved by the 429, then +1/limit for the retry that succeeded
+    assert throttled == pytest.approx(initial / 2 + 2 / initial)
+    assert client.limiter.limit > initial
@@ -0,0 +1,55 @@
+import asyncio
+
+from sqlalchemy import text
+
+from helper.search import _decode_offset, search
+
+
+def add_pdf(database, summaries):
+    """A PDF whose pages have the given summaries (and no text); returns the PDF id and page ids"""
+    with database.engine.begin() as conn:
+        pdf_id = conn.execute(text("INSERT INTO pdfs (filename, total_pages) VALUES ('paper.pdf', :pages)"), {"pages": len(summaries)}).lastrowid
+        page_ids = [
+            conn.execute(
+                text("INSERT INTO page_summaries (pdf_id, page_number, title, summary) VALUES (:pdf_id, :page, '', :summary)"),
+                {"pdf_id": pdf_id, "page": page, "summary": summary}
+            ).lastrowid
+            for page, summary in enumerate(summaries, 1)
+        ]
+    return pdf_id, page_ids
+
+
+def run_search(database, query, limit=10, cursor=None, pdf_id=None):
+    async def go():
+        try:
+            async with database.AsyncSessionLocal() as db:
+                return await search(db, query, limit, cursor=cursor, kind="page", pdf_id=pdf_id)
+        finally:
+            await database.async_engine.dispose()
+
+    return asyncio.run(go())
+
+
+def test_matches_are_ranked_over_the_whole_match_set(database):
+    # The best match is the oldest row: ranking must not favour recent rows
+    filler = "unrelated words about something else entirely"
+    _, (best, weak, medium) = add_pdf(database, ["quokkite quokkite quokkite", f"quokkite {filler} {filler}", f"quokkite quokkite {filler}"])
+
+    response = run_search(database, "quokkite")
+    assert [hit["id"] for hit in response["results"]] == [best, medium, weak]
+    assert response["next_cursor"] is None
+
+    first = run_search(database, "quokkite", limit=2)
+    assert [hit["id"] for hit in first["results"]] == [best, medium]
+    assert _decode_offset(first["next_cursor"]) == 2
+    second = run_search(database, "quokkite", limit=2, cursor=first["next_cursor"])
+    assert [hit["id"] for hit in second["results"]] == [weak]
+
+
+def test_search_within_one_pdf(database):
+    first_pdf, first_pages = add_pdf(database, ["wombatite in the first paper"])
+    second_pdf, second_pages = add_pdf(database, ["wombatite wombatite in the second paper"])
+
+    assert [hit["id"] for hit in run_search(database, "wombatite", pdf_id=first_pdf)["results"]] == first_pages
+    assert [hit["id"] for hit in run_search(database, "wombatite", pdf_id=second_pdf)["results"]] == second_pages
+    assert run_search(database, "wombatite", pdf_id=second_pdf + 1000)["results"] == []
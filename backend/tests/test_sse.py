@@ -0,0 +1,42 @@
+import time
+import asyncio
+
+from helper.sse import DeltaCoalescer, with_flush_deadlines
+
+
+async def paused_stream(parts, pause):
+    """Yields `parts`, pausing `pause` seconds before the last one"""
+    for index, part in enumerate(parts):
+        if index == len(parts) - 1:
+            await asyncio.sleep(pause)
+        yield part
+
+
+def test_buffered_deltas_are_flushed_while_the_model_pauses():
+    coalescer = DeltaCoalescer(interval=0.05, max_chars=1000)
+
+    async def frames():
+        sent = []
+        async for chunk in with_flush_deadlines(paused_stream(["Hel", "lo", " world"], 0.5), coalescer):
+            if chunk is None:
+                sent.append((coalescer.flush(), time.monotonic()))
+            else:
+                coalescer.add(chunk)
+        sent.append((coalescer.flush(), time.monotonic()))
+        return sent
+
+    started = time.monotonic()
+    sent = asyncio.run(frames())
+    assert [text for text, _ in sent] == ["Hello", " world"]
+    # "Hello" went out on its deadline, not when " world" arrived half a second later
+    assert sent[0][1] - started < 0.3
+
+
+def test_nothing_buffered_means_no_deadline():
+    coalescer = DeltaCoalescer(interval=0.01)
+
+    async def chunks():
+        return [chunk async for chunk in with_flush_deadlines(paused_stream([], 0), coalescer)]
+
+    assert coalescer.remaining() is None
+    assert asyncio.run(chunks()) == []
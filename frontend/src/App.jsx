@@ -106,8 +106,10 @@ const App = () => {
                 const lines = buffer.split('\n\n');
                 buffer = lines.pop();
 
-                for (const line of lines) {
-                    console.log('DEBUG: Received line:', line);
+                for (const event of lines) {
+                    console.log('DEBUG: Received event:', event);
+                    // Events may carry an "id:" line (used for resuming) before the data line
+                    const line = event.split('\n').find(l => l.startsWith('data: ')) || '';
                     if (line.startsWith('data: ')) {
                         const data = JSON.parse(line.slice(6));
                         console.log('DEBUG: Parsed data:', data);
@@ -192,6 +194,9 @@ const App = () => {
                                 };
                                 return [...prev, newSummary];
                             });
+                        } else if (data.type === 'document_summary') {
+                            // Whole-paper summary, sent once every page is summarized
+                            setMetadata(prev => prev ? { ...prev, summary: data.summary } : prev);
                         } else if (data.type === 'complete') {
                             fetchPdfList();
                         }
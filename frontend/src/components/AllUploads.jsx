@@ -7,6 +7,8 @@ const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 const AllUploads = ({ onOpenPdf, onPdfListUpdate, onPdfDeleted }) => {
     const [allPdfs, setAllPdfs] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [searchTerm, setSearchTerm] = useState('');
     const [selectedPdfData, setSelectedPdfData] = useState(null);
     const detailsRef = useRef(null);
@@ -28,29 +30,38 @@ const AllUploads = ({ onOpenPdf, onPdfListUpdate, onPdfDeleted }) => {
         setModal(prev => ({ ...prev, isOpen: false }));
     };
 
-    useEffect(() => {
-        const fetchPdfs = async () => {
-            try {
-                const response = await fetch(`${API_URL}/api/v1/pdfs`);
-                if (response.ok) {
-                    const data = await response.json();
-                    setAllPdfs(data.pdfs);
-                }
-            } catch (error) {
-                console.error("Error fetching PDFs:", error);
-                showModal({
-                    title: 'Error',
-                    message: 'Failed to load documents. Please check your connection.',
-                    type: 'error'
-                });
-            } finally {
-                setLoading(false);
+    // Fetch one page of the library; with a cursor the results are appended
+    const fetchPdfs = async (cursor = null) => {
+        try {
+            const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+            const response = await fetch(`${API_URL}/api/v1/pdfs${query}`);
+            if (response.ok) {
+                const data = await response.json();
+                setAllPdfs(prev => cursor ? [...prev, ...data.pdfs] : data.pdfs);
+                setNextCursor(data.next_cursor);
             }
-        };
+        } catch (error) {
+            console.error("Error fetching PDFs:", error);
+            showModal({
+                title: 'Error',
+                message: 'Failed to load documents. Please check your connection.',
+                type: 'error'
+            });
+        } finally {
+            setLoading(false);
+            setLoadingMore(false);
+        }
+    };
 
+    useEffect(() => {
         fetchPdfs();
     }, []);
 
+    const handleLoadMore = () => {
+        setLoadingMore(true);
+        fetchPdfs(nextCursor);
+    };
+
     const filteredPdfs = allPdfs.filter(pdf =>
         pdf.filename.toLowerCase().includes(searchTerm.toLowerCase())
     );
@@ -210,6 +221,15 @@ const AllUploads = ({ onOpenPdf, onPdfListUpdate, onPdfDeleted }) => {
                                         ))}
                                     </tbody>
                                 </table>
+                                {nextCursor && (
+                                    <button
+                                        onClick={handleLoadMore}
+                                        disabled={loadingMore}
+                                        className="w-full p-3 text-sm text-blue-400 hover:bg-slate-800/50 border-t border-slate-800 transition-colors disabled:opacity-50"
+                                    >
+                                        {loadingMore ? 'Loading...' : 'Load more'}
+                                    </button>
+                                )}
                             </div>
                         ) : (
                             <div className="flex flex-col items-center justify-center h-64 text-slate-500">
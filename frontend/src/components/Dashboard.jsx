@@ -82,6 +82,12 @@ const Dashboard = ({
                                     <p className="font-medium text-gray-200 mt-1 text-sm">{new Date(metadata.upload_date).toLocaleDateString()}</p>
                                 </div>
                             </div>
+                            {metadata.summary && (
+                                <div className="mt-4 pt-4 border-t border-slate-700/50">
+                                    <label className="text-xs uppercase tracking-wider text-slate-400">Paper Summary</label>
+                                    <p className="text-gray-300 mt-1 text-sm leading-relaxed whitespace-pre-line">{metadata.summary}</p>
+                                </div>
+                            )}
                         </div>
                     )}
 